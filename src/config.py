@@ -31,4 +31,69 @@ MINISTRY_MASTER_DATA = {
         # 宮内庁、中小企業庁などはレビューシート本体には登場しないため、主要なものに絞り込み
         # 必要であればここに追加
     ]
-}
\ No newline at end of file
+}
+
+# ==============================================================================
+# RELEASE DEFINITIONS
+# ==============================================================================
+
+# --- 公開ファイルと対象年度の対応表 ---
+
+# ファイル名に含まれるキーから、そのファイルが対象とする年度を判定する。
+# 上から順に評価し、最初に一致したキーの年度を採用する
+FILENAME_YEAR_MAP = {
+    'database240918': 2023,
+    'database240502': 2022,
+    'database220524': 2021,
+    'database_220427': 2020,
+    'database2019_220427': 2019,
+    'database2018_220427': 2018,
+    'database2017': 2017,
+    'database2016': 2016,
+    'database2015': 2015,
+    'database2014': 2014,
+}
+
+
+# ==============================================================================
+# COLUMN FAMILY DEFINITIONS
+# ==============================================================================
+
+# --- 列ファミリーの定義 (超横長シートの縦分割に使用) ---
+
+# 各列は、上から順に評価して最初に一致したファミリーに割り当てられる。
+# どのファミリーにも一致しない列は 'other' に入る。
+#    キー: ファミリー名 (分割後のファイル名にも使用), 値: 正規化済み列名に対する正規表現
+COLUMN_FAMILIES = {
+    'core': r'^(府省庁?|局・庁|事業番号(-\d)?|事業名|事業開始・終了\(予定\)年度|担当部局庁|担当課室|作成責任者)$',
+    '予算額・執行額': r'^予算額・執行額',
+    '費目・使途': r'^費目・使途',
+    '支出先上位10者リスト': r'^支出先上位10者リスト',
+    '成果目標及び成果実績': r'^成果目標及び成果実績',
+    '活動指標及び活動実績': r'^活動指標及び活動実績',
+    '国庫債務負担行為等': r'^国庫債務負担行為等',
+}
+COLUMN_FAMILY_OTHER = 'other'
+
+# 事業番号を構成する列。年度によって存在する列が異なる
+ID_CANDIDATE_COLUMNS = [
+    '事業番号', '事業番号-1', '事業番号-2',
+    '事業番号-3', '事業番号-4', '事業番号-5'
+]
+
+
+# ==============================================================================
+# SEARCH INDEX DEFINITIONS
+# ==============================================================================
+
+# --- 全文検索インデックスの対象列 ---
+
+# キー: 対象とする列名 (正規化済み), 値: ランキング時の重み
+# 存在しない列は無視されるため、年度によって列名が異なる場合は両方を書いておく
+SEARCH_TEXT_COLUMNS = {
+    '事業名': 3,
+    '事業概要': 1,
+    '事業の概要': 1,
+    '目的': 1,
+    '事業の目的': 1,
+}
@@ -0,0 +1,81 @@
+import re
+
+import pandas as pd
+
+# --- 金額の解析 ---
+# レビューシートの金額は百万円単位の文字列として入っており、桁区切り・全角数字・単位・
+# 「-」「―」などの未記入記号・「※1」などの注記が混在する。
+# これらを列単位でまとめて解析し、固定小数点の整数 (既定では千円単位) に変換する。
+
+# 百万円単位の値を何倍した整数として保持するか (1000 -> 千円単位。小数第3位まで誤差なく保持できる)
+AMOUNT_SCALE = 1000
+AMOUNT_COLUMN = 'amount_thousand_yen'
+
+# 金額の列 (予算額・執行額の各列、支払先金額(百万円)、支出額(百万円) など)。
+# 費目・使途の列は列名の前半に「最大の金額」を含むため、単位付きの項目名で判定する
+RE_AMOUNT_COLUMN = re.compile(r'^予算額・執行額|(?:金額|支出額)\(百万円\)')
+
+# 値がないことを表す記号。解析の失敗ではなく欠損として扱う
+PLACEHOLDERS = {'-', '―', '‐', '－', '—', 'ー', '−', '…', '*', '×', '該当なし', 'なし', '未定'}
+
+# 注記 (※1, (注1), 注1, *1) と空白は取り除く
+RE_FOOTNOTE = re.compile(r'※\d*|\(注\d*\)|注\d+|\*\d+')
+RE_SPACES = re.compile(r'\s+')
+
+# 末尾の単位と、百万円に対する倍率
+UNIT_MULTIPLIERS = {'百万円': 1, '億円': 100, '千円': 0.001, '円': 0.000001}
+RE_UNIT = re.compile(r'(' + '|'.join(sorted(UNIT_MULTIPLIERS, key=len, reverse=True)) + r')$')
+
+# 負の値を表す △ / ▲ 記号
+RE_NEGATIVE_MARK = re.compile(r'^[△▲]')
+RE_NUMBER = re.compile(r'^-?(?:\d+(?:\.\d*)?|\.\d+)$')
+
+
+def _parse_distinct(values: pd.Series, scale: int):
+    """重複を除いた値について金額を解析し、(整数値, 解析失敗フラグ) を返す"""
+    text = values.str.normalize('NFKC').str.strip()
+    is_placeholder = text.isin(PLACEHOLDERS) | (text == '')
+
+    cleaned = text.str.replace(RE_FOOTNOTE, '', regex=True).str.replace(RE_SPACES, '', regex=True)
+    cleaned = cleaned.str.replace(',', '', regex=False)
+    unit = cleaned.str.extract(RE_UNIT, expand=False)
+    cleaned = cleaned.str.replace(RE_UNIT, '', regex=True)
+    cleaned = cleaned.str.replace(RE_NEGATIVE_MARK, '-', regex=True)
+    is_placeholder |= cleaned.isin(PLACEHOLDERS) | (cleaned == '')
+
+    is_number = cleaned.str.match(RE_NUMBER, na=False) & ~is_placeholder
+    numbers = pd.to_numeric(cleaned.where(is_number), errors='coerce')
+    multipliers = unit.map(UNIT_MULTIPLIERS).fillna(1).astype(float)
+    scaled = (numbers * multipliers * scale).round()
+
+    result = scaled.astype('Int64')
+    failed = ~is_number & ~is_placeholder & values.notna()
+    return result, failed.fillna(False).astype(bool)
+
+
+def parse_amounts(series: pd.Series, scale: int = AMOUNT_SCALE):
+    """
+    金額の列を、百万円 × scale の固定小数点整数 (Int64) に変換する。
+    同じ表記は一度だけ解析し、結果を元の行に割り当てる。
+    (整数値の列, 解析失敗マスク) を返す。未記入記号や空欄は欠損となり、失敗には数えない。
+    """
+    codes, uniques = pd.factorize(series.astype('string'), use_na_sentinel=True)
+    if len(uniques) == 0:
+        return (pd.Series(pd.NA, index=series.index, dtype='Int64', name=series.name),
+                pd.Series(False, index=series.index))
+    distinct = pd.Series(uniques, dtype='string')
+    parsed, failed = _parse_distinct(distinct, scale)
+
+    values = parsed.array.take(codes, allow_fill=True)
+    failures = failed.to_numpy()[codes] & (codes >= 0)
+    return (pd.Series(values, index=series.index, name=series.name),
+            pd.Series(failures, index=series.index))
+
+
+def to_million_yen(values: pd.Series, scale: int = AMOUNT_SCALE) -> pd.Series:
+    """固定小数点の整数を百万円単位の数値に戻す (表示・互換用)"""
+    return values.astype('Float64') / scale
+
+
+def is_amount_column(column_name) -> bool:
+    return bool(RE_AMOUNT_COLUMN.search(str(column_name)))
@@ -0,0 +1,181 @@
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import FILENAME_YEAR_MAP, MINISTRY_NAME_VARIATIONS, MINISTRY_MASTER_DATA
+from src.lib.reader import glob_tables, read_table
+
+# --- 府省庁名 -> 府省庁ID の対応表 ---
+MINISTRY_DF = pd.DataFrame(MINISTRY_MASTER_DATA)
+MINISTRY_NAME_TO_ID = pd.Series(MINISTRY_DF.ministry_id.values, index=MINISTRY_DF.ministry_name).to_dict()
+
+# --- 年度ごとの事業番号レイアウト ---
+# 事業番号の列構成は年度(期)によって異なるため、代理キーの組み立て方を年度範囲ごとに定義する。
+#   year_col:   キーの年部分に使う列 (None の場合はファイルの年度)
+#   number_col: 事業の通し番号の列
+#   branch_col: 枝番の列 (None の場合は常に 0000)
+ID_LAYOUTS = [
+    {'first_year': 2014, 'last_year': 2014, 'year_col': None, 'number_col': '事業番号', 'branch_col': None},
+    {'first_year': 2015, 'last_year': 2020, 'year_col': None, 'number_col': '事業番号-2', 'branch_col': '事業番号-3'},
+    # 第2期の府省庁コードは事業番号-2,3に由来するが、ここでは府省庁マスターのIDを使う
+    {'first_year': 2021, 'last_year': None, 'year_col': '事業番号-1', 'number_col': '事業番号-4', 'branch_col': '事業番号-5'},
+]
+
+# --- 代理キーを付与するレビューシートのファイル名パターン ---
+# 代理キーの衝突の連番は年度内のファイルの組み合わせと順序で決まるため、
+# 代理キーを付与する全てのステージは find_review_sheets で同じファイルの集合を使う
+REVIEW_SHEET_PATTERNS = ['*レビューシート', '*データベース', '*_Sheet1']
+
+MISSING_MINISTRY_CODE = "XXXX"
+MISSING_CODE = "0000"
+
+# --- 内容からの年度判定 ---
+# 予算額・執行額の列名に含まれる年度のうち最も新しいものは翌年度の要求額であるため、
+# そこから BUDGET_YEAR_OFFSET を引いた年度をシートの対象年度とみなす
+RE_BUDGET_COLUMN_YEAR = re.compile(r'^予算額.*?(\d{4})年度')
+BUDGET_YEAR_OFFSET = 1
+# 事業番号-1 に年度が入っているレイアウト (2021年度以降) で、値を年度とみなす範囲
+PLAUSIBLE_YEARS = range(2000, 2100)
+DETECTION_SAMPLE_ROWS = 200
+
+
+def get_year_from_filename(filename):
+    """ファイル名から対象年度を取得する。対応表にないファイルは None を返す"""
+    for key, year in FILENAME_YEAR_MAP.items():
+        if key in filename:
+            return year
+    return None
+
+
+def detect_year_from_contents(header: list, sample: pd.DataFrame = None):
+    """
+    ファイル名の対応表にない新しいリリースについて、シートの内容から対象年度を推定する。
+    1. 事業番号-1 に年度が入っている場合は、その最頻値
+    2. 予算額・執行額の列名に現れる最新年度 - BUDGET_YEAR_OFFSET
+    どちらでも判定できない場合は None を返す。
+    """
+    if sample is not None and '事業番号-1' in sample.columns:
+        years = pd.to_numeric(sample['事業番号-1'], errors='coerce').dropna()
+        years = years[years.isin(PLAUSIBLE_YEARS)]
+        if not years.empty:
+            return int(years.mode().iloc[0])
+
+    budget_years = [int(m.group(1)) for m in map(RE_BUDGET_COLUMN_YEAR.match, map(str, header)) if m]
+    if budget_years:
+        return max(budget_years) - BUDGET_YEAR_OFFSET
+    return None
+
+
+def find_review_sheets(directory: Path) -> list:
+    """代理キーを付与するレビューシートを、ファイル名順に列挙する"""
+    return sorted({path for pattern in REVIEW_SHEET_PATTERNS for path in glob_tables(directory, pattern)})
+
+
+def resolve_file_year(path: Path):
+    """
+    ファイルの対象年度を返す。まずファイル名の対応表を引き、
+    登録のないファイルはヘッダーと先頭行の内容から判定する。
+    """
+    year = get_year_from_filename(Path(path).name)
+    if year is not None:
+        return year
+    try:
+        sample = read_table(path, nrows=DETECTION_SAMPLE_ROWS)
+    except Exception:
+        return None
+    return detect_year_from_contents(sample.columns.tolist(), sample)
+
+
+def get_id_layout(file_year):
+    """年度に対応する事業番号レイアウトを返す"""
+    for layout in ID_LAYOUTS:
+        if file_year >= layout['first_year'] and (layout['last_year'] is None or file_year <= layout['last_year']):
+            return layout
+    return None
+
+
+def map_ministry_ids(ministry_names: pd.Series) -> pd.Series:
+    """府省庁名の列を、表記揺れを吸収したうえで府省庁IDの列 (Int64) に変換する"""
+    normalized = ministry_names.replace(MINISTRY_NAME_VARIATIONS)
+    return normalized.map(MINISTRY_NAME_TO_ID).astype('Int64')
+
+
+def _code_column(df: pd.DataFrame, col, width: int, default: str) -> pd.Series:
+    """
+    列の値をゼロ埋めした文字列コードに変換する。
+    整数として解釈できる値は '12.0' のような表記にならないよう整数化してから埋める。
+    列が存在しない、または値が空の場合は default を使う。
+    """
+    if col is None or col not in df.columns:
+        return pd.Series(default, index=df.index, dtype='string')
+
+    raw = df[col]
+    numbers = pd.to_numeric(raw, errors='coerce')
+    is_integer = numbers.notna() & (numbers == numbers.round())
+    integer_text = numbers.where(is_integer).astype('Int64').astype('string')
+
+    text = raw.astype('string').str.strip()
+    text = text.where(~is_integer, integer_text)
+    text = text.mask(text == '')
+    return text.str.zfill(width).fillna(default)
+
+
+def generate_business_ids(df: pd.DataFrame, file_year: int, ministry_ids: pd.Series) -> pd.Series:
+    """
+    DataFrame全体について、年度ごとのレイアウトに従った代理キー
+    'YYYY-MMMM-NNNN-BBBB' (年度-府省庁ID-事業番号-枝番) を列演算で生成する。
+    """
+    layout = get_id_layout(file_year)
+    if layout is None:
+        return pd.Series(pd.NA, index=df.index, dtype='string')
+
+    ministry_code = ministry_ids.astype('Int64').astype('string').str.zfill(4).fillna(MISSING_MINISTRY_CODE)
+    number = _code_column(df, layout['number_col'], 4, MISSING_CODE)
+    branch = _code_column(df, layout['branch_col'], 4, MISSING_CODE)
+    if layout['year_col'] is None:
+        year = pd.Series(str(file_year), index=df.index, dtype='string')
+    else:
+        year = _code_column(df, layout['year_col'], 4, str(file_year))
+
+    return year + '-' + ministry_code + '-' + number + '-' + branch
+
+
+def find_collisions(business_ids: pd.Series) -> pd.Series:
+    """同じ代理キーが複数行に割り当てられている行を True とするマスクを返す"""
+    return business_ids.duplicated(keep=False) & business_ids.notna()
+
+
+def build_business_ids(df: pd.DataFrame, file_year: int, ministry_ids: pd.Series):
+    """
+    代理キーを生成し、同じパスで衝突を検出する。
+    (代理キー, 衝突マスク) のタプルを返す。
+    """
+    business_ids = generate_business_ids(df, file_year, ministry_ids)
+    return business_ids, find_collisions(business_ids)
+
+
+def assign_business_ids(df: pd.DataFrame, file_year: int):
+    """
+    府省庁名の列 ('府省庁' または '府省') から府省庁IDを求め、衝突を解消した代理キーを返す。
+    07_build_business_master と同じ規則で、他のステージから代理キーを付与するときに使う。
+    (府省庁ID, 代理キー) のタプルを返す。
+    """
+    ministry_col = '府省庁' if '府省庁' in df.columns else '府省'
+    if ministry_col in df.columns:
+        ministry_ids = map_ministry_ids(df[ministry_col])
+    else:
+        ministry_ids = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    business_ids, _ = build_business_ids(df, file_year, ministry_ids)
+    return ministry_ids, resolve_collisions(business_ids)
+
+
+def resolve_collisions(business_ids: pd.Series) -> pd.Series:
+    """
+    衝突した代理キーのうち2件目以降に '-2', '-3', ... の連番を付けて一意にする。
+    1件目はそのまま残すため、衝突のないキーは変化しない。
+    """
+    # 代理キーのない行は cumcount が欠損になり float に変わるため、整数に戻してから連番の文字列にする
+    occurrence = (business_ids.groupby(business_ids, dropna=True).cumcount() + 1).astype('Int64')
+    suffix = occurrence.astype('string').radd('-').where(occurrence > 1, '')
+    return business_ids + suffix.reindex(business_ids.index).fillna('')
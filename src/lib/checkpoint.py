@@ -0,0 +1,81 @@
+import glob
+import shutil
+from pathlib import Path
+
+from src.lib.ingest import file_signature, load_state, save_state
+
+# --- 長時間処理のチェックポイント ---
+# 巨大なシートの正規化や列分析が途中で落ちても、最後のチェックポイントから再開できるようにする。
+# チェックポイントには入力ファイルの署名・処理の設定・処理済みの位置・部分出力の状態・途中まで蓄積した集計値を記録する。
+# 入力ファイルか設定が変わっていた場合は使わずに最初からやり直す。
+# チェックポイントが残っている出力は、完成していない出力として扱う。
+# 部分出力は処理するワーカーごとの作業ファイル (<出力>.<ワーカー>.part) に書き、完了してから出力の名前に置き換える。
+# リースを失ったワーカーが書き続けても、引き継いだワーカーの出力は壊れない。
+# 引き継いだワーカーは、チェックポイントが指す作業ファイルをチェックポイントの位置まで自分の作業ファイルに写して再開する。
+
+CHECKPOINT_SUFFIX = '.ckpt.json'
+WORK_SUFFIX = '.part'
+# 作業ファイルに付随するファイル (途中経過のうち JSON に収めない大きなもの)
+SEEN_KEYS_SUFFIX = '.keys'
+
+
+def checkpoint_path_for(output_path: Path) -> Path:
+    """出力ファイルに対応するチェックポイントのパス"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+
+
+def work_path_for(output_path: Path, worker: str) -> Path:
+    """ワーカーが部分出力を書き込む作業ファイルのパス"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.name}.{worker}{WORK_SUFFIX}")
+
+
+def work_keys_path(work_path: Path) -> Path:
+    """品質チェックで蓄積した事業番号のキーを保存する、作業ファイルに付随するファイルのパス"""
+    work_path = Path(work_path)
+    return work_path.with_name(work_path.name + SEEN_KEYS_SUFFIX)
+
+
+def adopt_work_file(source: Path, target: Path, size: int):
+    """他のワーカーの作業ファイルの先頭 size バイトを、自分の作業ファイルに写す"""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        remaining = size
+        while remaining > 0:
+            data = src.read(min(remaining, 1 << 20))
+            if not data:
+                raise ValueError(f"'{Path(source).name}' is shorter than its checkpoint ({size} bytes).")
+            dst.write(data)
+            remaining -= len(data)
+    source_keys = work_keys_path(source)
+    if source_keys.exists():
+        shutil.copyfile(source_keys, work_keys_path(target))
+
+
+def remove_work_files(output_path: Path):
+    """出力に対応する全てのワーカーの作業ファイルと、それに付随するファイルを取り除く"""
+    output_path = Path(output_path)
+    pattern = glob.escape(output_path.name) + '.*' + WORK_SUFFIX + '*'
+    for path in output_path.parent.glob(pattern):
+        path.unlink(missing_ok=True)
+
+
+def load_checkpoint(checkpoint_path: Path, input_path: Path, settings: dict):
+    """
+    チェックポイントを読み込む。存在しない場合や、入力ファイル・設定が記録時と異なる場合は None を返す。
+    """
+    if not Path(checkpoint_path).exists():
+        return None
+    checkpoint = load_state(checkpoint_path)
+    if checkpoint.get('input') != file_signature(input_path) or checkpoint.get('settings') != settings:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: Path, input_path: Path, settings: dict, **progress):
+    """処理済みの位置と途中経過を記録する (一時ファイル経由で置き換えるため、書き込み中に落ちても壊れない)"""
+    save_state({'input': file_signature(input_path), 'settings': settings, **progress}, checkpoint_path)
+
+
+def clear_checkpoint(checkpoint_path: Path):
+    Path(checkpoint_path).unlink(missing_ok=True)
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.business_keys import assign_business_ids, find_collisions, resolve_collisions
+from src.lib.reader import read_table
+from src.main_split import classify_column
+
+# --- 行フィンガープリントによるリリース間の差分 ---
+# 同じ年度を再掲するリリース同士を、セルを1つずつ比べるのではなく、
+# 事業ごと・列ファミリーごとのハッシュ値 (フィンガープリント) だけで比較する。
+# ハッシュ値が一致しないファミリーだけを読み直し、セル単位の差分を求める。
+
+DEFAULT_CHUNK_ROWS = 2000
+KEY_COLUMNS = ['府省庁', '府省'] + ID_CANDIDATE_COLUMNS
+
+# 行全体のフィンガープリントを表すファミリー名
+ROW_FAMILY = '*'
+
+CHANGE_COLUMNS = ['key', 'family', 'change', 'column', 'old_value', 'new_value']
+
+
+def common_family_columns(old_header: list, new_header: list) -> OrderedDict:
+    """
+    両方のリリースに存在する列を、新しいリリースの列順のまま列ファミリーごとにまとめる。
+    片方にしかない列はフィンガープリントに含めず、スキーマの差分として別に報告する。
+    """
+    old_columns = set(old_header)
+    families = OrderedDict()
+    for col in new_header:
+        if col in old_columns:
+            families.setdefault(classify_column(col), []).append(col)
+    return families
+
+
+def schema_changes(old_header: list, new_header: list) -> pd.DataFrame:
+    """追加・削除された列を変更テーブルの形式で返す"""
+    old_columns, new_columns = set(old_header), set(new_header)
+    records = [{'key': None, 'family': classify_column(col), 'change': 'column_added', 'column': col}
+               for col in new_header if col not in old_columns]
+    records += [{'key': None, 'family': classify_column(col), 'change': 'column_removed', 'column': col}
+                for col in old_header if col not in new_columns]
+    return pd.DataFrame(records, columns=CHANGE_COLUMNS)
+
+
+def row_keys(path: Path, file_year: int, strip_year: bool = True) -> pd.Series:
+    """
+    ファイル全体の代理キーを行番号順に返す。
+    strip_year=True の場合は先頭の年度部分を除き、年度をまたいで再掲された事業同士を対応付ける。
+    年度を除くと一意でなくなるキー (2021年度以降の様式で、事業番号-1 の年度だけが異なる行など) は、
+    代理キーと同じく2件目以降に連番を付けて一意にする (同じ連番の行同士を対応付ける)。
+    """
+    df = read_table(path, usecols=lambda col: col in KEY_COLUMNS, dtype=str)
+    _, business_ids = assign_business_ids(df, file_year)
+    if strip_year:
+        business_ids = business_ids.str.split('-', n=1).str[1]
+        collisions = find_collisions(business_ids)
+        if collisions.any():
+            samples = business_ids[collisions].unique()[:3].tolist()
+            print(f"  - [Warning] {int(collisions.sum())} rows of '{Path(path).name}' share a key once the year is removed "
+                  f"(e.g. {samples}). Suffixes are added in row order; use --keep-year to compare with the year.")
+            # 付けた連番が既存のキーと重なる場合に備え、一意になるまで繰り返す
+            while collisions.any():
+                business_ids = resolve_collisions(business_ids)
+                collisions = find_collisions(business_ids)
+    return business_ids.set_axis(pd.RangeIndex(len(business_ids)))
+
+
+def _hash_rows(frame: pd.DataFrame) -> np.ndarray:
+    # 空文字と欠損を区別しない
+    return pd.util.hash_pandas_object(frame.fillna(''), index=False).to_numpy()
+
+
+def fingerprint_table(path: Path, keys: pd.Series, families: OrderedDict,
+                      chunksize: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    1ファイルをチャンク単位で読み込み、行ごとに各列ファミリーと行全体のハッシュ値を求める。
+    返り値はキーをインデックスとし、'row' (元の行番号)、ROW_FAMILY、各ファミリーの列を持つ。
+    保持するのはハッシュ値だけのため、メモリ使用量は列数によらない。
+    """
+    wanted = {col for cols in families.values() for col in cols}
+    parts = []
+    for chunk in read_table(path, usecols=lambda col: col in wanted, dtype=str, chunksize=chunksize):
+        hashes = {family: _hash_rows(chunk[cols]) for family, cols in families.items()}
+        family_frame = pd.DataFrame(hashes, index=chunk.index)
+        family_frame.insert(0, ROW_FAMILY, _hash_rows(family_frame))
+        parts.append(family_frame)
+
+    fingerprints = pd.concat(parts) if parts else pd.DataFrame(columns=[ROW_FAMILY, *families])
+    fingerprints.insert(0, 'row', fingerprints.index)
+    fingerprints.index = keys.reindex(fingerprints.index).values
+    return fingerprints[fingerprints.index.notna()]
+
+
+def compare_fingerprints(old_fp: pd.DataFrame, new_fp: pd.DataFrame, families: list):
+    """
+    フィンガープリントだけを比較し、追加・削除された事業の変更テーブルと、
+    内容が変わった (キー, ファミリー) の一覧を返す。キーはどちらのリリースでも一意であること。
+    """
+    for label, fingerprints in (('old', old_fp), ('new', new_fp)):
+        if not fingerprints.index.is_unique:
+            duplicated = fingerprints.index[fingerprints.index.duplicated()].unique()[:3].tolist()
+            raise ValueError(f"Keys of the {label} release are not unique (e.g. {duplicated}).")
+    added = new_fp.index.difference(old_fp.index)
+    removed = old_fp.index.difference(new_fp.index)
+    records = [{'key': key, 'family': ROW_FAMILY, 'change': 'added'} for key in added]
+    records += [{'key': key, 'family': ROW_FAMILY, 'change': 'removed'} for key in removed]
+
+    common = old_fp.index.intersection(new_fp.index)
+    old_common, new_common = old_fp.loc[common], new_fp.loc[common]
+    changed_rows = old_common[ROW_FAMILY].to_numpy() != new_common[ROW_FAMILY].to_numpy()
+    old_common, new_common = old_common[changed_rows], new_common[changed_rows]
+
+    mismatches = pd.DataFrame(
+        old_common[families].to_numpy() != new_common[families].to_numpy(),
+        index=old_common.index, columns=families,
+    ).stack()
+    mismatches = mismatches[mismatches].index.to_frame(index=False, name=['key', 'family'])
+    return pd.DataFrame(records, columns=CHANGE_COLUMNS), mismatches
+
+
+def _read_rows(path: Path, rows: set, columns: list, chunksize: int) -> pd.DataFrame:
+    wanted = set(columns)
+    parts = [chunk[chunk.index.isin(rows)]
+             for chunk in read_table(path, usecols=lambda col: col in wanted, dtype=str, chunksize=chunksize)]
+    return pd.concat(parts) if parts else pd.DataFrame(columns=columns)
+
+
+def _keys_for_rows(fingerprints: pd.DataFrame, rows: pd.Index) -> np.ndarray:
+    """元の行番号をキーに置き換える"""
+    return pd.Series(fingerprints.index, index=fingerprints['row'].to_numpy()).reindex(rows).to_numpy()
+
+
+def drill_down(old_path: Path, new_path: Path, old_fp: pd.DataFrame, new_fp: pd.DataFrame,
+               mismatches: pd.DataFrame, families: OrderedDict,
+               chunksize: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    ハッシュ値が一致しなかった (キー, ファミリー) について、そのファミリーの列と該当行だけを
+    両方のリリースから読み直し、値の異なるセルを変更テーブルとして返す。
+    """
+    if mismatches.empty:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    columns = [col for family in mismatches['family'].unique() for col in families[family]]
+    keys = mismatches['key'].unique()
+    old_rows = _read_rows(old_path, set(old_fp.loc[keys, 'row']), columns, chunksize)
+    new_rows = _read_rows(new_path, set(new_fp.loc[keys, 'row']), columns, chunksize)
+    old_rows.index = _keys_for_rows(old_fp, old_rows.index)
+    new_rows.index = _keys_for_rows(new_fp, new_rows.index)
+
+    records = []
+    for family, group in mismatches.groupby('family', sort=False):
+        cols = families[family]
+        old_values = old_rows.loc[group['key'], cols].fillna('')
+        new_values = new_rows.loc[group['key'], cols].fillna('')
+        changed = (old_values.to_numpy() != new_values.to_numpy())
+        for i, j in zip(*np.nonzero(changed)):
+            records.append({
+                'key': old_values.index[i], 'family': family, 'change': 'modified', 'column': cols[j],
+                'old_value': old_values.iat[i, j], 'new_value': new_values.iat[i, j],
+            })
+    return pd.DataFrame(records, columns=CHANGE_COLUMNS)
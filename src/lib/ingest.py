@@ -0,0 +1,179 @@
+import csv
+import json
+import heapq
+from pathlib import Path
+
+# --- 差分取り込み用の状態管理 ---
+# 各ステージは処理済みの入力ファイルの署名 (サイズと更新日時) を状態ファイルに記録し、
+# 次回の実行では署名が変わったファイル (= 新しいリリースや差し替え) だけを処理する。
+
+
+def file_signature(path: Path) -> dict:
+    """ファイルの変更を検出するための署名を返す"""
+    stat = Path(path).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_state(state_path: Path) -> dict:
+    """状態ファイルを読み込む。存在しない場合は空の状態を返す"""
+    if not state_path.exists():
+        return {'files': {}}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state: dict, state_path: Path):
+    """状態ファイルを書き出す (途中で中断しても壊れないよう一時ファイル経由で置き換える)"""
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(state_path)
+
+
+def is_changed(path: Path, state: dict) -> bool:
+    """前回記録した署名と比べて、ファイルが新規または変更されていれば True を返す"""
+    recorded = state['files'].get(Path(path).name)
+    return recorded is None or {k: recorded.get(k) for k in ('size', 'mtime_ns')} != file_signature(path)
+
+
+def mark_processed(path: Path, state: dict, **extra):
+    """ファイルを処理済みとして状態に記録する。extra には年度などの付随情報を渡せる"""
+    state['files'][Path(path).name] = {**file_signature(path), **extra}
+
+
+def is_up_to_date(input_path: Path, output_path: Path) -> bool:
+    """出力ファイルが存在し、入力ファイルより新しければ True を返す"""
+    return output_path.exists() and output_path.stat().st_mtime_ns >= Path(input_path).stat().st_mtime_ns
+
+
+# --- 年度単位の差分処理 ---
+# 07 以降のステージは入力ファイルを対象年度ごとにまとめ、変更のあった年度の中間テーブル (シャード) だけを作り直す。
+
+def group_files_by_year(paths: list, state: dict, resolve_year) -> dict:
+    """
+    ファイルを対象年度ごとにまとめる。年度は resolve_year(path) で判定し、
+    変更のないファイルは前回記録した年度を使う。年度を判定できないファイルは除く。
+    """
+    files_by_year = {}
+    for path in paths:
+        recorded = state['files'].get(Path(path).name, {})
+        if not is_changed(path, state) and recorded.get('year'):
+            file_year = recorded['year']
+        else:
+            file_year = resolve_year(path)
+        if not file_year:
+            print(f"  - [Warning] Could not determine the fiscal year of '{Path(path).name}'. Skipping.")
+            continue
+        files_by_year.setdefault(file_year, []).append(path)
+    return files_by_year
+
+
+def plan_year_rebuild(files_by_year: dict, state: dict, forced_years=(), shard_exists=None):
+    """
+    作り直す年度と、入力ファイルがなくなった年度を返す。
+    新規・変更ファイルを含む年度、ファイル構成が前回と変わった年度、
+    シャードが存在しない年度 (shard_exists(year) が False)、forced_years に含まれる年度を作り直す。
+    なくなった年度は状態から取り除く (シャードの削除は呼び出し側で行う)。
+    """
+    recorded_years = state.setdefault('years', {})
+    dirty_years = sorted(
+        year for year, paths in files_by_year.items()
+        if year in forced_years
+        or any(is_changed(path, state) for path in paths)
+        or sorted(Path(p).name for p in paths) != recorded_years.get(str(year))
+        or (shard_exists is not None and not shard_exists(year))
+    )
+    removed_years = sorted(int(y) for y in recorded_years if int(y) not in files_by_year)
+    for year in removed_years:
+        del recorded_years[str(year)]
+    return dirty_years, removed_years
+
+
+def mark_year_processed(state: dict, year: int, paths: list, processed_names=None):
+    """年度の入力ファイル構成と、処理できたファイル (processed_names、省略時は全て) を状態に記録する"""
+    for path in paths:
+        if processed_names is None or Path(path).name in processed_names:
+            mark_processed(path, state, year=year)
+    state.setdefault('years', {})[str(year)] = sorted(Path(p).name for p in paths)
+
+
+def concat_csv_shards(shard_paths: list, output_path: Path, columns: list) -> int:
+    """
+    同じ列構成のCSVシャードを、DataFrameを経由せずに行単位で連結して書き出し、データ行数を返す。
+    メモリ使用量はシャードの大きさによらない。
+    """
+    total = 0
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as out:
+        out.write(','.join(columns) + '\n')
+        for path in shard_paths:
+            with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+                next(f, None)  # ヘッダー行
+                for line in f:
+                    out.write(line)
+                    total += 1
+    return total
+
+
+def _sort_key(header: list, sort_columns: list, numeric_columns=()):
+    """
+    CSVの行 (文字列のリスト) の並び順のキーを返す関数を作る。
+    pandas の sort_values と同じく、値のない行はその列で最後に並べる。numeric_columns の列は数値として比較する。
+    """
+    positions = [(header.index(col), col in numeric_columns) for col in sort_columns]
+    if len(positions) == 1 and not positions[0][1]:
+        # 文字列の列1つ (代理キーなど) で並べる場合は、列ごとのキーの組み立てを省く
+        i = positions[0][0]
+        return lambda row: (row[i] == '', row[i])
+
+    def key(row):
+        return tuple(
+            (row[i] == '', float(row[i]) if numeric and row[i] else row[i])
+            for i, numeric in positions
+        )
+    return key
+
+
+def _iter_shard_rows(path: Path, columns: list, sort_columns: list, numeric_columns):
+    """シャードの行を出力の列順に並べ替えて (キー, 行) として返す。行がキーの順に並んでいなければエラーにする"""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = [header.index(col) if col in header else None for col in columns]
+        reorder = positions != list(range(len(header)))
+        key = _sort_key(columns, sort_columns, numeric_columns)
+        previous = None
+        for row in reader:
+            if reorder:
+                row = [row[i] if i is not None else '' for i in positions]
+            current = key(row)
+            if previous is not None and current < previous:
+                raise ValueError(f"Shard '{path}' is not sorted by {sort_columns}. Rebuild it with --full or --year.")
+            previous = current
+            yield current, row
+
+
+def iter_merged_shard_rows(shard_paths: list, columns: list, sort_columns: list, numeric_columns=()):
+    """
+    それぞれ sort_columns の順に並んだCSVシャードを、k-way merge で1つの並びにして行 (文字列のリスト) を返す。
+    各シャードからは1行ずつしか読み込まないため、メモリ使用量はシャードの数と大きさによらない。
+    キーが同じ行は shard_paths の順に並ぶ。
+    """
+    streams = [_iter_shard_rows(path, columns, sort_columns, numeric_columns) for path in shard_paths]
+    for _, row in heapq.merge(*streams, key=lambda item: item[0]):
+        yield row
+
+
+def merge_sorted_csv_shards(shard_paths: list, output_path: Path, columns: list, sort_columns: list,
+                            numeric_columns=()) -> int:
+    """整列済みのCSVシャードを k-way merge で1つの整列済みCSVにして書き出し、データ行数を返す"""
+    total = 0
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as out:
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+        for row in iter_merged_shard_rows(shard_paths, columns, sort_columns, numeric_columns):
+            writer.writerow(row)
+            total += 1
+    return total
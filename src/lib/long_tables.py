@@ -0,0 +1,176 @@
+import re
+
+import pandas as pd
+
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.amounts import AMOUNT_COLUMN, parse_amounts, is_amount_column
+
+# --- 横持ちの列 -> 縦持ちテーブル ---
+# レビューシートでは予算額・執行額や費目・使途が「年度×項目」「ブロック×明細」ごとの列として並んでいる。
+# 集計しやすいよう、これらを (事業, 年度, 項目) ごとに1行の縦持ちテーブルに変換する。
+
+# 例: '予算額・執行額(単位:百万円)-2023年度予算の状況当初予算' -> (2023, '当初予算')
+RE_BUDGET_COLUMN = re.compile(r'^予算額.*?-(\d{2,4})年度-?(.*)$')
+RE_BUDGET_ITEM_PREFIX = re.compile(r'^-?(?:予算の状況|状況)?-?')
+
+# 例: '費目・使途(...)-A.支払先金額(百万円).1' -> ('A', 2, '金額')
+RE_EXPENSE_COLUMN = re.compile(r'^費目・使途.*-([A-Z])\.支払先(費目|使途|金額)(?:\(百万円\))?(?:\.(\d+))?$')
+
+# 例: '支出先上位10者リスト-A.法人番号3' -> ('A', 3, '法人番号')
+RE_PAYEE_COLUMN = re.compile(r'^支出先上位10者リスト-([A-Z])\.(支出先|法人番号|支出額)(?:\(百万円\))?(\d+)?(?:\.(\d+))?$')
+
+# '金額' は元の表記、AMOUNT_COLUMN はそれを解析した固定小数点の整数 (千円単位)
+BUDGET_COLUMNS = ['id', 'year', 'ministry_id', 'budget_year', '予算項目', '金額', AMOUNT_COLUMN]
+EXPENSE_COLUMNS = ['id', 'year', 'ministry_id', '支払ブロックID', '明細連番', '費目', '使途', '金額', AMOUNT_COLUMN]
+PAYEE_COLUMNS = ['id', 'year', 'ministry_id', '支払ブロックID', '順位', '支出先', '法人番号', '金額', AMOUNT_COLUMN]
+SEGMENT_COLUMNS = [
+    'id', 'year', 'ministry_id', 'source_row', 'segment_sequence', 'セグメント名',
+    'budget_year', '項目', '値', AMOUNT_COLUMN,
+]
+
+# セグメントシートで、縦持ちにせず各行に残す列 (事業のキーと、セグメントを識別する列)
+SEGMENT_KEY_COLUMNS = ['府省庁', '府省', '事業名'] + ID_CANDIDATE_COLUMNS
+SEGMENT_NAME_COLUMN = 'セグメント名'
+
+
+def budget_column_map(columns) -> pd.DataFrame:
+    """
+    予算額・執行額の列名を解析し、列名・予算年度・予算項目の対応表を返す。
+    2桁の年度は平成の年として西暦に直す。
+    """
+    records = []
+    for col in columns:
+        match = RE_BUDGET_COLUMN.match(str(col))
+        if not match:
+            continue
+        year_str, item = match.groups()
+        year = int(year_str) if len(year_str) == 4 else 1988 + int(year_str)
+        item = RE_BUDGET_ITEM_PREFIX.sub('', item).replace('要求', '')
+        records.append({'column': col, 'budget_year': year, '予算項目': item})
+    return pd.DataFrame(records, columns=['column', 'budget_year', '予算項目'])
+
+
+def expense_column_map(columns) -> pd.DataFrame:
+    """費目・使途の列名を解析し、列名・支払ブロック・明細連番・項目 (費目/使途/金額) の対応表を返す"""
+    records = []
+    for col in columns:
+        match = RE_EXPENSE_COLUMN.match(str(col))
+        if not match:
+            continue
+        block, field, seq = match.groups()
+        records.append({'column': col, '支払ブロックID': block, '明細連番': int(seq or 0) + 1, 'field': field})
+    return pd.DataFrame(records, columns=['column', '支払ブロックID', '明細連番', 'field'])
+
+
+def payee_column_map(columns) -> pd.DataFrame:
+    """
+    支出先上位10者リストの列名を解析し、列名・支払ブロック・順位・項目 (支出先/法人番号/金額) の対応表を返す。
+    順位は列名末尾の番号とし、番号のない列は重複列の接尾辞 ('.1' など) から求める。
+    """
+    records = []
+    for col in columns:
+        match = RE_PAYEE_COLUMN.match(str(col))
+        if not match:
+            continue
+        block, field, rank, dup = match.groups()
+        rank = int(rank) if rank else int(dup or 0) + 1
+        records.append({'column': col, '支払ブロックID': block, '順位': rank, 'field': '金額' if field == '支出額' else field})
+    return pd.DataFrame(records, columns=['column', '支払ブロックID', '順位', 'field'])
+
+
+def _row_keys(df: pd.DataFrame, business_ids: pd.Series, ministry_ids: pd.Series, file_year: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'id': business_ids.values, 'year': file_year, 'ministry_id': ministry_ids.values,
+    }, index=pd.RangeIndex(len(df)))
+
+
+def melt_budget(df: pd.DataFrame, business_ids: pd.Series, ministry_ids: pd.Series, file_year: int) -> pd.DataFrame:
+    """予算額・執行額の列を (事業, 予算年度, 予算項目) ごとの縦持ちテーブルに変換する。空のセルは行にしない"""
+    column_map = budget_column_map(df.columns)
+    if column_map.empty:
+        return pd.DataFrame(columns=BUDGET_COLUMNS)
+
+    values = df[column_map['column'].tolist()].set_axis(pd.RangeIndex(len(df)))
+    values.columns = pd.MultiIndex.from_frame(column_map[['budget_year', '予算項目']])
+    long = values.stack(level=[0, 1]).rename('金額').reset_index(level=[1, 2])
+    long = long[long['金額'].notna() & (long['金額'].astype('string').str.strip() != '')]
+
+    keys = _row_keys(df, business_ids, ministry_ids, file_year)
+    return keys.join(long, how='inner').reset_index(drop=True).reindex(columns=BUDGET_COLUMNS)
+
+
+def melt_expense(df: pd.DataFrame, business_ids: pd.Series, ministry_ids: pd.Series, file_year: int) -> pd.DataFrame:
+    """費目・使途の列を (事業, 支払ブロック, 明細) ごとの縦持ちテーブルに変換する。費目・使途・金額が全て空の明細は除く"""
+    column_map = expense_column_map(df.columns)
+    if column_map.empty:
+        return pd.DataFrame(columns=EXPENSE_COLUMNS)
+
+    values = df[column_map['column'].tolist()].set_axis(pd.RangeIndex(len(df)))
+    values.columns = pd.MultiIndex.from_frame(column_map[['支払ブロックID', '明細連番', 'field']])
+    long = values.stack(level=[0, 1]).reindex(columns=['費目', '使途', '金額'])
+    long = long.replace(r'^\s*$', None, regex=True).dropna(how='all').reset_index(level=[1, 2])
+
+    keys = _row_keys(df, business_ids, ministry_ids, file_year)
+    return keys.join(long, how='inner').reset_index(drop=True).reindex(columns=EXPENSE_COLUMNS)
+
+
+def melt_payees(df: pd.DataFrame, business_ids: pd.Series, ministry_ids: pd.Series, file_year: int) -> pd.DataFrame:
+    """支出先上位10者リストの列を (事業, 支払ブロック, 順位) ごとの縦持ちテーブルに変換する。支出先名も法人番号もない行は除く"""
+    column_map = payee_column_map(df.columns)
+    if column_map.empty:
+        return pd.DataFrame(columns=PAYEE_COLUMNS)
+
+    values = df[column_map['column'].tolist()].set_axis(pd.RangeIndex(len(df)))
+    values.columns = pd.MultiIndex.from_frame(column_map[['支払ブロックID', '順位', 'field']])
+    long = values.stack(level=[0, 1]).reindex(columns=['支出先', '法人番号', '金額'])
+    long = long.replace(r'^\s*$', None, regex=True).dropna(subset=['支出先', '法人番号'], how='all').reset_index(level=[1, 2])
+
+    keys = _row_keys(df, business_ids, ministry_ids, file_year)
+    return keys.join(long, how='inner').reset_index(drop=True).reindex(columns=PAYEE_COLUMNS)
+
+
+def attach_amounts(long_df: pd.DataFrame) -> pd.Series:
+    """縦持ちテーブルの '金額' を解析して AMOUNT_COLUMN に格納し、解析できなかった行のマスクを返す"""
+    long_df[AMOUNT_COLUMN], failed = parse_amounts(long_df['金額'])
+    return failed
+
+
+def segment_item(column_name) -> tuple:
+    """セグメントシートの値の列名を (予算年度, 項目名) に分解する。年度を含まない列は予算年度を None とする"""
+    match = RE_BUDGET_COLUMN.match(str(column_name))
+    if match:
+        year_str, item = match.groups()
+        year = int(year_str) if len(year_str) == 4 else 1988 + int(year_str)
+        return year, RE_BUDGET_ITEM_PREFIX.sub('', item)
+    return None, str(column_name).rsplit('-', 1)[-1]
+
+
+def melt_segments(chunk: pd.DataFrame, business_ids: pd.Series, ministry_ids: pd.Series,
+                  file_year: int, segment_sequence: pd.Series) -> pd.DataFrame:
+    """
+    セグメントシートの1チャンクを (セグメント行, 項目) ごとの縦持ちテーブルに変換する。
+    chunk のインデックスは元ファイルでの行番号とし、source_row として残す。
+    金額の列は固定小数点の整数にも変換する。
+    """
+    value_cols = [col for col in chunk.columns if col not in SEGMENT_KEY_COLUMNS and col != SEGMENT_NAME_COLUMN]
+    if not value_cols:
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
+
+    rows = pd.DataFrame({
+        'id': business_ids.values, 'year': file_year, 'ministry_id': ministry_ids.values,
+        'source_row': chunk.index, 'segment_sequence': segment_sequence.values,
+        'セグメント名': chunk[SEGMENT_NAME_COLUMN].values if SEGMENT_NAME_COLUMN in chunk.columns else None,
+    }, index=chunk.index)
+
+    values = chunk[value_cols].stack().rename('値')
+    values = values[values.astype('string').str.strip() != '']
+    long = values.reset_index(level=1)
+    long.columns = ['column', '値']
+
+    items = pd.DataFrame([segment_item(col) for col in value_cols], index=value_cols, columns=['budget_year', '項目'])
+    items['budget_year'] = items['budget_year'].astype('Int64')
+    long = long.join(items, on='column')
+    amount_cols = [col for col in value_cols if is_amount_column(col)]
+    long[AMOUNT_COLUMN] = parse_amounts(long['値'].where(long['column'].isin(amount_cols)))[0]
+
+    return rows.join(long.drop(columns='column'), how='inner').reindex(columns=SEGMENT_COLUMNS)
@@ -0,0 +1,283 @@
+import io
+import os
+import re
+import csv
+from pathlib import Path
+
+from src.lib import rowblock, sparse
+from src.lib.reader import CSV_ENCODING, table_format, read_columns, read_table
+
+# --- 読み込み方法の自動選択 (メモリ予算) ---
+# ファイルの大きさ・列の数・要求された列から読み込み時のメモリ使用量を見積もり、メモリ予算に収まる読み込み方法を選ぶ。
+#   'full'       全ての列を一括で読み込む
+#   'projected'  要求された列だけを一括で読み込む
+#   'chunked'    予算に収まる行数ずつ読み込む (要求された列があればその列だけ)
+# メモリ予算は --memory-budget、環境変数 GYOUKAKU_MEMORY_BUDGET ('4G', '512M' など)、
+# どちらもなければ空きメモリの DEFAULT_BUDGET_FRACTION 倍とする。
+# 見積もりはファイルの先頭を標本として読み、列ごとの値のある割合と文字数から求める。
+# 値は全て文字列として見積もるため、数値の列が多いファイルでは実際より大きめになる。
+
+MEMORY_BUDGET_ENV_VAR = 'GYOUKAKU_MEMORY_BUDGET'
+DEFAULT_BUDGET_FRACTION = 0.5
+# 空きメモリを取得できない環境での既定の予算
+FALLBACK_BUDGET_BYTES = 2 * 1024 ** 3
+
+# 見積もりに使う標本の大きさ (CSVは先頭のバイト数、ブロック形式は先頭の行数)
+SAMPLE_BYTES = 4 * 1024 ** 2
+SAMPLE_ROWS = 2000
+
+# 疎な列形式で、文字数を調べるために展開する列の数の上限 (値のある割合は索引から正確に求める)
+SAMPLE_COLUMNS = 500
+
+# DataFrame の1セルあたりの大きさ: 参照 (8バイト) に加え、値のあるセルは文字列オブジェクト (固定部分 + 1文字あたり2バイト)
+CELL_POINTER_BYTES = 8
+STR_OBJECT_BYTES = 60
+STR_CHAR_BYTES = 2
+# CSVのパーサーが1フィールドごとに保持するトークンの位置情報 (ポインタとオフセット)
+TOKEN_BYTES = 16
+# チャンクに分ける場合の最小の行数 (これより小さくすると読み込みのオーバーヘッドが大きくなる)
+MIN_CHUNK_ROWS = 500
+
+LOAD_FULL = 'full'
+LOAD_PROJECTED = 'projected'
+LOAD_CHUNKED = 'chunked'
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+RE_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$', re.IGNORECASE)
+
+
+def parse_size(text: str) -> int:
+    """'4G', '512M', '1.5GB', '1024' のような大きさの表記をバイト数に変換する"""
+    match = RE_SIZE.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid memory size '{text}'. Use a number with an optional K/M/G/T suffix (e.g. '4G').")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def format_size(n_bytes: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n_bytes < 1024 or unit == 'GB':
+            return f"{n_bytes:.0f}{unit}" if unit == 'B' else f"{n_bytes:.1f}{unit}"
+        n_bytes /= 1024
+
+
+def available_memory():
+    """空きメモリ (バイト数) を返す。取得できない環境では None"""
+    try:
+        with open('/proc/meminfo', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def resolve_memory_budget(size: str = None) -> int:
+    """メモリ予算 (バイト数) を、引数 > 環境変数 > 空きメモリの順に決める"""
+    size = size or os.environ.get(MEMORY_BUDGET_ENV_VAR, '').strip()
+    if size:
+        return parse_size(size)
+    available = available_memory()
+    if available is None:
+        return FALLBACK_BUDGET_BYTES
+    return int(available * DEFAULT_BUDGET_FRACTION)
+
+
+def add_memory_arguments(parser):
+    """メモリ予算を指定するオプションを追加する"""
+    parser.add_argument('--memory-budget', metavar='SIZE',
+                        help=f"読み込みに使うメモリの上限 (例: 4G, 512M)。既定は環境変数 {MEMORY_BUDGET_ENV_VAR}、"
+                             f"なければ空きメモリの{int(DEFAULT_BUDGET_FRACTION * 100)}%%")
+
+
+# --- ファイルの見積もり ---
+
+class TableProfile:
+    """
+    見積もりに使うファイルの概要。
+    rows: データ行数 (CSVは標本からの推定値)、columns: 読み込んだ場合の列名、
+    cell_bytes: 列ごとの DataFrame での1行あたりの大きさ、text_bytes: 列ごとの1行あたりのCSVのテキストの大きさ
+    """
+
+    def __init__(self, path: Path, fmt: str, rows: int, columns: list, cell_bytes: list, text_bytes: list):
+        self.path = path
+        self.format = fmt
+        self.rows = rows
+        self.columns = columns
+        self.cell_bytes = cell_bytes
+        self.text_bytes = text_bytes
+
+    def select_positions(self, usecols=None) -> list:
+        """usecols (列名のリスト・列名を受け取る関数・None) に該当する列の位置"""
+        if usecols is None:
+            return list(range(len(self.columns)))
+        if callable(usecols):
+            return [i for i, col in enumerate(self.columns) if usecols(col)]
+        wanted = set(usecols)
+        return [i for i, col in enumerate(self.columns) if col in wanted]
+
+    def frame_row_bytes(self, positions: list) -> float:
+        """指定した列を読み込んだ DataFrame の1行あたりの大きさ"""
+        return sum(self.cell_bytes[i] for i in positions)
+
+    def row_bytes(self, positions: list) -> float:
+        """指定した列を読み込む場合の1行あたりのメモリ使用量 (読み込み中のバッファを含む)"""
+        frame = self.frame_row_bytes(positions)
+        if self.format == 'sparse':
+            # 疎な列形式は要求された列のセグメントだけを展開し、展開した値をCSVのテキストとして解析する。
+            # 展開した値は解析の前に手放すため、CSV と同じく DataFrame・テキスト・トークンの和となる (要求された列の分だけ)
+            return frame + sum(self.text_bytes[i] for i in positions) + len(positions) * TOKEN_BYTES
+        # CSV・行ブロック形式は、要求された列に関わらず行のテキスト全体をトークンに分ける
+        return frame + sum(self.text_bytes) + len(self.columns) * TOKEN_BYTES
+
+
+def _column_bytes(filled: int, chars: int, encoded: int, rows: int):
+    """標本の列の集計 (値のあるセルの数・文字数・UTF-8のバイト数) から、1行あたりの (DataFrame での大きさ, テキストの大きさ)"""
+    rows = max(rows, 1)
+    cell = CELL_POINTER_BYTES + (filled * STR_OBJECT_BYTES + chars * STR_CHAR_BYTES) / rows
+    # 全てのセルをクォートするため、値のほかにセルごとに3バイト (クォートと区切り)
+    return cell, encoded / rows + 3
+
+
+def _sample_rows_bytes(rows: list, width: int):
+    """標本の行 (文字列のリスト) から、列ごとの (DataFrame での大きさ, テキストの大きさ) のリストを求める"""
+    filled, chars, encoded = [0] * width, [0] * width, [0] * width
+    for row in rows:
+        for i, cell in enumerate(row[:width]):
+            if cell:
+                filled[i] += 1
+                chars[i] += len(cell)
+                encoded[i] += len(cell.encode('utf-8'))
+    sizes = [_column_bytes(filled[i], chars[i], encoded[i], len(rows)) for i in range(width)]
+    return [cell for cell, _ in sizes], [text for _, text in sizes]
+
+
+def _profile_csv(path: Path, columns: list) -> TableProfile:
+    file_size = path.stat().st_size
+    with open(path, 'rb') as f:
+        data = f.read(SAMPLE_BYTES)
+    complete = len(data) == file_size
+    if not complete:
+        # 途中で切れた最後の行は使わない
+        data = data[:data.rfind(b'\n') + 1]
+    rows = list(csv.reader(io.StringIO(data.decode(CSV_ENCODING, errors='ignore'), newline='')))[1:]
+    cell_bytes, text_bytes = _sample_rows_bytes(rows[:SAMPLE_ROWS], len(columns))
+    if complete:
+        row_count = len(rows)
+    else:
+        # 標本の1行あたりのバイト数からファイル全体の行数を推定する
+        row_count = int(file_size / len(data) * len(rows))
+    return TableProfile(path, 'csv', row_count, columns, cell_bytes, text_bytes)
+
+
+def _profile_rowblock(path: Path, columns: list) -> TableProfile:
+    rows = list(rowblock.iter_rows(path, 0, SAMPLE_ROWS))
+    cell_bytes, text_bytes = _sample_rows_bytes(rows, len(columns))
+    return TableProfile(path, 'rowblock', rowblock.read_index(path)['total_rows'], columns, cell_bytes, text_bytes)
+
+
+def _profile_sparse(path: Path, columns: list) -> TableProfile:
+    """
+    値のある割合は索引に記録された列ごとの件数から求め、文字数は値のある列のうち最大 SAMPLE_COLUMNS 列を
+    先頭 SAMPLE_ROWS 行だけ展開して調べる (調べなかった列は、調べた列の平均を使う)。
+    """
+    index = sparse.read_index(path)
+    total_rows = index['total_rows']
+    non_null = index['non_null']
+    filled_positions = [i for i, n in enumerate(non_null) if n]
+    step = max(1, -(-len(filled_positions) // SAMPLE_COLUMNS))
+    sampled = filled_positions[::step]
+    sample = sparse.read_frame(path, usecols=[columns[i] for i in sampled], stop=SAMPLE_ROWS, dtype=str)
+
+    chars_per_value, bytes_per_value = {}, {}
+    for i, col in zip(sampled, sample.columns):
+        values = sample[col].dropna()
+        if len(values):
+            chars_per_value[i] = values.str.len().mean()
+            bytes_per_value[i] = values.map(lambda v: len(v.encode('utf-8'))).mean()
+    mean_chars = sum(chars_per_value.values()) / len(chars_per_value) if chars_per_value else 0
+    mean_bytes = sum(bytes_per_value.values()) / len(bytes_per_value) if bytes_per_value else 0
+
+    cell_bytes, text_bytes = [], []
+    for i, n in enumerate(non_null):
+        cell, text = _column_bytes(n, n * chars_per_value.get(i, mean_chars), n * bytes_per_value.get(i, mean_bytes),
+                                   total_rows)
+        cell_bytes.append(cell)
+        text_bytes.append(text)
+    return TableProfile(path, 'sparse', total_rows, columns, cell_bytes, text_bytes)
+
+
+def profile_table(path: Path) -> TableProfile:
+    """ファイルの先頭を標本として読み、行数と列ごとのメモリ使用量を見積もる"""
+    path = Path(path)
+    fmt = table_format(path)
+    columns = read_columns(path)
+    if fmt == 'rowblock':
+        return _profile_rowblock(path, columns)
+    if fmt == 'sparse':
+        return _profile_sparse(path, columns)
+    return _profile_csv(path, columns)
+
+
+# --- 読み込み方法の選択 ---
+
+class LoadPlan:
+    """
+    選ばれた読み込み方法。read() で DataFrame を、iter_frames() でチャンクのイテレータを返す。
+    mode が 'chunked' 以外の場合、iter_frames() はファイル全体を1つのチャンクとして返す。
+    """
+
+    def __init__(self, path: Path, mode: str, usecols, chunksize: int, estimated_bytes: int, budget: int, rows: int):
+        self.path = path
+        self.mode = mode
+        self.usecols = usecols
+        self.chunksize = chunksize
+        self.estimated_bytes = estimated_bytes
+        self.budget = budget
+        self.rows = rows
+
+    def describe(self) -> str:
+        text = f"{self.mode} load (estimated {format_size(self.estimated_bytes)} for ~{self.rows} rows, " \
+               f"budget {format_size(self.budget)})"
+        if self.mode == LOAD_CHUNKED:
+            text += f", {self.chunksize} rows per chunk"
+        return text
+
+    def read(self, **read_kwargs):
+        return read_table(self.path, usecols=self.usecols, **read_kwargs)
+
+    def iter_frames(self, **read_kwargs):
+        if self.mode == LOAD_CHUNKED:
+            return read_table(self.path, usecols=self.usecols, chunksize=self.chunksize, **read_kwargs)
+        return iter([self.read(**read_kwargs)])
+
+
+def plan_load(path: Path, usecols=None, budget: int = None, allow_chunks: bool = True) -> LoadPlan:
+    """
+    読み込みのメモリ使用量を見積もり、予算に収まる読み込み方法を選ぶ。
+    usecols を指定した場合は要求された列だけを読む ('projected')。予算に収まらなければ 'chunked' とし、
+    予算に収まる行数 (MIN_CHUNK_ROWS 以上) ずつ読む。
+    allow_chunks=False (ファイル全体の DataFrame を必要とする呼び出し側) の場合はチャンクに分けず、
+    予算を超える見積もりは警告だけを表示する。
+    """
+    budget = budget or resolve_memory_budget()
+    profile = profile_table(path)
+    positions = profile.select_positions(usecols)
+    per_row = profile.row_bytes(positions)
+    estimated = int(per_row * profile.rows)
+    whole_mode = LOAD_FULL if usecols is None else LOAD_PROJECTED
+
+    if estimated <= budget or profile.rows <= MIN_CHUNK_ROWS:
+        return LoadPlan(path, whole_mode, usecols, None, estimated, budget, profile.rows)
+    if not allow_chunks:
+        print(f"  - [Warning] Loading '{Path(path).name}' is estimated to use {format_size(estimated)}, "
+              f"over the memory budget of {format_size(budget)}.")
+        return LoadPlan(path, whole_mode, usecols, None, estimated, budget, profile.rows)
+    # 呼び出し側が前のチャンクを保持したまま次のチャンクを読むため、チャンク1つ分の DataFrame を加えて見積もる
+    chunk_row_bytes = per_row + profile.frame_row_bytes(positions)
+    chunksize = max(MIN_CHUNK_ROWS, int(budget / chunk_row_bytes))
+    return LoadPlan(path, LOAD_CHUNKED, usecols, chunksize, int(chunk_row_bytes * chunksize), budget, profile.rows)
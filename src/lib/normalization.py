@@ -1,4 +1,5 @@
 import re
+import time
 import unicodedata
 import uuid
 
@@ -20,6 +21,31 @@ RE_HYPHEN_LIKE = re.compile(HYPHEN_LIKE_CHARS)
 RE_KATAKANA_HYPHEN = re.compile(r'([ァ-ヴ])' + HYPHEN_LIKE_CHARS + r'(?=[ァ-ヴ])')
 KATAKANA_HYPHEN_PRE_NORMALIZATION = {"リスト-グル-プ": "リスト-グループ"}
 KATAKANA_HYPHEN_EXCLUSIONS = ["リスト-グループ"]
+RE_KATAKANA_HYPHEN_PRE_NORMALIZATION = [
+    (re.compile(HYPHEN_LIKE_CHARS.join(map(re.escape, wrong.split('-')))), correct)
+    for wrong, correct in KATAKANA_HYPHEN_PRE_NORMALIZATION.items()
+]
+RE_KATAKANA_HYPHEN_EXCLUSIONS = [
+    re.compile(HYPHEN_LIKE_CHARS.join(map(re.escape, exclusion.split('-'))))
+    for exclusion in KATAKANA_HYPHEN_EXCLUSIONS
+]
+RE_HYPHEN_BETWEEN_KANA_KANJI = re.compile(r'([ぁ-んァ-ヴ一-龠])-(?=[ぁ-んァ-ヴ一-龠])')
+
+# 4. 法人名の名寄せ用
+# 名称の先頭・末尾に付く法人格の表記 (正式名称と、NFKC正規化後の「(株)」のような略記)
+LEGAL_FORMS = [
+    '株式会社', '有限会社', '合同会社', '合名会社', '合資会社',
+    '一般社団法人', '公益社団法人', '一般財団法人', '公益財団法人', '社団法人', '財団法人',
+    '独立行政法人', '国立研究開発法人', '地方独立行政法人', '国立大学法人', '公立大学法人', '大学共同利用機関法人',
+    '特定非営利活動法人', 'NPO法人', '学校法人', '社会福祉法人', '社会医療法人', '医療法人', '宗教法人',
+]
+LEGAL_FORM_ABBREVIATIONS = ['株', '有', '同', '名', '資', '一社', '公社', '一財', '公財', '社', '財', '独', '特非', '学', '福', '医', '宗']
+_LEGAL_FORM_PATTERN = '|'.join(
+    [re.escape(form) for form in sorted(LEGAL_FORMS, key=len, reverse=True)]
+    + [r'\(' + re.escape(abbr) + r'\)' for abbr in sorted(LEGAL_FORM_ABBREVIATIONS, key=len, reverse=True)]
+)
+RE_LEGAL_FORM_AFFIX = re.compile(r'^(?:' + _LEGAL_FORM_PATTERN + r')\s*|\s*(?:' + _LEGAL_FORM_PATTERN + r')$')
+RE_ENTITY_NAME_NOISE = re.compile(r'[\s・]')
 
 
 # --- 変換ロジック ---
@@ -34,64 +60,173 @@ def _get_seireki(era, year_str):
     if era in ('令和', 'R'): return 2018 + year
     return None
 
+# --- 正規化ルール ---
+# normalize_text は以下のルールを順に適用する。各ルールは (文字列, プレースホルダー) を受け取り、変換後の文字列を返す。
+# プレースホルダーは、除外する表記をハイフン処理から守るために1回の呼び出しの中で共有する辞書。
+
+LIST_MARKER_MAP = {'①':'1','②':'2','③':'3','④':'4','⑤':'5','⑥':'6','⑦':'7','⑧':'8','⑨':'9','⑩':'10',
+                   '⑪':'11','⑫':'12','⑬':'13','⑭':'14','⑮':'15','⑯':'16','⑰':'17','⑱':'18','⑲':'19','⑳':'20'}
+
+def _replace_list_marker(match):
+    # NFKCで'①'は'1'に変換されるが、ここでは手動で変換テーブルを持つ
+    return LIST_MARKER_MAP.get(match.group(1), match.group(1)) + '. '
+
+def _rule_list_marker(text, placeholders):
+    """①などのリストマーカーを「1. 」のように変換し、数値の連結を防ぐ (NFKC正規化の前に実施)"""
+    return RE_LIST_MARKER.sub(_replace_list_marker, text)
+
+def _rule_nfkc(text, placeholders):
+    return unicodedata.normalize('NFKC', text)
+
+def _rule_tilde(text, placeholders):
+    """~ と ～ の揺れを、スペースも含めて統一"""
+    return RE_TILDE_VARIANTS.sub('～', text)
+
+def _convert_wareki_range(match):
+    era, year1_str, year2_str = match.groups()
+    seireki1 = _get_seireki(era, year1_str)
+    seireki2 = _get_seireki(era, year2_str) # 省略された元号を補って変換
+    if seireki1 is not None and seireki2 is not None:
+        return f"{seireki1}～{seireki2}"
+    return match.group(0) # 変換失敗時は元に戻す
+
+def _rule_wareki_range(text, placeholders):
+    """「平成9～25年度」のような範囲指定を、単体の和暦より先に処理"""
+    return RE_WAREKI_RANGE.sub(_convert_wareki_range, text)
+
+def _convert_wareki_single(match):
+    era, year_str = match.groups()
+    seireki = _get_seireki(era, year_str)
+    return str(seireki) if seireki is not None else match.group(0)
+
+def _rule_wareki_single(text, placeholders):
+    return RE_WAREKI_SINGLE.sub(_convert_wareki_single, text)
+
+def _rule_katakana_hyphen_exclusions(text, placeholders):
+    """表記揺れを直したうえで、除外する表記 (「リスト-グループ」など) をプレースホルダーに置き換えて以降のハイフン処理から守る"""
+    for pattern, correct in RE_KATAKANA_HYPHEN_PRE_NORMALIZATION:
+        text = pattern.sub(correct, text)
+    def replacer(match):
+        placeholder = f"__PLACEHOLDER_{uuid.uuid4().hex}__"
+        placeholders[placeholder] = match.group(0)
+        return placeholder
+    for pattern in RE_KATAKANA_HYPHEN_EXCLUSIONS:
+        text = pattern.sub(replacer, text)
+    return text
+
+def _rule_katakana_long_vowel(text, placeholders):
+    """カタカナに挟まれたハイフン類を長音符「ー」にする"""
+    return RE_KATAKANA_HYPHEN.sub(r'\1ー', text)
+
+def _rule_hyphen_variants(text, placeholders):
+    return RE_HYPHEN_LIKE.sub('-', text)
+
+def _rule_hyphen_between_kanji(text, placeholders):
+    """かな・漢字に挟まれたハイフンを取り除く"""
+    return RE_HYPHEN_BETWEEN_KANA_KANJI.sub(r'\1', text)
+
+# (ルール名, 関数) を適用する順に並べたもの。ルール名は RuleStats の集計に使う
+NORMALIZATION_RULES = [
+    ('list_marker', _rule_list_marker),
+    ('nfkc', _rule_nfkc),
+    ('tilde', _rule_tilde),
+    ('wareki_range', _rule_wareki_range),
+    ('wareki_single', _rule_wareki_single),
+    ('katakana_hyphen_exclusions', _rule_katakana_hyphen_exclusions),
+    ('katakana_long_vowel', _rule_katakana_long_vowel),
+    ('hyphen_variants', _rule_hyphen_variants),
+    ('hyphen_between_kanji', _rule_hyphen_between_kanji),
+]
+RULE_NAMES = [name for name, _ in NORMALIZATION_RULES]
+_RULE_FUNCTIONS = [rule for _, rule in NORMALIZATION_RULES]
+
+def _restore_placeholders(text, placeholders):
+    for placeholder, original_value in placeholders.items():
+        text = text.replace(placeholder, original_value)
+    return text.strip()
+
 def normalize_text(text: str) -> str:
     """
     単一のセル文字列に対して、定義された全ての日本語正規化ルールを適用する。
     """
     if not isinstance(text, str): return text
-
-    # --- ステップ1: 前処理 (NFKC正規化の前に実施) ---
-    
-    # ①などのリストマーカーを「1. 」のように変換し、数値の連結を防ぐ
-    def replace_list_marker(match):
-        # NFKCで'①'は'1'に変換されるが、ここでは手動で変換テーブルを持つ
-        marker_map = { '①':'1','②':'2','③':'3','④':'4','⑤':'5','⑥':'6','⑦':'7','⑧':'8','⑨':'9','⑩':'10',
-                       '⑪':'11','⑫':'12','⑬':'13','⑭':'14','⑮':'15','⑯':'16','⑰':'17','⑱':'18','⑲':'19','⑳':'20'}
-        return marker_map.get(match.group(1), match.group(1)) + '. '
-    text = RE_LIST_MARKER.sub(replace_list_marker, text)
-
-    # --- ステップ2: 基本正規化 ---
-    text = unicodedata.normalize('NFKC', text)
-    
-    # ~ と ～ の揺れを、スペースも含めて統一
-    text = RE_TILDE_VARIANTS.sub('～', text)
-
-    # --- ステップ3: 和暦から西暦への変換 (複数パターン対応) ---
-    
-    # 3a. 「平成9～25年度」のような範囲指定を先に処理
-    def convert_wareki_range(match):
-        era, year1_str, year2_str = match.groups()
-        seireki1 = _get_seireki(era, year1_str)
-        seireki2 = _get_seireki(era, year2_str) # 省略された元号を補って変換
-        if seireki1 is not None and seireki2 is not None:
-            return f"{seireki1}～{seireki2}"
-        return match.group(0) # 変換失敗時は元に戻す
-    text = RE_WAREKI_RANGE.sub(convert_wareki_range, text)
-
-    # 3b. 残りの単体の和暦を処理
-    def convert_wareki_single(match):
-        era, year_str = match.groups()
-        seireki = _get_seireki(era, year_str)
-        return str(seireki) if seireki is not None else match.group(0)
-    text = RE_WAREKI_SINGLE.sub(convert_wareki_single, text)
-    
-    # --- ステップ4: ハイフン関連の処理 (変更なし) ---
     placeholders = {}
-    # (ここから下のハイフン処理ロジックは前回から変更ありません)
-    for wrong, correct in KATAKANA_HYPHEN_PRE_NORMALIZATION.items():
-        pattern_str = HYPHEN_LIKE_CHARS.join(map(re.escape, wrong.split('-')))
-        text = re.sub(pattern_str, correct, text)
-    for exclusion in KATAKANA_HYPHEN_EXCLUSIONS:
-        pattern_str = HYPHEN_LIKE_CHARS.join(map(re.escape, exclusion.split('-')))
-        def replacer(match):
-            placeholder = f"__PLACEHOLDER_{uuid.uuid4().hex}__"
-            placeholders[placeholder] = match.group(0)
-            return placeholder
-        text = re.compile(pattern_str).sub(replacer, text)
-    text = RE_KATAKANA_HYPHEN.sub(r'\1ー', text)
-    text = RE_HYPHEN_LIKE.sub('-', text)
-    text = re.sub(r'([ぁ-んァ-ヴ一-龠])-(?=[ぁ-んァ-ヴ一-龠])', r'\1', text)
-    for placeholder, original_value in placeholders.items():
-        text = text.replace(placeholder, original_value)
+    for rule in _RULE_FUNCTIONS:
+        text = rule(text, placeholders)
+    return _restore_placeholders(text, placeholders)
+
+
+class RuleStats:
+    """
+    正規化ルールごとの適用回数と処理時間を、列 (行の中の位置) ごとに集計する。
+    normalize_text の代わりに normalize(text, position) を呼ぶと、同じ結果を返しつつ
+    ルールごとに「文字列が変わったセルの数 (hits)」と処理時間を記録する。
+    集計しない場合は normalize_text をそのまま使うため、通常の正規化に計測の負荷はかからない。
+    """
+
+    def __init__(self):
+        self.cells = {}  # 列の位置 -> 正規化したセルの数
+        self.hits = {}  # 列の位置 -> ルールごとのヒット数
+        self.seconds = {}  # 列の位置 -> ルールごとの処理時間 (秒)
 
-    return text.strip()
\ No newline at end of file
+    def normalize(self, text: str, position: int) -> str:
+        if not isinstance(text, str): return text
+        hits = self.hits.get(position)
+        if hits is None:
+            self.cells[position] = 0
+            hits = self.hits[position] = [0] * len(_RULE_FUNCTIONS)
+            self.seconds[position] = [0.0] * len(_RULE_FUNCTIONS)
+        seconds = self.seconds[position]
+        self.cells[position] += 1
+        placeholders = {}
+        for i, rule in enumerate(_RULE_FUNCTIONS):
+            started = time.perf_counter()
+            result = rule(text, placeholders)
+            seconds[i] += time.perf_counter() - started
+            if result != text:
+                hits[i] += 1
+            text = result
+        return _restore_placeholders(text, placeholders)
+
+    def to_records(self, column_names: list) -> list:
+        """列・ルールごとの集計をレコード (辞書) のリストで返す。ヘッダーより後ろの位置の列名は空にする"""
+        records = []
+        for position in sorted(self.cells):
+            name = column_names[position] if position < len(column_names) else ''
+            for i, rule in enumerate(RULE_NAMES):
+                records.append({
+                    'column_position': position, 'column': name, 'rule': rule, 'cells': self.cells[position],
+                    'hits': self.hits[position][i], 'seconds': round(self.seconds[position][i], 6),
+                })
+        return records
+
+    def rule_totals(self) -> list:
+        """ルールごとの (ルール名, ヒット数, 処理時間) を、全ての列について合計して返す"""
+        return [
+            (rule, sum(hits[i] for hits in self.hits.values()), sum(seconds[i] for seconds in self.seconds.values()))
+            for i, rule in enumerate(RULE_NAMES)
+        ]
+
+    def checkpoint_state(self) -> dict:
+        """途中までの集計を返す (restore() で再開できる)。JSONに保存できるよう、列の位置をキーにした辞書はリストにする"""
+        return {'columns': [[position, self.cells[position], self.hits[position], self.seconds[position]]
+                            for position in self.cells]}
+
+    def restore(self, state: dict):
+        for position, cells, hits, seconds in state['columns']:
+            self.cells[position] = cells
+            self.hits[position] = hits
+            self.seconds[position] = seconds
+
+
+def normalize_entity_name(text: str) -> str:
+    """
+    支出先などの法人名を、名寄せに使うキーに変換する。
+    normalize_text を適用したうえで先頭・末尾の法人格 (「株式会社」「(株)」など) と空白・中点を取り除き、英字を大文字に揃える。
+    例: '株式会社ＡＢＣ', 'ABC(株)', 'ａｂｃ 株式会社' -> 'ABC'
+    """
+    if not isinstance(text, str): return text
+    text = normalize_text(text)
+    # 法人格だけの名称 (「株式会社」など) は取り除かずに残す
+    text = RE_LEGAL_FORM_AFFIX.sub('', text) or text
+    return RE_ENTITY_NAME_NOISE.sub('', text).upper()
@@ -0,0 +1,321 @@
+import json
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from src.lib.ingest import concat_csv_shards, iter_merged_shard_rows, merge_sorted_csv_shards
+from src.lib.reader import read_csv
+
+# --- 年度・府省庁ごとのパーティション出力 ---
+# 最終テーブルを1つのCSVではなく、年度と府省庁IDごとのディレクトリに分けて書き出す。
+#   <テーブル名>/year=2020/ministry_id=3/part.csv
+#   <テーブル名>/_manifest.json   パーティションごとのパス・行数・列ごとの最小値と最大値
+# 読み込み側はマニフェストだけを見て条件に合わないパーティションを除外し、残ったファイルだけを開く。
+# 年度・府省庁IDの列を持たないテーブル (事業マスタ・事業期間マスタ) は、代理キー 'YYYY-MMMM-NNNN-BBBB' の
+# 年度・府省庁IDの部分でパーティションに分ける。値が空のものは UNKNOWN_PARTITION に入れる。
+# 書き出しは一時ディレクトリに行い、書き終えてから置き換えるため、読み込み側が書きかけのパーティションを見ることはない。
+
+LAYOUT_FILE = 'file'
+LAYOUT_PARTITIONED = 'partitioned'
+LAYOUTS = (LAYOUT_FILE, LAYOUT_PARTITIONED)
+
+PARTITION_COLUMNS = ['year', 'ministry_id']
+MANIFEST_NAME = '_manifest.json'
+PART_FILENAME = 'part.csv'
+UNKNOWN_PARTITION = '__unknown__'
+# 行単位で受け取ったデータをパーティションに振り分けるときに、まとめて書き出す行数
+ROW_BATCH_SIZE = 50000
+# 代理キーで府省庁が不明な場合の府省庁コード (business_keys.MISSING_MINISTRY_CODE)
+MISSING_MINISTRY_CODE = 'XXXX'
+
+
+def add_layout_arguments(parser):
+    """最終テーブルの出力形式を指定するオプションを追加する"""
+    parser.add_argument('--layout', choices=LAYOUTS, default=LAYOUT_FILE,
+                        help="最終テーブルの出力形式。partitioned は年度・府省庁IDごとのディレクトリに分けて書き出す (default: file)")
+
+
+# --- パーティションの値 ---
+
+def _partition_text(values: pd.Series) -> pd.Series:
+    text = values.astype('string').str.strip()
+    # 数値として読み込まれた列の '3.0' のような表記を揃える
+    text = text.str.replace(r'\.0$', '', regex=True)
+    return text.mask(text == '').fillna(UNKNOWN_PARTITION)
+
+
+def partition_values(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    行ごとのパーティションの値 (year, ministry_id) を文字列で返す。
+    列があればその値を、なければ代理キー (id) の年度・府省庁IDの部分を使う。
+    """
+    id_parts = df['id'].astype('string').str.split('-') if 'id' in df.columns else None
+    values = {}
+    for position, col in enumerate(PARTITION_COLUMNS):
+        if col in df.columns:
+            values[col] = _partition_text(df[col])
+        elif id_parts is not None:
+            part = id_parts.str[position]
+            if col == 'ministry_id':
+                part = part.mask(part == MISSING_MINISTRY_CODE).str.lstrip('0').replace('', '0')
+            values[col] = _partition_text(part)
+        else:
+            values[col] = pd.Series(UNKNOWN_PARTITION, index=df.index, dtype='string')
+    return pd.DataFrame(values, index=df.index)
+
+
+def partition_path(values: dict) -> str:
+    return '/'.join(f"{col}={values[col]}" for col in PARTITION_COLUMNS) + '/' + PART_FILENAME
+
+
+# --- 列ごとの最小値・最大値 ---
+
+def column_stats(df: pd.DataFrame) -> dict:
+    """
+    列ごとの値のある行の最小値・最大値。全ての値が数値として解釈できる列は数値で、それ以外は文字列で比較する。
+    値のない列は含めない。
+    """
+    stats = {}
+    for col in df.columns:
+        values = df[col].dropna()
+        values = values[values.astype(str) != '']
+        if values.empty:
+            continue
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.notna().all():
+            stats[col] = {'min': numbers.min().item(), 'max': numbers.max().item()}
+        else:
+            text = values.astype(str)
+            stats[col] = {'min': text.min(), 'max': text.max()}
+    return stats
+
+
+def _merge_stats(old: dict, new: dict) -> dict:
+    """同じパーティションに追記した場合の統計。数値と文字列が混在する列は統計を持たない (除外に使わない)"""
+    merged = {}
+    for col in set(old) | set(new):
+        if col not in old or col not in new:
+            merged[col] = old.get(col) or new.get(col)
+            continue
+        a, b = old[col], new[col]
+        if isinstance(a['min'], str) != isinstance(b['min'], str):
+            continue
+        merged[col] = {'min': min(a['min'], b['min']), 'max': max(a['max'], b['max'])}
+    return merged
+
+
+# --- 書き出し ---
+
+class PartitionWriter:
+    """
+    DataFrame を順に受け取り、パーティションごとのCSVに振り分けて書き出す。
+    同じパーティションの行が複数回に分かれて届いた場合は追記する (各パーティション内の行の順序は受け取った順)。
+    close() でマニフェストを書き、一時ディレクトリを出力先と置き換える。
+    """
+
+    def __init__(self, directory: Path, columns: list):
+        self.directory = Path(directory)
+        self.columns = list(columns)
+        self._tmp_dir = self.directory.with_name(self.directory.name + '.tmp')
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        self._tmp_dir.mkdir(parents=True)
+        self._partitions = {}
+
+    def write(self, df: pd.DataFrame):
+        df = df.reindex(columns=self.columns)
+        keys = partition_values(df)
+        for values, group in df.groupby([keys[col] for col in PARTITION_COLUMNS], sort=True):
+            values = dict(zip(PARTITION_COLUMNS, values))
+            relative = partition_path(values)
+            path = self._tmp_dir / relative
+            entry = self._partitions.get(relative)
+            if entry is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                group.to_csv(path, index=False, encoding='utf-8-sig')
+                self._partitions[relative] = {'path': relative, 'values': values, 'rows': len(group),
+                                              'stats': column_stats(group)}
+            else:
+                group.to_csv(path, mode='a', header=False, index=False, encoding='utf-8')
+                entry['rows'] += len(group)
+                entry['stats'] = _merge_stats(entry['stats'], column_stats(group))
+
+    def close(self) -> int:
+        """マニフェストを書いて出力先を置き換え、全体の行数を返す"""
+        partitions = [self._partitions[key] for key in sorted(self._partitions)]
+        manifest = {
+            'partition_columns': PARTITION_COLUMNS,
+            'columns': self.columns,
+            'rows': sum(entry['rows'] for entry in partitions),
+            'partitions': partitions,
+        }
+        with open(self._tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        old_dir = self.directory.with_name(self.directory.name + '.old')
+        if self.directory.exists():
+            self.directory.replace(old_dir)
+        self._tmp_dir.replace(self.directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return manifest['rows']
+
+
+def table_output_path(directory: Path, table: str, layout: str) -> Path:
+    """出力形式に応じた最終テーブルのパス (file: <テーブル名>.csv / partitioned: <テーブル名>/)"""
+    return Path(directory) / (table if layout == LAYOUT_PARTITIONED else f"{table}.csv")
+
+
+def table_output_exists(directory: Path, table: str, layout: str) -> bool:
+    path = table_output_path(directory, table, layout)
+    return (path / MANIFEST_NAME).exists() if layout == LAYOUT_PARTITIONED else path.exists()
+
+
+def remove_other_layout(directory: Path, table: str, layout: str):
+    """もう一方の出力形式で書かれた古い最終テーブルを取り除く (形式を切り替えたときに古い出力が残らないようにする)"""
+    other = LAYOUT_FILE if layout == LAYOUT_PARTITIONED else LAYOUT_PARTITIONED
+    path = table_output_path(directory, table, other)
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def write_partitioned(df: pd.DataFrame, directory: Path, columns: list) -> int:
+    """DataFrame をパーティションに分けて書き出し、行数を返す"""
+    writer = PartitionWriter(directory, columns)
+    writer.write(df)
+    return writer.close()
+
+
+def write_partitioned_shards(shard_paths: list, directory: Path, columns: list, chunksize: int = None) -> int:
+    """
+    年度ごとのCSVシャードを1つずつ読み込んでパーティションに振り分け、行数を返す。
+    シャードは文字列のまま読み込むため、書き出した値がそのまま引き継がれる。
+    メモリ使用量はシャード1つ分 (chunksize を指定した場合はその行数分) で済む。
+    """
+    writer = PartitionWriter(directory, columns)
+    for path in shard_paths:
+        frames = read_csv(path, dtype=str, chunksize=chunksize) if chunksize else [read_csv(path, dtype=str)]
+        for df in frames:
+            writer.write(df)
+    return writer.close()
+
+
+def write_partitioned_rows(rows, directory: Path, columns: list, batch_size: int = ROW_BATCH_SIZE) -> int:
+    """
+    行 (文字列のリスト) のイテレータを batch_size 行ずつパーティションに振り分けて書き出し、行数を返す。
+    各パーティション内の行は受け取った順に並ぶ。
+    """
+    writer = PartitionWriter(directory, columns)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            writer.write(pd.DataFrame(batch, columns=columns))
+            batch = []
+    if batch:
+        writer.write(pd.DataFrame(batch, columns=columns))
+    return writer.close()
+
+
+def write_table(df: pd.DataFrame, directory: Path, table: str, columns: list, layout: str) -> Path:
+    """最終テーブルを出力形式に応じて書き出し、出力先のパスを返す"""
+    output_path = table_output_path(directory, table, layout)
+    if layout == LAYOUT_PARTITIONED:
+        write_partitioned(df, output_path, columns)
+    else:
+        df.reindex(columns=columns).to_csv(output_path, index=False, encoding='utf-8-sig')
+    remove_other_layout(directory, table, layout)
+    return output_path
+
+
+def write_table_from_shards(shard_paths: list, directory: Path, table: str, columns: list, layout: str,
+                            chunksize: int = None, sort_columns: list = None, numeric_columns=()) -> int:
+    """
+    年度ごとのCSVシャードから最終テーブルを出力形式に応じて書き出し、行数を返す。
+    sort_columns を指定した場合は、その順に並んだシャードを連結ではなく k-way merge で1つの並びにする。
+    """
+    output_path = table_output_path(directory, table, layout)
+    if sort_columns and layout == LAYOUT_PARTITIONED:
+        merged = iter_merged_shard_rows(shard_paths, columns, sort_columns, numeric_columns)
+        rows = write_partitioned_rows(merged, output_path, columns, chunksize or ROW_BATCH_SIZE)
+    elif sort_columns:
+        rows = merge_sorted_csv_shards(shard_paths, output_path, columns, sort_columns, numeric_columns)
+    elif layout == LAYOUT_PARTITIONED:
+        rows = write_partitioned_shards(shard_paths, output_path, columns, chunksize)
+    else:
+        rows = concat_csv_shards(shard_paths, output_path, columns)
+    remove_other_layout(directory, table, layout)
+    return rows
+
+
+# --- 読み込み ---
+
+def load_manifest(directory: Path) -> dict:
+    with open(Path(directory) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _overlaps(stats: dict, bounds) -> bool:
+    """パーティションの [最小値, 最大値] が範囲 (lo, hi) と重なりうるか。統計がない場合や型が異なる場合は重なるとみなす"""
+    if stats is None:
+        return True
+    lo, hi = bounds
+    try:
+        return not ((lo is not None and stats['max'] < lo) or (hi is not None and stats['min'] > hi))
+    except TypeError:
+        return True
+
+
+def select_partitions(manifest: dict, filters: dict = None, ranges: dict = None) -> list:
+    """
+    マニフェストから条件に合うパーティションを選ぶ (ファイルは開かない)。
+    filters: パーティションの列 -> 値または値のリスト (例: {'year': [2020, 2021], 'ministry_id': 3})
+    ranges:  列 -> (下限, 上限) (None は制限なし)。最小値・最大値が範囲と重ならないパーティションを除く
+    """
+    wanted = {col: {str(v) for v in _as_list(values)} for col, values in (filters or {}).items()}
+    for col in wanted:
+        if col not in manifest['partition_columns']:
+            raise ValueError(f"'{col}' is not a partition column. Choose from {manifest['partition_columns']}.")
+    selected = []
+    for entry in manifest['partitions']:
+        if any(entry['values'][col] not in values for col, values in wanted.items()):
+            continue
+        if any(not _overlaps(entry['stats'].get(col), bounds) for col, bounds in (ranges or {}).items()):
+            continue
+        selected.append(entry)
+    return selected
+
+
+def _filter_range(df: pd.DataFrame, col: str, bounds) -> pd.DataFrame:
+    lo, hi = bounds
+    is_number = isinstance(lo, (int, float)) or isinstance(hi, (int, float))
+    values = pd.to_numeric(df[col], errors='coerce') if is_number else df[col]
+    mask = values.notna()
+    if lo is not None:
+        mask &= values >= lo
+    if hi is not None:
+        mask &= values <= hi
+    return df[mask.fillna(False)]
+
+
+def read_partitioned(directory: Path, filters: dict = None, ranges: dict = None, usecols: list = None) -> pd.DataFrame:
+    """
+    パーティションに分けた最終テーブルを、条件に合うパーティションだけ開いて読み込む。
+    値は文字列のまま返す。ranges を指定した場合は、選んだパーティションの中の範囲外の行も取り除く。
+    """
+    directory = Path(directory)
+    manifest = load_manifest(directory)
+    columns = usecols or manifest['columns']
+    entries = select_partitions(manifest, filters, ranges)
+    read_cols = list(dict.fromkeys(list(columns) + list(ranges or {})))
+    frames = [read_csv(directory / entry['path'], usecols=read_cols, dtype=str) for entry in entries]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    for col, bounds in (ranges or {}).items():
+        df = _filter_range(df, col, bounds)
+    return df.reindex(columns=columns).reset_index(drop=True)
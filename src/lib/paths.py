@@ -0,0 +1,32 @@
+import os
+from pathlib import Path
+
+from src.lib.sampling import get_sample_spec
+
+# --- 入出力のディレクトリ ---
+# 全ステージはここで定義したディレクトリを使う。サンプルモード (src.lib.sampling) では
+# data/ と analysis/ を別の出力ルートの下に置き換え、本番の出力には触れない。
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+SAMPLE_SPEC = get_sample_spec()
+# サンプルモードの出力ルート (環境変数 GYOUKAKU_SAMPLE_ROOT で変更できる)
+SAMPLE_ROOT_ENV_VAR = 'GYOUKAKU_SAMPLE_ROOT'
+SAMPLE_ROOT = Path(os.environ.get(SAMPLE_ROOT_ENV_VAR) or PROJECT_ROOT / "sample")
+OUTPUT_ROOT = SAMPLE_ROOT if SAMPLE_SPEC else PROJECT_ROOT
+
+# 元データは常に本番のものを読む (サンプルは 01_convert_to_csv がここから切り出す)
+DOWNLOAD_DIR = PROJECT_ROOT / "data" / "download"
+FULL_RAW_DIR = PROJECT_ROOT / "data" / "raw"
+
+DATA_DIR = OUTPUT_ROOT / "data"
+RAW_DIR = DATA_DIR / "raw"
+NORMALIZED_DIR = DATA_DIR / "normalized"
+PROCESSED_DIR = DATA_DIR / "processed"
+INDEX_DIR = DATA_DIR / "index"
+SPLIT_DIR = DATA_DIR / "split"
+# 複数ホストで分担実行するときのワークキュー (src.lib.workqueue)
+QUEUE_DIR = DATA_DIR / "_queue"
+
+ANALYSIS_DIR = OUTPUT_ROOT / "analysis"
+QUALITY_DIR = ANALYSIS_DIR / "quality"
@@ -0,0 +1,116 @@
+import hashlib
+
+import pandas as pd
+
+from src.lib.amounts import AMOUNT_COLUMN
+from src.lib.normalization import normalize_entity_name
+
+# --- 支出先の名寄せ ---
+# 支出先上位10者リストの (事業, 支払ブロック, 順位) ごとの支出先を、法人単位の支出先 (payee) にまとめる。
+# 名称の全ての組を比較すると件数の2乗の時間がかかるため、キーの一致だけで対応付ける。
+#   1. 法人番号: 13桁の法人番号が記入されている行は、法人番号をキーとするハッシュ索引で1つの支出先にまとめる
+#   2. 正規化名称: 法人番号のない行は、normalize_entity_name で法人格などを除いた名称をキーとしてブロックに分ける。
+#      同じキーを持つ法人番号つきの支出先がただ1つあればそこに寄せ、なければブロック全体を名称だけの支出先とする
+# どちらもキーによるグループ化と引き当てだけで済むため、処理時間は行数にほぼ比例する。
+# 支出先IDはキーから決まる ('C' + 法人番号 / 'N' + 正規化名称のハッシュ) ため、データを追加しても同じ支出先のIDは変わらない。
+# ただし、法人番号つきの支出先があとから現れた場合は、同じ正規化名称の名称だけの支出先がそちらに寄せられる。
+
+MATCH_CORPORATE_NUMBER = 'corporate_number'  # 法人番号の一致
+MATCH_NAME_TO_NUMBER = 'name_to_corporate_number'  # 正規化名称から法人番号つきの支出先に寄せたもの
+MATCH_NAME = 'name'  # 正規化名称の一致のみ
+MATCH_AMBIGUOUS_NAME = 'ambiguous_name'  # 同じ正規化名称に複数の法人番号があり、寄せ先を決められなかったもの
+
+PAYEE_MASTER_COLUMNS = [
+    'payee_id', '法人番号', '支出先名', '正規化名称', 'match_method',
+    'name_variants', 'records', 'businesses', 'first_year', 'last_year',
+]
+PAYEE_LINK_COLUMNS = [
+    'id', 'year', 'ministry_id', '支払ブロックID', '順位', 'payee_id',
+    '支出先', '法人番号', '金額', AMOUNT_COLUMN, 'match_method',
+]
+
+NAME_ID_HASH_LENGTH = 12
+
+
+def normalize_corporate_numbers(values: pd.Series) -> pd.Series:
+    """法人番号の列を13桁の数字の文字列に揃える。空白・ハイフン・末尾の '.0' を除いても13桁にならない値は NA とする"""
+    text = (values.astype('string').str.strip()
+            .str.replace(r'\.0$', '', regex=True)
+            .str.replace(r'[\s-]', '', regex=True))
+    return text.where(text.str.fullmatch(r'\d{13}').fillna(False))
+
+
+def canonical_payee_names(names: pd.Series) -> pd.Series:
+    """支出先名の列を正規化名称の列に変換する。重複する名称は1回だけ正規化する"""
+    codes, uniques = pd.factorize(names.astype('string'))
+    canonical = pd.Series([normalize_entity_name(name) for name in uniques], dtype='string')
+    canonical = canonical.mask(canonical == '')
+    result = pd.Series(pd.NA, index=names.index, dtype='string')
+    valid = codes >= 0
+    result[valid] = canonical.to_numpy()[codes[valid]]
+    return result
+
+
+def name_payee_id(canonical_name: str) -> str:
+    return 'N' + hashlib.sha1(canonical_name.encode('utf-8')).hexdigest()[:NAME_ID_HASH_LENGTH]
+
+
+def resolve_payees(records: pd.DataFrame):
+    """
+    縦持ちの支出先レコード (long_tables.PAYEE_COLUMNS) を支出先に名寄せし、
+    (支出先マスタ, 事業→支出先の対応表) を返す。支出先名も有効な法人番号もないレコードは対応表に含めない。
+    """
+    numbers = normalize_corporate_numbers(records['法人番号'])
+    canonical = canonical_payee_names(records['支出先'])
+    has_number = numbers.notna()
+
+    # 正規化名称 -> 法人番号 の索引。1つの法人番号にしか対応しない名称だけを寄せ先として使う
+    pairs = pd.DataFrame({'canonical': canonical[has_number], 'number': numbers[has_number]}).dropna().drop_duplicates()
+    numbers_per_name = pairs.groupby('canonical')['number'].agg(['nunique', 'first'])
+    name_to_number = numbers_per_name.loc[numbers_per_name['nunique'] == 1, 'first']
+    ambiguous_names = set(numbers_per_name.index[numbers_per_name['nunique'] > 1])
+
+    attached = canonical.where(~has_number).map(name_to_number).astype('string')
+    entity_number = numbers.fillna(attached)
+
+    name_ids = pd.Series({name: name_payee_id(name) for name in canonical[entity_number.isna()].dropna().unique()},
+                         dtype='string')
+    payee_id = ('C' + entity_number).fillna(canonical.map(name_ids).astype('string'))
+
+    match_method = pd.Series(MATCH_NAME, index=records.index, dtype='string')
+    match_method[canonical.isin(ambiguous_names)] = MATCH_AMBIGUOUS_NAME
+    match_method[attached.notna()] = MATCH_NAME_TO_NUMBER
+    match_method[has_number] = MATCH_CORPORATE_NUMBER
+
+    links = records.assign(payee_id=payee_id, 法人番号=numbers, match_method=match_method, 正規化名称=canonical)
+    links = links[links['payee_id'].notna()].reset_index(drop=True)
+    return build_payee_master(links), links.reindex(columns=PAYEE_LINK_COLUMNS)
+
+
+def _most_frequent(links: pd.DataFrame, column: str) -> pd.Series:
+    """支出先ごとに最も多く現れる値 (同数の場合は文字列として小さいもの)"""
+    counts = links.groupby(['payee_id', column]).size().rename('n').reset_index()
+    counts = counts.sort_values(['payee_id', 'n', column], ascending=[True, False, True])
+    return counts.drop_duplicates('payee_id').set_index('payee_id')[column]
+
+
+def build_payee_master(links: pd.DataFrame) -> pd.DataFrame:
+    """
+    名寄せ済みのレコードから支出先マスタを作る。
+    支出先名・正規化名称は最も多く現れた表記、match_method は法人番号を持つ支出先なら corporate_number とする。
+    """
+    grouped = links.groupby('payee_id')
+    master = pd.DataFrame({
+        '法人番号': grouped['法人番号'].first(),
+        'name_variants': grouped['支出先'].nunique(),
+        'records': grouped.size(),
+        'businesses': grouped['id'].nunique(),
+        'first_year': grouped['year'].min(),
+        'last_year': grouped['year'].max(),
+    })
+    master['支出先名'] = _most_frequent(links, '支出先')
+    master['正規化名称'] = _most_frequent(links, '正規化名称')
+    # 名称だけの支出先は同じ正規化名称のレコードの集まりなので、判定 (name / ambiguous_name) はどの行も同じ
+    master['match_method'] = grouped['match_method'].first()
+    master.loc[master['法人番号'].notna(), 'match_method'] = MATCH_CORPORATE_NUMBER
+    return master.reset_index().sort_values('payee_id').reindex(columns=PAYEE_MASTER_COLUMNS).reset_index(drop=True)
@@ -0,0 +1,89 @@
+import re
+
+import pandas as pd
+
+# --- 正規表現定義 ---
+
+# 01_convert_to_csv でエスケープされたセル内改行 ('\\n', '\\r') と、実際の改行の両方で分割する
+RE_PERIOD_SEPARATOR = r'(?:\\r)?\\n|\r?\n'
+
+# 1期間分の表記を「コメント」「開始年度」「終了年度 or 終了(予定)なし」に分解する。
+# 和暦は 02_normalize_data で西暦に変換済みのため、ここでは4桁の西暦のみを扱う。
+#   例: '1997～2013年度', '2015年度～終了(予定)なし', '2010・2015', 'サブ事業A:2018～2020'
+RE_PERIOD = re.compile(
+    r'^(?P<comment>.*?)\s*'
+    r'(?P<start>\d{4})?\s*(?:年度?)?\s*'
+    r'(?:[～・~]\s*)?'
+    r'(?:(?P<end>\d{4})\s*(?:年度?)?|(?P<open>終了\(予定\)なし|なし))?\s*$'
+)
+
+OPEN_ENDED_LABEL = '終了(予定)なし'
+
+
+def _parse_distinct(values: pd.Series) -> pd.DataFrame:
+    """
+    重複を除いた生の値について、期間ごとの行に展開して解析する。
+    返り値は value_code (values の位置) と period_sequence ごとに1行となる。
+    """
+    pieces = (
+        values.str.split(RE_PERIOD_SEPARATOR, regex=True)
+        .explode()
+        .str.strip()
+    )
+    pieces = pieces[pieces.notna() & (pieces != '')]
+    parts = pieces.str.extract(RE_PERIOD)
+
+    result = pd.DataFrame({
+        'value_code': pieces.index,
+        'comment': parts['comment'].str.strip().str.rstrip(':：').str.strip(),
+        'start_year': pd.to_numeric(parts['start'], errors='coerce').astype('Int64'),
+        'end_year': pd.to_numeric(parts['end'], errors='coerce').astype('Int64'),
+        'is_open_ended': parts['open'].notna(),
+    })
+    result['is_parsed'] = result['start_year'].notna() | result['end_year'].notna() | result['is_open_ended']
+    # 年度として解釈できなかった表記は、そのままコメントとして残す
+    result['comment'] = result['comment'].where(result['is_parsed'], pieces.values)
+    result['comment'] = result['comment'].mask(result['comment'] == '')
+    result['period_sequence'] = result.groupby('value_code').cumcount() + 1
+    return result.reset_index(drop=True)
+
+
+def parse_periods(series: pd.Series) -> pd.DataFrame:
+    """
+    「事業開始・終了(予定)年度」の列を、期間ごとの型付きテーブルに変換する。
+    1つのセルに改行区切りで複数の期間が含まれる場合は、期間ごとに別の行になる。
+    同じ表記は一度だけ解析し、結果を元の行に割り当てる。
+
+    返り値の列:
+        source_index    元の series のインデックス
+        period_sequence 期間の連番 (1始まり)
+        comment         サブ事業名など、年度以外の記述
+        start_year      開始年度 (Int64)
+        end_year        終了年度 (Int64)
+        is_open_ended   終了(予定)なし の場合 True
+        is_parsed       年度として解釈できた場合 True
+    """
+    codes, uniques = pd.factorize(series.astype('string').str.strip(), use_na_sentinel=True)
+    parsed = _parse_distinct(pd.Series(uniques, dtype='string'))
+
+    rows = pd.DataFrame({'source_index': series.index, 'value_code': codes})
+    rows = rows[rows['value_code'] >= 0]
+    merged = rows.merge(parsed, on='value_code', how='inner', sort=False)
+    return merged[[
+        'source_index', 'period_sequence', 'comment',
+        'start_year', 'end_year', 'is_open_ended', 'is_parsed',
+    ]]
+
+
+def summarize_periods(periods: pd.DataFrame) -> pd.DataFrame:
+    """
+    期間テーブルを元の行ごとに集約し、代表となる期間 (最初の期間) と複数期間フラグを返す。
+    """
+    first = periods[periods['period_sequence'] == 1].set_index('source_index')
+    counts = periods.groupby('source_index').size()
+    return pd.DataFrame({
+        'start_year': first['start_year'],
+        'end_year': first['end_year'],
+        'is_open_ended': first['is_open_ended'],
+        'has_multiple_periods': counts.reindex(first.index) > 1,
+    })
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+
+# --- スレッドによるパイプライン処理 ---
+# 各ステージを別スレッドで動かし、ステージ間を上限付きのキューでつなぐ。
+# 下流が詰まると上流の put が待たされる (バックプレッシャー) ため、
+# パイプライン全体で保持するデータ量はキューの上限で決まり、入力の大きさによらず一定になる。
+
+# 中断の確認間隔 (秒)。他のステージが失敗したときに、待機中のステージがこの間隔で抜け出す
+POLL_INTERVAL = 0.1
+
+_END = object()
+
+
+class PipelineAborted(Exception):
+    """他のステージの失敗によりパイプラインが中断されたことを示す"""
+
+
+class StageStats:
+    """
+    1ステージ分の処理件数と待ち時間を記録する。
+    wait_input が長いステージは上流待ち、wait_output が長いステージは下流待ちであり、
+    どちらも短いステージがボトルネックとなる。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def busy(self) -> float:
+        return max(self.elapsed - self.wait_input - self.wait_output, 0.0)
+
+
+class Channel:
+    """ステージ間をつなぐ上限付きキュー。put/get の待ち時間を呼び出し側のステージに加算する"""
+
+    def __init__(self, maxsize: int, abort: threading.Event):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._abort = abort
+
+    def put(self, item, stats: StageStats):
+        started = time.perf_counter()
+        try:
+            while True:
+                if self._abort.is_set():
+                    raise PipelineAborted()
+                try:
+                    self._queue.put(item, timeout=POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            stats.wait_output += time.perf_counter() - started
+
+    def close(self, stats: StageStats):
+        """下流に入力の終わりを知らせる"""
+        self.put(_END, stats)
+
+    def drain(self) -> list:
+        """待たずに取り出せる残りの要素を返す (中断したパイプラインに残った要素を後始末するため)"""
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _END:
+                items.append(item)
+
+    def iter(self, stats: StageStats):
+        """close() されるまで要素を取り出す"""
+        while True:
+            started = time.perf_counter()
+            try:
+                while True:
+                    if self._abort.is_set():
+                        raise PipelineAborted()
+                    try:
+                        item = self._queue.get(timeout=POLL_INTERVAL)
+                        break
+                    except queue.Empty:
+                        continue
+            finally:
+                stats.wait_input += time.perf_counter() - started
+            if item is _END:
+                return
+            yield item
+
+
+class Pipeline:
+    """
+    ステージ (stats を受け取る関数) をスレッドとして起動し、全ての終了を待つ。
+    いずれかのステージで例外が起きた場合は他のステージを中断し、その例外を run() から送出する。
+    """
+
+    def __init__(self):
+        self.abort = threading.Event()
+        self.stages = []
+        self._errors = []
+
+    def channel(self, maxsize: int) -> Channel:
+        return Channel(maxsize, self.abort)
+
+    def add_stage(self, name: str, func):
+        self.stages.append((StageStats(name), func))
+
+    def _run_stage(self, stats: StageStats, func):
+        stats.started = time.perf_counter()
+        try:
+            func(stats)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self.abort.set()
+        finally:
+            stats.finished = time.perf_counter()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._run_stage, args=(stats, func), name=stats.name, daemon=True)
+            for stats, func in self.stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def print_summary(self):
+        print("  - Pipeline stages (elapsed / busy / wait input / wait output, seconds):")
+        for stats, _ in self.stages:
+            print(f"    {stats.name:<8} {stats.elapsed:8.2f} {stats.busy:8.2f} "
+                  f"{stats.wait_input:8.2f} {stats.wait_output:8.2f}  ({stats.items} items)")
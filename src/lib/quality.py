@@ -0,0 +1,252 @@
+import re
+from collections import OrderedDict
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import MINISTRY_NAME_VARIATIONS, ID_CANDIDATE_COLUMNS
+from src.lib.business_keys import MINISTRY_NAME_TO_ID
+from src.lib.reader import read_csv
+
+# --- 定数定義 ---
+
+# ルールごとに保持する違反サンプルの最大件数 (メモリ使用量を一定に保つ)
+DEFAULT_MAX_SAMPLES = 5
+
+# ストリーミング処理中にまとめてチェックする行数
+DEFAULT_BATCH_ROWS = 1000
+
+MINISTRY_COLUMNS = ['府省庁', '府省']
+
+# 正規化後も元号が残っているセルは、和暦を西暦に変換できなかったものとみなす
+RE_RESIDUAL_WAREKI = re.compile(r'(?:明治|大正|昭和|平成|令和)')
+
+# 和暦の変換漏れをチェックする列 (年度・期間・日付を表す列に限定し、全列の走査を避ける)
+RE_WAREKI_CHECK_COLUMN = re.compile(r'^事業開始・終了\(予定\)年度$|時期|期間|年月日')
+
+REPORT_COLUMNS = ['filename', 'stage', 'rule', 'checked', 'violations', 'violation_rate', 'samples']
+
+
+class QualityReport:
+    """
+    1ファイル分の品質チェック結果を、ルールごとの件数と上限付きのサンプルとして保持する。
+    """
+
+    def __init__(self, filename: str, stage: str, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.filename = filename
+        self.stage = stage
+        self.max_samples = max_samples
+        self.rules = OrderedDict()
+
+    def record(self, rule: str, checked: int, violation_mask: pd.Series, values: pd.Series):
+        """1バッチ分のチェック結果を加算する。values はサンプルとして残す値 (インデックスは行番号や代理キー)"""
+        entry = self.rules.setdefault(rule, {'checked': 0, 'violations': 0, 'samples': []})
+        entry['checked'] += int(checked)
+        violations = int(violation_mask.sum())
+        entry['violations'] += violations
+
+        room = self.max_samples - len(entry['samples'])
+        if violations and room > 0:
+            hits = values[violation_mask].head(room)
+            entry['samples'].extend(f"[{i}] {v}" for i, v in hits.items())
+
+    def to_records(self) -> list:
+        records = []
+        for rule, entry in self.rules.items():
+            checked = entry['checked']
+            records.append({
+                'filename': self.filename,
+                'stage': self.stage,
+                'rule': rule,
+                'checked': checked,
+                'violations': entry['violations'],
+                'violation_rate': entry['violations'] / checked if checked > 0 else 0,
+                'samples': ' | '.join(entry['samples']),
+            })
+        return records
+
+    def print_summary(self):
+        for rule, entry in self.rules.items():
+            if entry['violations']:
+                print(f"  - [Quality] {rule}: {entry['violations']} / {entry['checked']} "
+                      f"(e.g. {entry['samples'][0]})")
+
+
+# --- ベクトル化されたチェックルール ---
+
+def check_ministry_names(report: QualityReport, names: pd.Series):
+    """府省庁名が府省庁マスターに対応付けられない行を検出する"""
+    present = names.notna() & (names.astype('string').str.strip() != '')
+    mapped = names.replace(MINISTRY_NAME_VARIATIONS).isin(MINISTRY_NAME_TO_ID.keys())
+    report.record('unmapped_ministry', present.sum(), present & ~mapped, names)
+
+
+def business_number_keys(keys: pd.DataFrame) -> pd.Series:
+    """事業番号を構成する列を連結し、組み合わせを1つの文字列キーにする"""
+    parts = [keys[col].astype('string').fillna('') for col in keys.columns]
+    return reduce(lambda left, right: left + '|' + right, parts)
+
+
+class SeenKeyHashes:
+    """
+    過去のバッチで出現した事業番号のキーを、64ビットのハッシュ値の整列済み配列として保持する。
+    文字列の集合より小さく、チェックポイントには前回から増えた分だけを追記できる。
+    (ハッシュ値の衝突で重複と誤判定する確率は、数百万件でも無視できる)
+    """
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._saved = 0
+        self._unsaved = []
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        return np.isin(hashes, self._sorted)
+
+    def add(self, hashes: np.ndarray):
+        new = np.setdiff1d(hashes, self._sorted)
+        if len(new):
+            self._sorted = np.union1d(self._sorted, new)
+            self._unsaved.append(new)
+
+    def save(self, path: Path) -> int:
+        """前回の保存以降に増えたハッシュ値をファイルに追記し、保存済みの件数を返す"""
+        path = Path(path)
+        with open(path, 'r+b' if path.exists() else 'wb') as f:
+            # 前回の保存のあとで中断した場合に残る余分な追記は上書きする
+            f.seek(self._saved * 8)
+            for new in self._unsaved:
+                f.write(new.astype('<u8').tobytes())
+            f.truncate()
+        self._saved = len(self._sorted)
+        self._unsaved = []
+        return self._saved
+
+    def load(self, path: Path, count: int):
+        """save() で保存したファイルの先頭 count 件を読み込む"""
+        hashes = np.fromfile(path, dtype='<u8', count=count) if count else np.empty(0, dtype='<u8')
+        if len(hashes) != count:
+            raise ValueError(f"'{Path(path).name}' has {len(hashes)} key hashes, expected {count}.")
+        self._sorted = np.unique(hashes.astype(np.uint64))
+        self._saved = count
+        self._unsaved = []
+
+
+def hash_keys(combined: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(combined, index=False).to_numpy()
+
+
+def check_duplicate_business_numbers(report: QualityReport, keys: pd.DataFrame, seen: SeenKeyHashes):
+    """
+    事業番号の組み合わせが、同じバッチ内または過去のバッチと重複している行を検出する。
+    seen には過去のバッチで出現したキーのハッシュ値が蓄積される。
+    """
+    if keys.empty or keys.shape[1] == 0:
+        return
+    present = keys.notna().any(axis=1)
+    combined = business_number_keys(keys)
+    hashes = hash_keys(combined)
+    duplicated = present & (combined.duplicated(keep='first') | seen.contains(hashes))
+    report.record('duplicate_business_number', present.sum(), duplicated, combined)
+    seen.add(hashes[present.to_numpy()])
+
+
+def check_residual_wareki(report: QualityReport, frame: pd.DataFrame):
+    """正規化後も元号が残っている (西暦に変換できなかった) セルを検出する"""
+    for col in frame.columns:
+        values = frame[col].astype('string')
+        present = values.notna() & (values != '')
+        residual = values.str.contains(RE_RESIDUAL_WAREKI, na=False)
+        report.record('unparsable_wareki', present.sum(), residual, values)
+
+
+class StreamingQualityChecker:
+    """
+    02_normalize_data の行ストリームに差し込んで使う品質チェッカー。
+    チェックに必要な列だけをバッチ単位で溜め、バッチごとにベクトル化されたルールを適用する。
+    事業番号の重複チェックで蓄積したキーは、チェックポイントの JSON ではなく keys_path に追記で保存する。
+    """
+
+    def __init__(self, report: QualityReport, header: list, unique_keys: bool = True,
+                 batch_rows: int = DEFAULT_BATCH_ROWS, keys_path: Path = None):
+        self.report = report
+        self.keys_path = keys_path
+        self.batch_rows = batch_rows
+        self.ministry_col = next((c for c in MINISTRY_COLUMNS if c in header), None)
+        # セグメントシートのように1事業が複数行になるシートでは、事業番号の重複はチェックしない
+        self.key_cols = [c for c in ID_CANDIDATE_COLUMNS if c in header] if unique_keys else []
+        self.wareki_cols = [c for c in header if RE_WAREKI_CHECK_COLUMN.search(str(c))]
+
+        self.columns = list(dict.fromkeys(
+            ([self.ministry_col] if self.ministry_col else []) + self.key_cols + self.wareki_cols
+        ))
+        positions = {col: i for i, col in reversed(list(enumerate(header)))}
+        self.indices = [positions[col] for col in self.columns]
+        self._batch = []
+        self._offset = 0
+        self._seen_keys = SeenKeyHashes()
+
+    def add_row(self, row: list):
+        if not self.indices:
+            return
+        self._batch.append([row[i] if i < len(row) else '' for i in self.indices])
+        if len(self._batch) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        frame = pd.DataFrame(
+            self._batch, columns=self.columns,
+            index=pd.RangeIndex(self._offset, self._offset + len(self._batch)),
+        ).replace('', None)
+        self._offset += len(self._batch)
+        self._batch = []
+
+        if self.ministry_col:
+            check_ministry_names(self.report, frame[self.ministry_col])
+        if self.key_cols:
+            check_duplicate_business_numbers(self.report, frame[self.key_cols], self._seen_keys)
+        if self.wareki_cols:
+            check_residual_wareki(self.report, frame[self.wareki_cols])
+
+    def finish(self) -> QualityReport:
+        self.flush()
+        return self.report
+
+    def checkpoint_state(self) -> dict:
+        """
+        溜めている行を処理したうえで、途中まで蓄積したチェック結果を返す (restore() で再開できる)。
+        蓄積したキーは keys_path に追記し、チェックポイントには件数だけを記録する。
+        """
+        self.flush()
+        seen_keys = self._seen_keys.save(self.keys_path) if self.key_cols else 0
+        return {'offset': self._offset, 'seen_keys': seen_keys, 'rules': self.report.rules}
+
+    def restore(self, state: dict):
+        self._offset = state['offset']
+        if isinstance(state['seen_keys'], list):
+            # キーそのものを JSON に記録していた以前のチェックポイント
+            self._seen_keys.add(hash_keys(pd.Series(state['seen_keys'], dtype='string')))
+        elif state['seen_keys']:
+            self._seen_keys.load(self.keys_path, state['seen_keys'])
+        self.report.rules = OrderedDict(state['rules'])
+
+
+def write_quality_report(records: list, output_path: Path, replace_files: list = None):
+    """
+    品質レポートをCSVに書き出す。
+    replace_files を指定した場合は既存のレポートを残し、そのファイルの行だけを置き換える
+    (一部のファイルだけを再処理した差分実行用)。
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    report_df = pd.DataFrame(records, columns=REPORT_COLUMNS)
+    if replace_files is not None and output_path.exists():
+        existing = read_csv(output_path)
+        existing = existing[~existing['filename'].isin(replace_files)]
+        report_df = pd.concat([existing, report_df], ignore_index=True)
+    report_df.to_csv(output_path, index=False, encoding='utf-8-sig')
@@ -0,0 +1,160 @@
+import csv
+import os
+import importlib.util
+from pathlib import Path
+
+import pandas as pd
+
+from src.lib import rowblock, sparse
+
+# --- テーブル読み込みの共通入口 ---
+# 全スクリプトの pandas による読み込み (正規化済みテーブル・中間CSV・分析結果) はここを通す。
+#   - CSV は常に BOM付きUTF-8 (utf-8-sig) として読む
+#   - 型推論は読み込む単位 (ファイル全体、chunksize を指定した場合はチャンク) ごとにまとめて行う (low_memory=False)
+#   - usecols / dtype は各形式の読み込みまで渡す (行ブロック形式・疎な列形式では要求された列だけを展開する)
+# CSV のパーサー (バックエンド) は環境変数 GYOUKAKU_CSV_ENGINE か set_backend() で選ぶ:
+#   'c'        pandas の C パーサー (単一スレッド、既定)
+#   'pyarrow'  pyarrow のマルチスレッドのパーサー (pyarrow のインストールが必要。なければ警告を表示して c で読む)
+#   'auto'     pyarrow がインストールされていれば pyarrow、なければ c
+# pyarrow は chunksize・nrows・skiprows・重複や空の列名に対応せず、型推論 (日付の解釈など) も c と異なる。
+# そのため pyarrow で読むのは dtype を指定した一括の読み込みだけとし、それ以外は c で読む。
+# 列名を受け取る関数の usecols は、ヘッダー行から列名のリストに直してから pyarrow に渡す。
+
+CSV_ENCODING = 'utf-8-sig'
+BACKEND_ENV_VAR = 'GYOUKAKU_CSV_ENGINE'
+BACKENDS = ('auto', 'c', 'pyarrow')
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+_backend = None
+# pyarrow がない場合の警告は一度だけ表示する
+_fallback_warned = False
+
+
+def set_backend(name: str):
+    """CSV のパーサーを切り替える (環境変数より優先される)"""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CSV backend '{name}'. Choose from {list(BACKENDS)}.")
+    _backend = name
+
+
+def get_backend() -> str:
+    """実際に使う CSV のパーサー ('c' または 'pyarrow') を返す。選択されているパーサーは変更しない"""
+    global _fallback_warned
+    name = _backend or os.environ.get(BACKEND_ENV_VAR, '').strip() or 'c'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CSV backend '{name}' in {BACKEND_ENV_VAR}. Choose from {list(BACKENDS)}.")
+    if name == 'pyarrow' and not PYARROW_AVAILABLE:
+        if not _fallback_warned:
+            print("  - [Warning] pyarrow is not installed. Falling back to the 'c' CSV backend.")
+            _fallback_warned = True
+        return 'c'
+    if name == 'auto':
+        return 'pyarrow' if PYARROW_AVAILABLE else 'c'
+    return name
+
+
+def table_format(path: Path) -> str:
+    """ファイルの形式 ('csv' / 'rowblock' / 'sparse') を拡張子から判定する"""
+    if rowblock.is_rowblock(path):
+        return 'rowblock'
+    if sparse.is_sparse(path):
+        return 'sparse'
+    return 'csv'
+
+
+def glob_tables(directory: Path, pattern: str = '*') -> list:
+    """
+    ディレクトリ内の正規化済みテーブル (CSV・行ブロック形式・疎な列形式) を列挙する。
+    同じステムのファイルが複数の形式で存在する場合は、更新日時が最も新しいものを採用する。
+    """
+    directory = Path(directory)
+    found = {}
+    for suffix in ('.csv', rowblock.ROWBLOCK_SUFFIX, sparse.SPARSE_SUFFIX):
+        for path in directory.glob(pattern + suffix):
+            current = found.get(path.stem)
+            if current is None or path.stat().st_mtime > current.stat().st_mtime:
+                found[path.stem] = path
+    return sorted(found.values())
+
+
+def _csv_header(path: Path) -> list:
+    with open(path, 'r', encoding=CSV_ENCODING, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _pyarrow_usecols(path: Path, usecols, dtype, nrows, chunksize, read_csv_kwargs):
+    """
+    pyarrow で読める指定なら、pyarrow に渡す usecols (ファイル内の順序の列名のリスト、または None) を返す。
+    pyarrow で読めない場合は False を返す。
+    """
+    if dtype is None or chunksize is not None or nrows is not None or 'skiprows' in read_csv_kwargs:
+        return False
+    header = _csv_header(path)
+    if len(set(header)) != len(header) or '' in header:
+        return False
+    if usecols is None:
+        return None
+    if callable(usecols):
+        return [col for col in header if usecols(col)]
+    wanted = set(usecols)
+    if not all(isinstance(col, str) for col in wanted):
+        return False
+    return [col for col in header if col in wanted] if wanted <= set(header) else False
+
+
+def read_csv(path: Path, usecols=None, dtype=None, nrows: int = None, chunksize: int = None, **read_csv_kwargs):
+    """
+    CSV を共通の設定 (エンコーディング・型推論) と、選択されているパーサーで読み込む。
+    chunksize を指定した場合はチャンクのイテレータを返す。
+    """
+    read_csv_kwargs.pop('low_memory', None)
+    read_csv_kwargs.setdefault('encoding', CSV_ENCODING)
+    if get_backend() == 'pyarrow':
+        columns = _pyarrow_usecols(path, usecols, dtype, nrows, chunksize, read_csv_kwargs)
+        if columns is not False:
+            return pd.read_csv(path, usecols=columns, dtype=dtype, engine='pyarrow', **read_csv_kwargs)
+    return pd.read_csv(path, usecols=usecols, dtype=dtype, nrows=nrows, chunksize=chunksize,
+                       low_memory=False, **read_csv_kwargs)
+
+
+def read_table(path: Path, usecols=None, dtype=None, nrows: int = None, chunksize: int = None, **read_csv_kwargs):
+    """
+    正規化済みテーブルを形式に応じて読み込む。
+    CSV なら read_csv に、行ブロック形式なら rowblock.read_frame / iter_frames に、
+    疎な列形式なら sparse.read_frame / iter_frames (要求された列だけを展開する) に委譲する。
+    chunksize を指定した場合はチャンクのイテレータを返す。
+    """
+    path = Path(path)
+    fmt = table_format(path)
+    if fmt == 'csv':
+        return read_csv(path, usecols=usecols, dtype=dtype, nrows=nrows, chunksize=chunksize, **read_csv_kwargs)
+
+    read_csv_kwargs.pop('encoding', None)
+    read_csv_kwargs['low_memory'] = False
+    if dtype is not None:
+        read_csv_kwargs['dtype'] = dtype
+    module = rowblock if fmt == 'rowblock' else sparse
+    if chunksize:
+        return module.iter_frames(path, usecols=usecols, chunksize=chunksize, **read_csv_kwargs)
+    return module.read_frame(path, usecols=usecols, stop=nrows, **read_csv_kwargs)
+
+
+def read_columns(path: Path) -> list:
+    """テーブルを読み込んだ場合の列名のリストを、データ行を読まずに返す"""
+    if table_format(path) == 'sparse':
+        return sparse.read_columns(path)
+    return read_table(path, nrows=0).columns.tolist()
+
+
+def iter_rows(path: Path):
+    """テーブルの行を、ヘッダー行から順に文字列のリストとして返す (pandas を使わない)"""
+    path = Path(path)
+    fmt = table_format(path)
+    if fmt == 'csv':
+        with open(path, 'r', encoding=CSV_ENCODING, newline='') as f:
+            yield from csv.reader(f)
+        return
+    module = rowblock if fmt == 'rowblock' else sparse
+    yield module.read_header(path)
+    yield from module.iter_rows(path)
@@ -0,0 +1,258 @@
+import bz2
+import csv
+import io
+import json
+import lzma
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# --- 定数定義 ---
+
+# 行ブロック形式のファイル拡張子と、ブロック索引(サイドカーJSON)の拡張子
+ROWBLOCK_SUFFIX = '.rbk'
+INDEX_SUFFIX = '.idx.json'
+FORMAT_VERSION = 1
+
+# 1ブロックあたりの行数 (ブロック単位で独立に圧縮・展開される)
+DEFAULT_BLOCK_ROWS = 1000
+DEFAULT_COMPRESSION = 'zlib'
+
+# 圧縮方式ごとの (圧縮関数, 展開関数)。いずれも標準ライブラリのみで完結する
+# zlib/bz2/lzma は展開中にGILを解放するため、スレッド並列で展開が効く
+COMPRESSORS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+
+def index_path_for(path: Path) -> Path:
+    """行ブロックファイルに対応する索引ファイルのパスを返す"""
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _format_csv_rows(rows) -> str:
+    """行のリストを最小限のクォートでCSVテキストに整形する"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+# --- 書き込み ---
+
+class RowBlockWriter:
+    """
+    行を固定行数のブロックに分け、ブロックごとに独立して圧縮して書き出すライター。
+    csv.writer と同様に writerow() で行を受け取り、最初の行をヘッダーとして扱う。
+    close() 時にブロック索引 (各ブロックのオフセット・長さ・先頭行番号) を書き出す。
+    with 文を例外で抜けた場合は索引を書き出さない。
+    """
+
+    def __init__(self, path: Path, block_rows: int = DEFAULT_BLOCK_ROWS, compression: str = DEFAULT_COMPRESSION,
+                 resume_state: dict = None):
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression '{compression}'. Choose from {list(COMPRESSORS)}.")
+        self.path = Path(path)
+        self.block_rows = block_rows
+        self.compression = compression
+        self._compress = COMPRESSORS[compression][0]
+        self._header = None
+        self._pending = []
+        self._blocks = []
+        self._row_count = 0
+        if resume_state is None:
+            self._file = open(self.path, 'wb')
+            return
+        # checkpoint_state() の時点まで書き込み済みの状態に戻し、続きから書き込む
+        self._file = open(self.path, 'r+b')
+        self._file.truncate(resume_state['bytes'])
+        self._file.seek(resume_state['bytes'])
+        self._header = resume_state['header']
+        self._blocks = resume_state['blocks']
+        self._row_count = resume_state['row_count']
+
+    def writerow(self, row):
+        if self._header is None:
+            self._header = list(row)
+            return
+        self._pending.append(row)
+        if len(self._pending) >= self.block_rows:
+            self._flush_block()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _flush_block(self):
+        if not self._pending:
+            return
+        payload = self._compress(_format_csv_rows(self._pending).encode('utf-8'))
+        offset = self._file.tell()
+        self._file.write(payload)
+        self._blocks.append({
+            'offset': offset,
+            'length': len(payload),
+            'first_row': self._row_count,
+            'rows': len(self._pending),
+        })
+        self._row_count += len(self._pending)
+        self._pending = []
+
+    def checkpoint_state(self) -> dict:
+        """
+        ブロック境界での書き込み状態を返す (resume_state に渡すと、この時点から書き込みを再開できる)。
+        ブロックの区切りを変えないよう、未書き出しの行が残っている間は呼べない。
+        """
+        if self._pending:
+            raise RuntimeError("checkpoint_state() must be called at a block boundary.")
+        self._file.flush()
+        # 書き込みを続けても変わらないよう、蓄積中のリストは複製して返す
+        return {'bytes': self._file.tell(), 'header': self._header, 'blocks': list(self._blocks),
+                'row_count': self._row_count}
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_block()
+        self._file.close()
+        index = {
+            'format_version': FORMAT_VERSION,
+            'compression': self.compression,
+            'block_rows': self.block_rows,
+            'header': self._header or [],
+            'total_rows': self._row_count,
+            'blocks': self._blocks,
+        }
+        with open(index_path_for(self.path), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 例外で抜けた場合は残りの行と索引を書き出さない (索引のないファイルは完成していない出力として扱われる)
+            self._file.close()
+
+
+# --- 読み込み ---
+
+def read_index(path: Path) -> dict:
+    """ブロック索引を読み込む"""
+    with open(index_path_for(path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_header(path: Path) -> list:
+    """ファイル全体を展開せずにヘッダー行を返す"""
+    return read_index(path)['header']
+
+
+def _select_blocks(index: dict, start: int, stop: int) -> list:
+    """行範囲 [start, stop) と重なるブロックだけを選ぶ"""
+    return [
+        block for block in index['blocks']
+        if block['first_row'] < stop and block['first_row'] + block['rows'] > start
+    ]
+
+
+def _decompress_blocks(path: Path, index: dict, blocks: list, max_workers=None) -> list:
+    """選択したブロックを読み出し、スレッドプールで並列に展開してテキストのリストを返す"""
+    decompress = COMPRESSORS[index['compression']][1]
+    with open(path, 'rb') as f:
+        payloads = []
+        for block in blocks:
+            f.seek(block['offset'])
+            payloads.append(f.read(block['length']))
+    if len(payloads) <= 1:
+        return [decompress(p).decode('utf-8') for p in payloads]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [data.decode('utf-8') for data in executor.map(decompress, payloads)]
+
+
+def _parse_frame(header: list, texts: list, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    展開済みのブロックテキストをヘッダー付きCSVとしてまとめてパースする。
+    ヘッダー行を先頭に付けて read_csv に渡すため、重複列名の扱い ('列.1' など) や
+    型推論は元のCSVを直接読んだ場合と一致する。
+    """
+    text = _format_csv_rows([header]) + ''.join(texts)
+    return pd.read_csv(io.StringIO(text), **read_csv_kwargs)
+
+
+def read_frame(path: Path, usecols=None, start: int = None, stop: int = None, max_workers=None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    行ブロックファイルを DataFrame として読み込む。
+    start/stop を指定すると、その行範囲を含むブロックだけを展開する。
+    返り値のインデックスはファイル先頭からの行番号となる。
+    """
+    index = read_index(path)
+    total_rows = index['total_rows']
+    start = 0 if start is None else max(0, start)
+    stop = total_rows if stop is None else min(stop, total_rows)
+
+    blocks = _select_blocks(index, start, stop)
+    texts = _decompress_blocks(path, index, blocks, max_workers=max_workers)
+    df = _parse_frame(index['header'], texts, usecols=usecols, **read_csv_kwargs)
+    if not blocks:
+        return df
+
+    # ブロック境界に合わせて読み込んだ分を、要求された行範囲に切り詰める
+    first_row = blocks[0]['first_row']
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+    return df.loc[start:stop - 1]
+
+
+def iter_frames(path: Path, usecols=None, chunksize: int = None, max_workers=None, **read_csv_kwargs):
+    """
+    ブロック境界に沿ってファイルをチャンク単位の DataFrame として順に返す。
+    chunksize 行に達するまでブロックをまとめ、まとめたブロックは並列に展開する。
+    """
+    index = read_index(path)
+    blocks = index['blocks']
+    chunksize = chunksize or index['block_rows']
+
+    group = []
+    group_rows = 0
+    for block in blocks:
+        group.append(block)
+        group_rows += block['rows']
+        if group_rows >= chunksize:
+            yield _frame_for_blocks(path, index, group, usecols, max_workers, read_csv_kwargs)
+            group, group_rows = [], 0
+    if group:
+        yield _frame_for_blocks(path, index, group, usecols, max_workers, read_csv_kwargs)
+
+
+def _frame_for_blocks(path, index, blocks, usecols, max_workers, read_csv_kwargs):
+    texts = _decompress_blocks(path, index, blocks, max_workers=max_workers)
+    df = _parse_frame(index['header'], texts, usecols=usecols, **read_csv_kwargs)
+    first_row = blocks[0]['first_row']
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+    return df
+
+
+def iter_rows(path: Path, start: int = None, stop: int = None):
+    """ヘッダーを除くデータ行を文字列のリストとして順に返す (pandasを使わない軽量版)"""
+    index = read_index(path)
+    start = 0 if start is None else max(0, start)
+    stop = index['total_rows'] if stop is None else stop
+    decompress = COMPRESSORS[index['compression']][1]
+    with open(path, 'rb') as f:
+        for block in _select_blocks(index, start, stop):
+            f.seek(block['offset'])
+            text = decompress(f.read(block['length'])).decode('utf-8')
+            for i, row in enumerate(csv.reader(io.StringIO(text)), start=block['first_row']):
+                if start <= i < stop:
+                    yield row
+
+
+def is_rowblock(path: Path) -> bool:
+    return Path(path).suffix == ROWBLOCK_SUFFIX
@@ -0,0 +1,129 @@
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.business_keys import build_business_ids, detect_year_from_contents, map_ministry_ids
+from src.lib.normalization import normalize_text
+
+# --- サンプルモード ---
+# 環境変数 GYOUKAKU_SAMPLE を指定すると、全ステージが縮小したコーパスを対象に動き、
+# 出力は本番とは別の出力ルート (既定では sample/) に書かれる (出力先は src.lib.paths が決める)。
+# 行の選び方は 01_convert_to_csv が生CSVを書き出すときに適用し、後続のステージはそのCSVをそのまま処理する。
+#   head:N        各シートの先頭N行
+#   stratified:N  リリース (ファイル) × 府省庁ごとに、出現順で先頭N行
+# どちらも入力が同じなら同じ行を選ぶ。ヘッダーと列構成には手を加えないため、
+# 年度ごとの事業番号レイアウト (generate_business_ids が前提とするもの) はそのまま保たれる。
+# セグメントシートは、同じリリースのレビューシートで選ばれた事業の行だけを残し、親事業との対応を崩さない。
+# 親事業との対応は、11_build_segment_table と同じく衝突を解消する前の代理キー (build_business_ids) で判定する。
+
+SAMPLE_ENV_VAR = 'GYOUKAKU_SAMPLE'
+SAMPLE_MODES = ('head', 'stratified')
+# 'head:200' / 'stratified:20' / '200' (= head:200)
+RE_SAMPLE_SPEC = re.compile(r'^(?:(' + '|'.join(SAMPLE_MODES) + r'):)?(\d+)$')
+
+MINISTRY_COLUMNS = ['府省庁', '府省']
+# 代理キーを列演算でまとめて求めるため、この行数ずつ読み進めて選ぶ
+SAMPLE_BATCH_ROWS = 1000
+
+
+def parse_sample_spec(text):
+    """サンプルの指定を (方式, 行数) に変換する。空の場合は None を返す"""
+    if not text or not text.strip():
+        return None
+    match = RE_SAMPLE_SPEC.match(text.strip())
+    if not match or int(match.group(2)) <= 0:
+        raise ValueError(f"Invalid sample spec '{text}'. Use 'head:N' or 'stratified:N' (N > 0).")
+    return (match.group(1) or 'head', int(match.group(2)))
+
+
+def format_sample_spec(spec) -> str:
+    return f"{spec[0]}:{spec[1]}"
+
+
+def get_sample_spec():
+    """環境変数からサンプルの指定を読み込む。サンプルモードでない場合は None を返す"""
+    return parse_sample_spec(os.environ.get(SAMPLE_ENV_VAR, ''))
+
+
+def is_segment_sheet(name) -> bool:
+    """シート名 (またはシートごとのファイルのパス) がセグメントシートかどうか"""
+    return 'セグメント' in str(name)
+
+
+def order_release_sheets(names) -> list:
+    """親事業を先に選ぶため、レビューシートをセグメントシートより先に並べる (それ以外の順序は保つ)"""
+    return sorted(names, key=is_segment_sheet)
+
+
+class RowSampler:
+    """
+    1シート分のデータ行を、サンプルの指定に従って先頭から順に選ぶ。
+    linked_keys を渡した場合は (セグメントシート)、その代理キーを持つ行だけを全て選ぶ。
+    代理キーの年度レイアウトには file_year を使い、指定がなければヘッダーの予算額の列から判定する。
+    行は文字列のリストで渡す (ヘッダー行は含めない)。
+    """
+
+    def __init__(self, spec, header, linked_keys=None, file_year=None):
+        self.mode, self.size = spec
+        names = [normalize_text(str(cell)) for cell in header]
+        ministry_cols = [col for col in MINISTRY_COLUMNS if col in names]
+        self.ministry_index = names.index(ministry_cols[0]) if ministry_cols else None
+        self.key_indices = {col: names.index(col) for col in ID_CANDIDATE_COLUMNS if col in names}
+        self.file_year = file_year or detect_year_from_contents(names)
+        self.linked_keys = linked_keys
+        self.linked_rows = 0
+        self.counts = Counter()
+        self.selected_keys = set()
+
+    def _cell(self, row, index):
+        return normalize_text(row[index]) if index is not None and index < len(row) else ''
+
+    def business_ids(self, rows) -> list:
+        """行ごとの代理キー (衝突は解消しない) のリスト。年度を判定できない場合は全て None"""
+        if not self.file_year:
+            return [None] * len(rows)
+        keys = pd.DataFrame({col: [self._cell(row, i) for row in rows] for col, i in self.key_indices.items()},
+                            index=pd.RangeIndex(len(rows)), dtype=str)
+        ministry_names = pd.Series([self._cell(row, self.ministry_index) for row in rows], dtype=str)
+        business_ids, _ = build_business_ids(keys, self.file_year, map_ministry_ids(ministry_names))
+        return [None if pd.isna(business_id) else business_id for business_id in business_ids]
+
+    def _accept(self, row, business_id) -> bool:
+        if self.linked_keys is not None:
+            linked = business_id is not None and business_id in self.linked_keys
+            self.linked_rows += linked
+            return linked
+        stratum = self._cell(row, self.ministry_index) if self.mode == 'stratified' else ''
+        if self.counts[stratum] >= self.size:
+            return False
+        self.counts[stratum] += 1
+        if business_id is not None:
+            self.selected_keys.add(business_id)
+        return True
+
+    def select(self, rows):
+        """選ばれた行を順に返す。head 方式で必要な行数が揃った時点で残りの行は読まない"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) < SAMPLE_BATCH_ROWS:
+                continue
+            yield from self._select_batch(batch)
+            batch = []
+            if self.exhausted:
+                return
+        if batch:
+            yield from self._select_batch(batch)
+
+    def _select_batch(self, batch):
+        for row, business_id in zip(batch, self.business_ids(batch)):
+            if self._accept(row, business_id):
+                yield row
+
+    @property
+    def exhausted(self) -> bool:
+        """head 方式で必要な行数が揃い、残りの行を読む必要がなくなったかどうか"""
+        return self.mode == 'head' and self.linked_keys is None and self.counts[''] >= self.size
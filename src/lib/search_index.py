@@ -0,0 +1,462 @@
+import re
+import json
+import math
+import heapq
+import struct
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from pathlib import Path
+
+from src.lib.normalization import normalize_text
+
+# --- 定数定義 ---
+# インデックスは次のファイルからなる。検索時はどれも必要な部分だけをシークして読み込む。
+#   lexicon.json         件数・列の重みと、語の一覧のブロック索引 (LEXICON_BLOCK_TERMS 語ごとの先頭の語と位置)
+#   terms.tsv            語の一覧 (語の昇順)。語ごとの転置リスト・出現位置の位置と長さ、文書頻度
+#   terms_reverse.tsv    バイグラムを逆順にした語の一覧 (1文字の検索語で、2文字目に含む語を探すため)
+#   postings.bin         語ごとの転置リスト (文書、tf、出現した列、出現位置の長さ)
+#   positions.bin        語・文書ごとの出現位置。検索語がバイグラムの並びとして連続して現れるかの確認に使う
+#   docs.jsonl, docs.idx 文書ごとの代理キー・年度・ファイル名・事業名と、各行の先頭位置 (8バイトずつ)
+# 本文は保存せず、検索語の出現は出現位置だけで確認する。
+
+LEXICON_FILE = 'lexicon.json'
+TERMS_FILE = 'terms.tsv'
+REVERSE_TERMS_FILE = 'terms_reverse.tsv'
+POSTINGS_FILE = 'postings.bin'
+POSITIONS_FILE = 'positions.bin'
+DOCS_FILE = 'docs.jsonl'
+DOC_OFFSETS_FILE = 'docs.idx'
+INDEX_VERSION = 2
+
+LEXICON_BLOCK_TERMS = 128
+DOC_OFFSET = struct.Struct('<Q')
+
+# 出現位置は「列の番号 × FIELD_POSITION_STRIDE + 列の中での位置」とし、列をまたいで連続しないようにする。
+# トークンの間は1つ空けるため、連続する位置のバイグラムは同じトークンの中にある
+FIELD_POSITION_STRIDE = 1 << 20
+TOKEN_GAP = 1
+
+# 空白や記号で区切ったトークンの中でバイグラムを作る (区切りをまたぐバイグラムは作らない)
+RE_TOKEN_SEPARATOR = re.compile(r'[\s、。，．,.・:：;；()（）「」『』\[\]【】"\'!?！？/\\-]+')
+
+# 事業名に検索語がそのまま含まれる場合のスコア加算
+TITLE_FIELD = '事業名'
+TITLE_MATCH_BONUS = 5.0
+
+
+# --- テキスト -> 検索語 ---
+
+def _prepare(text: str) -> str:
+    return normalize_text(text).lower() if isinstance(text, str) else ''
+
+
+def tokenize(text: str) -> list:
+    """正規化済みテキストを区切り文字で分割する"""
+    return [token for token in RE_TOKEN_SEPARATOR.split(text) if token]
+
+
+def ngrams(text: str) -> list:
+    """
+    テキストからバイグラムのリストを作る。1文字だけのトークンはそのまま1文字の語とする。
+    """
+    return [gram for gram, _ in positioned_ngrams(text)]
+
+
+def positioned_ngrams(text: str, start: int = 0) -> list:
+    """(語, 出現位置) のリストを返す。トークンの間は TOKEN_GAP だけ位置を空ける"""
+    grams = []
+    position = start
+    for token in tokenize(text):
+        if len(token) == 1:
+            grams.append((token, position))
+            position += 1
+        else:
+            grams.extend((token[i:i + 2], position + i) for i in range(len(token) - 1))
+            position += len(token) - 1
+        position += TOKEN_GAP
+    return grams
+
+
+# --- 可変長整数による圧縮 ---
+
+def encode_varints(numbers) -> bytes:
+    """非負整数の列を可変長整数 (7bitずつ、上位ビットが継続フラグ) に符号化する"""
+    out = bytearray()
+    for n in numbers:
+        while n >= 0x80:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+    return bytes(out)
+
+
+def decode_varints(data: bytes) -> list:
+    numbers = []
+    n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(n)
+            n = shift = 0
+    return numbers
+
+
+def encode_deltas(numbers: list) -> bytes:
+    """昇順の整数の列を差分の可変長整数に符号化する"""
+    previous = 0
+    deltas = []
+    for n in numbers:
+        deltas.append(n - previous)
+        previous = n
+    return encode_varints(deltas)
+
+
+def decode_deltas(data: bytes) -> list:
+    numbers = []
+    previous = 0
+    for delta in decode_varints(data):
+        previous += delta
+        numbers.append(previous)
+    return numbers
+
+
+def encode_postings(postings: list) -> bytes:
+    """
+    (doc_id, tf, 列のビットマスク, 出現位置のバイト数) のリスト (doc_id昇順) を、
+    doc_idの差分とそれ以外の値を順に並べて符号化する
+    """
+    flat = []
+    previous = 0
+    for doc_id, tf, field_mask, positions_length in postings:
+        flat.extend((doc_id - previous, tf, field_mask, positions_length))
+        previous = doc_id
+    return encode_varints(flat)
+
+
+def decode_postings(data: bytes) -> dict:
+    """
+    符号化された転置リストを {doc_id: (tf, 列のビットマスク, 出現位置の開始位置, 出現位置のバイト数)} に戻す。
+    出現位置の開始位置は、その語の出現位置のブロックの先頭からのバイト数。
+    """
+    flat = decode_varints(data)
+    postings = {}
+    doc_id = 0
+    offset = 0
+    for i in range(0, len(flat), 4):
+        doc_id += flat[i]
+        postings[doc_id] = (flat[i + 1], flat[i + 2], offset, flat[i + 3])
+        offset += flat[i + 3]
+    return postings
+
+
+# --- インデックス構築 ---
+
+def _write_lexicon(path: Path, entries: list) -> list:
+    """(語, 値のリスト) を語の昇順に書き出し、LEXICON_BLOCK_TERMS 語ごとの [先頭の語, バイト位置] を返す"""
+    blocks = []
+    with open(path, 'wb') as f:
+        for i, (term, values) in enumerate(entries):
+            if i % LEXICON_BLOCK_TERMS == 0:
+                blocks.append([term, f.tell()])
+            f.write('\t'.join([term, *map(str, values)]).encode('utf-8') + b'\n')
+    return blocks
+
+
+class SearchIndexBuilder:
+    """
+    事業 (business_id) の1行を1文書とし、対象列のテキストからバイグラム転置インデックスを作る。
+    文書は add_document() の呼び出し順に連番の doc_id が振られるため、転置リストは常に昇順になる。
+    同じ事業が複数のリリースに含まれる場合は文書も複数になり、検索結果で事業ごとにまとめる。
+    """
+
+    def __init__(self, field_weights: dict):
+        self.field_weights = field_weights
+        self.fields = list(field_weights)
+        self.docs = []
+        self.postings = {}
+
+    def _field_index(self, col: str) -> int:
+        if col not in self.fields:
+            self.fields.append(col)
+        return self.fields.index(col)
+
+    def add_document(self, business_id: str, year: int, source_file: str, fields: dict):
+        doc_id = len(self.docs)
+        title = fields.get(TITLE_FIELD)
+        self.docs.append({
+            'business_id': business_id, 'year': year, 'source_file': source_file,
+            'title': title if isinstance(title, str) else '',
+        })
+
+        term_freq = Counter()
+        field_masks = Counter()
+        positions = {}
+        for col, value in fields.items():
+            if not (isinstance(value, str) and value):
+                continue
+            index = self._field_index(col)
+            weight = self.field_weights.get(col, 1)
+            for gram, position in positioned_ngrams(_prepare(value), index * FIELD_POSITION_STRIDE):
+                term_freq[gram] += weight
+                field_masks[gram] |= 1 << index
+                positions.setdefault(gram, []).append(position)
+        for gram, tf in term_freq.items():
+            self.postings.setdefault(gram, []).append((doc_id, tf, field_masks[gram], encode_deltas(positions[gram])))
+
+    def write(self, index_dir: Path):
+        index_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        with open(index_dir / POSTINGS_FILE, 'wb') as postings_file, \
+                open(index_dir / POSITIONS_FILE, 'wb') as positions_file:
+            for term in sorted(self.postings):
+                postings = self.postings[term]
+                data = encode_postings([(doc_id, tf, mask, len(pos)) for doc_id, tf, mask, pos in postings])
+                entries.append((term, [postings_file.tell(), len(data), len(postings), positions_file.tell()]))
+                postings_file.write(data)
+                for _, _, _, pos in postings:
+                    positions_file.write(pos)
+
+        blocks = _write_lexicon(index_dir / TERMS_FILE, entries)
+        reverse_entries = sorted((term[::-1], values) for term, values in entries if len(term) == 2)
+        reverse_blocks = _write_lexicon(index_dir / REVERSE_TERMS_FILE, reverse_entries)
+
+        with open(index_dir / DOCS_FILE, 'wb') as docs_file, open(index_dir / DOC_OFFSETS_FILE, 'wb') as offsets_file:
+            for doc in self.docs:
+                offsets_file.write(DOC_OFFSET.pack(docs_file.tell()))
+                docs_file.write(json.dumps(doc, ensure_ascii=False).encode('utf-8') + b'\n')
+
+        with open(index_dir / LEXICON_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'doc_count': len(self.docs), 'term_count': len(entries),
+                       'field_weights': self.field_weights, 'fields': self.fields,
+                       'blocks': blocks, 'reverse_blocks': reverse_blocks}, f, ensure_ascii=False)
+        return len(self.docs), len(entries)
+
+
+# --- 検索 ---
+
+class _Lexicon:
+    """語の昇順に並んだ語の一覧を、ブロック索引を使って必要なブロックだけ読み込んで引く"""
+
+    def __init__(self, path: Path, blocks: list):
+        self._file = open(path, 'rb')
+        self._first_terms = [term for term, _ in blocks]
+        self._offsets = [offset for _, offset in blocks]
+
+    def close(self):
+        self._file.close()
+
+    def _scan(self, block: int):
+        """ブロックの先頭から (語, 値のリスト) を順に返す (ファイルの終わりまで)"""
+        if block < 0 or block >= len(self._offsets):
+            return
+        self._file.seek(self._offsets[block])
+        for line in self._file:
+            term, *values = line.decode('utf-8').rstrip('\n').split('\t')
+            yield term, [int(v) for v in values]
+
+    def get(self, term: str):
+        for found, values in self._scan(bisect_right(self._first_terms, term) - 1):
+            if found == term:
+                return values
+            if found > term:
+                break
+        return None
+
+    def prefixed(self, prefix: str):
+        """prefix で始まる (語, 値のリスト) を順に返す"""
+        for found, values in self._scan(max(bisect_left(self._first_terms, prefix) - 1, 0)):
+            if found.startswith(prefix):
+                yield found, values
+            elif found > prefix:
+                break
+
+
+class _TopScores:
+    """事業ごとのスコア (増えることはあっても減らない) のうち、上位 limit 件を最小ヒープで保持する"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._heap = []
+        self._members = set()
+
+    @property
+    def threshold(self):
+        """上位 limit 件に入るための最低スコア (まだ limit 件に達していなければ None)"""
+        return self._heap[0][0] if len(self._heap) >= self.limit else None
+
+    def offer(self, key: str, score: float):
+        if key in self._members:
+            self._heap = [(score if k == key else s, k) for s, k in self._heap]
+            heapq.heapify(self._heap)
+        elif len(self._heap) < self.limit:
+            heapq.heappush(self._heap, (score, key))
+            self._members.add(key)
+        elif score > self._heap[0][0]:
+            _, removed = heapq.heapreplace(self._heap, (score, key))
+            self._members.discard(removed)
+            self._members.add(key)
+
+
+class SearchIndex:
+    """
+    構築済みのインデックスを読み込み、キーワード検索を行う。
+    語の一覧・転置リスト・出現位置・文書情報は、どれも必要になった部分だけをファイルから読み出す。
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / LEXICON_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Search index in '{self.index_dir}' has version {meta.get('version')}, "
+                             f"expected {INDEX_VERSION}. Rebuild it with 08_build_search_index.")
+        self.doc_count = meta['doc_count']
+        self.fields = meta['fields']
+        self._title_index = self.fields.index(TITLE_FIELD) if TITLE_FIELD in self.fields else None
+        self._terms = _Lexicon(self.index_dir / TERMS_FILE, meta['blocks'])
+        self._reverse_terms = _Lexicon(self.index_dir / REVERSE_TERMS_FILE, meta['reverse_blocks'])
+        self._postings_file = open(self.index_dir / POSTINGS_FILE, 'rb')
+        self._positions_file = open(self.index_dir / POSITIONS_FILE, 'rb')
+        self._docs_file = open(self.index_dir / DOCS_FILE, 'rb')
+        self._doc_offsets_file = open(self.index_dir / DOC_OFFSETS_FILE, 'rb')
+
+    def close(self):
+        for f in (self._postings_file, self._positions_file, self._docs_file, self._doc_offsets_file):
+            f.close()
+        self._terms.close()
+        self._reverse_terms.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def doc(self, doc_id: int) -> dict:
+        """文書情報 (代理キー・年度・ファイル名・事業名) を1件だけ読み込む"""
+        self._doc_offsets_file.seek(doc_id * DOC_OFFSET.size)
+        (offset,) = DOC_OFFSET.unpack(self._doc_offsets_file.read(DOC_OFFSET.size))
+        self._docs_file.seek(offset)
+        return json.loads(self._docs_file.readline())
+
+    def _read_postings(self, entry: list) -> dict:
+        offset, length, _, positions_offset = entry
+        self._postings_file.seek(offset)
+        postings = decode_postings(self._postings_file.read(length))
+        return {doc_id: (tf, mask, positions_offset + start, size)
+                for doc_id, (tf, mask, start, size) in postings.items()}
+
+    def postings(self, term: str) -> dict:
+        """{doc_id: (tf, 列のビットマスク, 出現位置のファイル内の位置, バイト数)} を返す"""
+        entry = self._terms.get(term)
+        return self._read_postings(entry) if entry is not None else {}
+
+    def positions(self, posting: tuple) -> list:
+        _, _, offset, size = posting
+        self._positions_file.seek(offset)
+        return decode_deltas(self._positions_file.read(size))
+
+    def _keyword_postings(self, keyword: str) -> list:
+        """
+        キーワードを構成する語の転置リストを返す。
+        1文字のキーワードは、その文字を含む全ての語の転置リストを合わせたものとする (tf は合計、列は和集合)。
+        """
+        if len(keyword) == 1:
+            entries = list(self._terms.prefixed(keyword))
+            entries += [(term[::-1], values) for term, values in self._reverse_terms.prefixed(keyword)
+                        if term[::-1] != keyword * 2]
+            merged = {}
+            for _, entry in entries:
+                for doc_id, (tf, mask, _, _) in self._read_postings(entry).items():
+                    total, total_mask = merged.get(doc_id, (0, 0))
+                    merged[doc_id] = (total + tf, total_mask | mask)
+            return [(keyword, merged)]
+        return [(gram, self.postings(gram)) for gram in dict.fromkeys(ngrams(keyword))]
+
+    def _mask_fields(self, mask: int) -> set:
+        return {i for i in range(len(self.fields)) if mask >> i & 1}
+
+    def _phrase_fields(self, keyword: str, doc_id: int, postings_by_gram: dict) -> set:
+        """
+        キーワードのバイグラムが連続する位置に現れる列の番号の集合を返す (現れなければ空集合)。
+        1つの語からなるキーワードは、転置リストの列のビットマスクから求める。
+        """
+        grams = ngrams(keyword)
+        if len(grams) == 1:
+            return self._mask_fields(postings_by_gram[grams[0]][doc_id][1])
+        cache = {}
+        for gram in grams:
+            if gram not in cache:
+                cache[gram] = set(self.positions(postings_by_gram[gram][doc_id]))
+        starts = cache[grams[0]]
+        for i, gram in enumerate(grams[1:], start=1):
+            starts = {p for p in starts if p + i in cache[gram]}
+            if not starts:
+                return set()
+        return {p // FIELD_POSITION_STRIDE for p in starts}
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        空白区切りの全てのキーワードを含む事業を、tf-idf にもとづくスコアの高い順に返す。
+        バイグラムの一致だけでは語順が保証されないため、スコアの高い候補から出現位置でキーワードの連続を確認する。
+        同じ事業が複数のリリースに含まれる場合は、スコアの最も高い文書だけを返す。
+        """
+        keywords = tokenize(_prepare(query))
+        if not keywords:
+            return []
+
+        term_postings = []
+        for keyword in keywords:
+            term_postings.extend(self._keyword_postings(keyword))
+        if any(not postings for _, postings in term_postings):
+            return []
+        postings_by_gram = dict(term_postings)
+
+        # 転置リストの短い順に積集合をとって候補を絞り込む
+        ordered = sorted(term_postings, key=lambda item: len(item[1]))
+        candidates = set(ordered[0][1])
+        for _, postings in ordered[1:]:
+            candidates &= postings.keys()
+            if not candidates:
+                return []
+
+        scored = sorted(
+            (-sum(postings[doc_id][0] * math.log(1 + self.doc_count / len(postings))
+                  for _, postings in term_postings), doc_id)
+            for doc_id in candidates
+        )
+
+        results = {}
+        top = _TopScores(limit)
+        for negative_score, doc_id in scored:
+            # 事業名の加算を最大まで受けても上位に入らない候補に達したら打ち切る
+            # (同じスコアの候補は確認を続け、並び順を事業の代理キーで決める)
+            if top.threshold is not None and round(-negative_score + TITLE_MATCH_BONUS * len(keywords), 3) < top.threshold:
+                break
+            title_matches = 0
+            for keyword in keywords:
+                if len(keyword) == 1:
+                    fields = self._mask_fields(postings_by_gram[keyword][doc_id][1])
+                else:
+                    fields = self._phrase_fields(keyword, doc_id, postings_by_gram)
+                if not fields:
+                    break
+                title_matches += self._title_index in fields
+            else:
+                doc = self.doc(doc_id)
+                score = round(-negative_score + TITLE_MATCH_BONUS * title_matches, 3)
+                previous = results.get(doc['business_id'])
+                if previous is None or score > previous['score']:
+                    results[doc['business_id']] = {
+                        'business_id': doc['business_id'],
+                        'year': doc['year'],
+                        '事業名': doc['title'],
+                        'score': score,
+                        'source_file': doc['source_file'],
+                    }
+                    top.offer(doc['business_id'], score)
+
+        hits = sorted(results.values(), key=lambda r: (-r['score'], r['business_id']))
+        return hits[:limit]
@@ -0,0 +1,355 @@
+import csv
+import io
+import json
+import zlib
+from bisect import bisect_left
+from itertools import compress
+from pathlib import Path
+
+import pandas as pd
+
+# --- 疎な列形式 (sparse) ---
+# 15,000列規模のシートは大半の列が空かほとんど空で、CSV や DataFrame では空のセルも全て実体化される。
+# 疎な列形式では行を block_rows 行ごとのブロックに分け、ブロック内の列ごとに値のあるセルだけを格納する。
+# 列の格納方式は、ブロック内でその列に値のある割合 (1 - null率) で決める:
+#   'd' (dense)  割合が DENSE_FILL_RATIO 以上: ブロックの全行の値 (空は null)
+#   's' (sparse) それ以外: 値のある行の (ブロック内の行番号, 値) の組。(行, 列, 値) の3つ組を列ごとにまとめたもの
+#   全て空の列は何も書かない
+# 列ごとのセグメントを独立に圧縮し、索引 (サイドカーJSON) に各ブロック・列のオフセットを記録する。
+# 読み込み時は要求された列のセグメントだけを読み出して展開し、その列だけの DataFrame を組み立てる。
+# 空文字のセルは空として扱う (CSV を pandas で読んだ場合と同じく NaN になる)。ヘッダーより長い行の余分なセルは捨てる。
+
+SPARSE_SUFFIX = '.spc'
+INDEX_SUFFIX = '.idx.json'
+FORMAT_VERSION = 1
+
+# 1ブロックあたりの行数。列ごとにセグメントを分けるため、行ブロック形式より大きくとる
+DEFAULT_BLOCK_ROWS = 5000
+# ブロック内で値のある割合がこれ以上の列は、行番号を持たない dense で格納する
+DENSE_FILL_RATIO = 0.5
+COMPRESSION_LEVEL = 6
+
+
+def index_path_for(path: Path) -> Path:
+    """疎な列形式のファイルに対応する索引ファイルのパスを返す"""
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def is_sparse(path: Path) -> bool:
+    return Path(path).suffix == SPARSE_SUFFIX
+
+
+def _encode(payload) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+                         COMPRESSION_LEVEL)
+
+
+def _decode(data: bytes):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+# --- 書き込み ---
+
+class SparseColumnWriter:
+    """
+    行を固定行数のブロックに分け、ブロック内の列ごとに値のあるセルだけを書き出すライター。
+    RowBlockWriter と同じく writerow() で行を受け取り、最初の行をヘッダーとして扱う。
+    close() 時に索引 (ヘッダー・各ブロックの列セグメントの位置・列ごとの値のあるセルの数) を書き出す。
+    with 文を例外で抜けた場合は索引を書き出さない。
+    """
+
+    def __init__(self, path: Path, block_rows: int = DEFAULT_BLOCK_ROWS, resume_state: dict = None):
+        self.path = Path(path)
+        self.block_rows = block_rows
+        self._header = None
+        self._pending = []
+        self._blocks = []
+        self._row_count = 0
+        self._non_null = []
+        if resume_state is None:
+            self._file = open(self.path, 'wb')
+            return
+        # checkpoint_state() の時点まで書き込み済みの状態に戻し、続きから書き込む
+        self._file = open(self.path, 'r+b')
+        self._file.truncate(resume_state['bytes'])
+        self._file.seek(resume_state['bytes'])
+        self._header = resume_state['header']
+        self._blocks = resume_state['blocks']
+        self._row_count = resume_state['row_count']
+        self._non_null = resume_state['non_null']
+
+    def writerow(self, row):
+        if self._header is None:
+            self._header = list(row)
+            self._non_null = [0] * len(self._header)
+            return
+        self._pending.append(row)
+        if len(self._pending) >= self.block_rows:
+            self._flush_block()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _flush_block(self):
+        if not self._pending:
+            return
+        rows = len(self._pending)
+        width = len(self._header)
+        padding = [''] * width
+        # 行を列に転置する (長さの足りない行は空で埋める)
+        columns = zip(*((row + padding[len(row):]) if len(row) < width else row[:width] for row in self._pending))
+
+        segments = []
+        for position, values in enumerate(columns):
+            filled = rows - values.count('')
+            if not filled:
+                continue
+            if filled >= rows * DENSE_FILL_RATIO:
+                kind, payload = 'd', [value if value != '' else None for value in values]
+            else:
+                kind, payload = 's', [list(compress(range(rows), values)), list(filter(None, values))]
+            data = _encode(payload)
+            segments.append([position, self._file.tell(), len(data), kind])
+            self._file.write(data)
+            self._non_null[position] += filled
+
+        self._blocks.append({'first_row': self._row_count, 'rows': rows, 'columns': segments})
+        self._row_count += rows
+        self._pending = []
+
+    def checkpoint_state(self) -> dict:
+        """
+        ブロック境界での書き込み状態を返す (resume_state に渡すと、この時点から書き込みを再開できる)。
+        ブロックの区切りを変えないよう、未書き出しの行が残っている間は呼べない。
+        """
+        if self._pending:
+            raise RuntimeError("checkpoint_state() must be called at a block boundary.")
+        self._file.flush()
+        # 書き込みを続けても変わらないよう、蓄積中のリストは複製して返す
+        return {'bytes': self._file.tell(), 'header': self._header, 'blocks': list(self._blocks),
+                'row_count': self._row_count, 'non_null': list(self._non_null)}
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_block()
+        self._file.close()
+        index = {
+            'format_version': FORMAT_VERSION,
+            'block_rows': self.block_rows,
+            'header': self._header or [],
+            'total_rows': self._row_count,
+            'non_null': self._non_null,
+            'blocks': self._blocks,
+        }
+        with open(index_path_for(self.path), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 例外で抜けた場合は残りの行と索引を書き出さない (索引のないファイルは完成していない出力として扱われる)
+            self._file.close()
+
+
+# --- 読み込み ---
+
+def read_index(path: Path) -> dict:
+    with open(index_path_for(path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_header(path: Path) -> list:
+    """ファイルを展開せずにヘッダー行を返す"""
+    return read_index(path)['header']
+
+
+def read_columns(path: Path) -> list:
+    """pandas で読み込んだ場合の列名のリスト。ファイルを展開せずに求められる"""
+    return _frame_columns(read_header(path))
+
+
+def column_null_rates(path: Path) -> pd.Series:
+    """索引に記録された列ごとの null率 (空のセルの割合)。ファイルを展開せずに求められる"""
+    index = read_index(path)
+    total = index['total_rows']
+    non_null = pd.Series(index['non_null'], index=_frame_columns(index['header']), dtype='int64')
+    return 1 - non_null / total if total else non_null.astype(float)
+
+
+def _csv_buffer(header: list, rows) -> io.BytesIO:
+    """
+    ヘッダーと行を UTF-8 のCSVとして書いたバッファを返す。
+    文字列を介さずに書き込みながら符号化するため、非ASCIIの値が多くても展開した値の数倍のメモリを使わない。
+    """
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+    writer = csv.writer(text, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(rows)
+    text.detach()
+    buffer.seek(0)
+    return buffer
+
+
+def _frame_columns(header: list) -> list:
+    """
+    pandas で読み込んだ場合の列名を返す。空の列名は 'Unnamed: N'、重複する列名は '.1' などを付けて区別する
+    (pandas.read_csv と同じ規則。15,000列の空の DataFrame を作らずに求める)。
+    """
+    names = [name if name != '' else f"Unnamed: {i}" for i, name in enumerate(header)]
+    original = set(names)
+    counts = {}
+    for i, base in enumerate(names):
+        name, count = base, counts.get(base, 0)
+        while count > 0:
+            counts[base] = count + 1
+            name = f"{base}.{count}"
+            # 元のヘッダーにある列名とも重ならない番号を使う
+            count = count + 1 if name in original else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def _select_positions(columns: list, usecols) -> list:
+    """usecols (列名のリスト・位置のリスト・列名を受け取る関数) を列の位置のリストに変換する"""
+    if usecols is None:
+        return list(range(len(columns)))
+    if callable(usecols):
+        return [i for i, name in enumerate(columns) if usecols(name)]
+    wanted = list(usecols)
+    if all(isinstance(col, int) for col in wanted):
+        return sorted(wanted)
+    wanted = set(wanted)
+    missing = wanted - set(columns)
+    if missing:
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {sorted(missing)}")
+    return [i for i, name in enumerate(columns) if name in wanted]
+
+
+def _decode_block(f, block: dict, positions: list) -> dict:
+    """1ブロックのうち、指定した位置の列のセグメントを {位置: (格納方式, 内容)} として展開する (全て空の列は含まない)"""
+    wanted = set(positions)
+    decoded = {}
+    for position, offset, length, kind in block['columns']:
+        if position in wanted:
+            f.seek(offset)
+            decoded[position] = (kind, _decode(f.read(length)))
+    return decoded
+
+
+def _slice_column(segment, lo: int, hi: int) -> list:
+    """展開したセグメントのブロック内の行範囲 [lo, hi) を、値のリスト (空は None) にする"""
+    if segment is None:
+        return [None] * (hi - lo)
+    kind, payload = segment
+    if kind == 'd':
+        return payload[lo:hi]
+    rows, values = payload
+    first, last = bisect_left(rows, lo), bisect_left(rows, hi)
+    result = [None] * (hi - lo)
+    for i, value in zip(rows[first:last], values[first:last]):
+        result[i - lo] = value
+    return result
+
+
+def _iter_pieces(path: Path, blocks: list, positions: list, start: int, stop: int):
+    """行範囲 [start, stop) と重なるブロックを順に展開し、(展開したブロック, ブロック内の開始行, 終了行) を返す"""
+    with open(path, 'rb') as f:
+        for block in blocks:
+            first = block['first_row']
+            lo, hi = max(start, first) - first, min(stop, first + block['rows']) - first
+            if lo < hi:
+                yield _decode_block(f, block, positions), lo, hi
+
+
+def _reads_as_strings(read_csv_kwargs: dict) -> bool:
+    """全列を文字列として読む指定 (dtype=str) だけかどうか"""
+    return read_csv_kwargs.get('dtype') is str and set(read_csv_kwargs) <= {'dtype', 'low_memory'}
+
+
+def _build_frame(names: list, positions: list, pieces: list, first_row: int, read_csv_kwargs: dict) -> pd.DataFrame:
+    """
+    展開したブロックの行範囲から、要求された列だけの dense な DataFrame を組み立てる。
+    dtype=str の場合は列から直接組み立て、それ以外はヘッダー付きCSVとして read_csv でパースするため、
+    dtype などの read_csv の引数や型推論は元のCSVを直接読んだ場合と同じように働く。
+    パースの間に展開した値を保持しないよう、CSVに書き出したあとで pieces を空にする。
+    """
+    frame_index = pd.RangeIndex(first_row, first_row + sum(hi - lo for _, lo, hi in pieces))
+    if not positions:
+        return pd.DataFrame(index=frame_index, columns=[])
+
+    values = []
+    for position in positions:
+        column = []
+        for decoded, lo, hi in pieces:
+            column.extend(_slice_column(decoded.get(position), lo, hi))
+        values.append(column)
+    if _reads_as_strings(read_csv_kwargs):
+        return pd.DataFrame(dict(zip(names, values)), index=frame_index, dtype=str)
+    # 1列だけの行の空セルは空行とみなされて読み飛ばされるため、空の列を末尾に足して読み、あとで落とす
+    buffer = _csv_buffer(names + ['__sparse_pad__'], zip(*values, [None] * len(frame_index)))
+    del values
+    pieces.clear()
+    df = pd.read_csv(buffer, **read_csv_kwargs).drop(columns='__sparse_pad__')
+    df.index = frame_index
+    return df
+
+
+def _selected_columns(index: dict, usecols):
+    columns = _frame_columns(index['header'])
+    positions = _select_positions(columns, usecols)
+    return [columns[i] for i in positions], positions
+
+
+def read_frame(path: Path, usecols=None, start: int = None, stop: int = None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    疎な列形式のファイルを DataFrame として読み込む。要求された列 (usecols) のセグメントだけを展開する。
+    start/stop を指定すると、その行範囲を含むブロックだけを読む。返り値のインデックスはファイル先頭からの行番号となる。
+    """
+    index = read_index(path)
+    start = 0 if start is None else max(0, start)
+    stop = index['total_rows'] if stop is None else min(stop, index['total_rows'])
+    names, positions = _selected_columns(index, usecols)
+    pieces = list(_iter_pieces(path, index['blocks'], positions, start, stop))
+    return _build_frame(names, positions, pieces, start, read_csv_kwargs)
+
+
+def iter_frames(path: Path, usecols=None, chunksize: int = None, **read_csv_kwargs):
+    """
+    ファイルを chunksize 行ずつの DataFrame として順に返す (最後のチャンクは短くなる)。
+    ブロックは1回だけ展開し、チャンクはブロックの境界をまたいでもよい。
+    """
+    index = read_index(path)
+    chunksize = chunksize or index['block_rows']
+    names, positions = _selected_columns(index, usecols)
+    pieces, piece_rows, first_row = [], 0, 0
+    for decoded, lo, hi in _iter_pieces(path, index['blocks'], positions, 0, index['total_rows']):
+        while lo < hi:
+            take = min(hi - lo, chunksize - piece_rows)
+            pieces.append((decoded, lo, lo + take))
+            piece_rows += take
+            lo += take
+            if piece_rows == chunksize:
+                yield _build_frame(names, positions, pieces, first_row, read_csv_kwargs)
+                first_row += piece_rows
+                pieces, piece_rows = [], 0
+    if pieces:
+        yield _build_frame(names, positions, pieces, first_row, read_csv_kwargs)
+
+
+def iter_rows(path: Path):
+    """ヘッダーを除くデータ行を、全列の文字列のリスト (空は '') として順に返す"""
+    index = read_index(path)
+    positions = list(range(len(index['header'])))
+    for decoded, lo, hi in _iter_pieces(path, index['blocks'], positions, 0, index['total_rows']):
+        columns = [_slice_column(decoded.get(position), lo, hi) for position in positions]
+        for row in zip(*columns):
+            yield [value if value is not None else '' for value in row]
@@ -0,0 +1,319 @@
+import os
+import glob
+import json
+import time
+import socket
+import threading
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+
+from src.lib.paths import QUEUE_DIR
+
+# --- 共有ファイルシステム上のワークキュー ---
+# 複数のマシンから同じ data/ (NFSなど) を参照し、ファイル単位・年度単位の処理を分担するためのキュー。
+# 作業単位 (ファイル名や年度) ごとにリースファイルを排他的に作成できたワーカーだけが処理を行う。
+#   leases/<単位>.lease  処理中のワーカーと有効期限。処理中はハートビートで期限を延ばし続ける
+#   done/<単位>          処理を終えた単位。同じキューでは二度と処理しない
+#   failed/<単位>        失敗した単位とエラー内容。同じキューでは再試行しない
+# ワーカーが落ちてハートビートが止まったリースは、期限が切れた時点で他のワーカーが回収して処理し直す。
+# リースの期限はホストの時刻で判定するため、各ホストの時刻は同期しておくこと。
+# キューは --queue で指定した名前ごとに作られる。実行 (バッチ) ごとに別の名前を使う。
+
+DEFAULT_LEASE_SECONDS = 600
+# 共有ファイル (状態ファイル・品質レポート) のロックを待つ間隔
+LOCK_POLL_SECONDS = 0.2
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _unit_filename(unit) -> str:
+    return str(unit).replace('/', '_').replace(os.sep, '_')
+
+
+def _create_exclusive(path: Path, payload: dict) -> bool:
+    """ファイルが存在しない場合だけ作成する (O_EXCL による作成は NFSv3 以降でも原子的)"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    return True
+
+
+class LeaseLost(Exception):
+    """処理中にリースが期限切れになり、他のワーカーに回収された"""
+
+
+def _read_json(path: Path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class Lease:
+    """
+    1つの作業単位のリース。保持している間はバックグラウンドのスレッドが有効期限を延ばし続ける。
+    処理を終えたら complete()、失敗したら fail()、他のワーカーに譲る場合は release() を呼ぶ。
+    結果 (出力・状態ファイル・品質レポート) を書き出す前には held() を確認し、
+    リースを失っていた場合は何も書き出さない (回収したワーカーが処理し直す)。
+    """
+
+    def __init__(self, queue, unit: str, path: Path):
+        self.queue = queue
+        self.unit = unit
+        self.path = path
+        self.active = True
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            if not self.renew():
+                self._mark_lost()
+                return
+
+    def _mark_lost(self):
+        if not self.lost:
+            self.lost = True
+            print(f"  - [Queue] Lost the lease on '{self.unit}' (taken over by another worker).")
+
+    def owned(self) -> bool:
+        current = _read_json(self.path)
+        if current is None and self.queue._is_being_recovered(self.path):
+            # 他のワーカーが期限切れと判断して別名に移している間は、戻されるのを待ってから判定する
+            time.sleep(LOCK_POLL_SECONDS)
+            current = _read_json(self.path)
+        return current is not None and current.get('worker') == self.queue.worker_id
+
+    def held(self) -> bool:
+        """リースをまだ保持しているか。他のワーカーに回収されていれば False を返す"""
+        if not self.lost and not self.owned():
+            self._mark_lost()
+        return not self.lost
+
+    def ensure_held(self):
+        """リースを失っていれば LeaseLost を送出する (長い処理の途中経過を書き出す前に呼ぶ)"""
+        if not self.held():
+            raise LeaseLost(f"the lease on '{self.unit}' was taken over by another worker")
+
+    def renew(self) -> bool:
+        """有効期限を延ばす。他のワーカーに回収されていた場合は False を返す"""
+        if not self.owned():
+            return False
+        tmp_path = self.path.with_name(f"{self.path.name}.{self.queue.worker_id}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.queue.lease_payload(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def _finish(self, marker_dir: Path = None, **info):
+        if not self.active:
+            return
+        self.active = False
+        self._stop.set()
+        self._thread.join()
+        if not self.owned():
+            # 期限切れで回収されたリースの結果は記録しない (回収したワーカーが処理し直す)
+            return
+        if marker_dir is not None:
+            with open(marker_dir / _unit_filename(self.unit), 'w', encoding='utf-8') as f:
+                json.dump({'worker': self.queue.worker_id, 'finished': time.time(), **info}, f, ensure_ascii=False)
+        self.path.unlink(missing_ok=True)
+
+    def complete(self):
+        self._finish(self.queue.done_dir)
+
+    def fail(self, error):
+        self._finish(self.queue.failed_dir, error=str(error))
+
+    def release(self):
+        self._finish()
+
+
+class _LocalLease:
+    """キューを使わない単独実行で、Lease の代わりに渡す何もしないオブジェクト"""
+
+    def held(self) -> bool:
+        return True
+
+    def ensure_held(self):
+        pass
+
+    def complete(self):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def release(self):
+        pass
+
+
+class WorkQueue:
+    """共有ディレクトリ上の、リース方式のワークキュー"""
+
+    def __init__(self, queue_dir: Path, worker_id: str = None, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.queue_dir = Path(queue_dir)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.lease_dir = self.queue_dir / 'leases'
+        self.done_dir = self.queue_dir / 'done'
+        self.failed_dir = self.queue_dir / 'failed'
+        for directory in (self.lease_dir, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def lease_payload(self) -> dict:
+        return {'worker': self.worker_id, 'expires': time.time() + self.lease_seconds}
+
+    def is_finished(self, unit) -> bool:
+        name = _unit_filename(unit)
+        return (self.done_dir / name).exists() or (self.failed_dir / name).exists()
+
+    def _is_expired(self, path: Path) -> bool:
+        lease = _read_json(path)
+        if lease is None:
+            # 作成直後で中身がまだ書かれていない場合は、ファイルの更新日時から判定する
+            try:
+                return path.stat().st_mtime + self.lease_seconds < time.time()
+            except FileNotFoundError:
+                return False
+        return lease.get('expires', 0) < time.time()
+
+    def _is_being_recovered(self, path: Path) -> bool:
+        return any(path.parent.glob(glob.escape(path.name) + '.stale.*'))
+
+    def _acquire(self, path: Path) -> bool:
+        """ロックファイルを作成する。期限切れのものは回収してから作成し直す"""
+        if _create_exclusive(path, self.lease_payload()):
+            return True
+        if not self._is_expired(path):
+            return False
+        # 期限切れのロックを別名に移してから消す。
+        # 期限切れの確認と rename の間に他のワーカーが回収して新しいロックを作っている場合があるため、
+        # 移したロックがまだ期限切れであることを確認し、そうでなければ元に戻して回収をあきらめる。
+        # 戻すまでの間にさらに別のワーカーがロックを作っている場合に上書きしないよう、rename ではなく link で戻す
+        stale_path = path.with_name(f"{path.name}.stale.{self.worker_id}")
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        if not self._is_expired(stale_path):
+            try:
+                os.link(stale_path, path)
+            except FileExistsError:
+                # 後から作られたロックを優先する (移したロックの持ち主はハートビートで失ったことに気づく)
+                pass
+            stale_path.unlink(missing_ok=True)
+            return False
+        stale_path.unlink(missing_ok=True)
+        print(f"  - [Queue] Recovered an expired lock '{path.name}'.")
+        return _create_exclusive(path, self.lease_payload())
+
+    def try_claim(self, unit):
+        """作業単位のリースを取得する。処理済み・失敗済み・他のワーカーが処理中の場合は None を返す"""
+        unit = str(unit)
+        if self.is_finished(unit):
+            return None
+        path = self.lease_dir / f"{_unit_filename(unit)}.lease"
+        if not self._acquire(path):
+            return None
+        if self.is_finished(unit):
+            # 確認からリース取得までの間に他のワーカーが処理を終えていた
+            path.unlink(missing_ok=True)
+            return None
+        return Lease(self, unit, path)
+
+    def claims(self, units):
+        """
+        取得できた作業単位のリースを順に返す。
+        呼び出し側が complete() / fail() を呼ばないまま次に進んだ場合や、例外で抜けた場合はリースを手放す。
+        """
+        for unit in units:
+            lease = self.try_claim(unit)
+            if lease is None:
+                continue
+            try:
+                yield lease
+            finally:
+                lease.release()
+
+    @contextmanager
+    def lock(self, name: str):
+        """複数のワーカーが読み書きする共有ファイル (状態ファイル・品質レポートなど) の排他ロック"""
+        path = self.queue_dir / f"{name}.lock"
+        while not self._acquire(path):
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            path.unlink(missing_ok=True)
+
+    def summary(self) -> dict:
+        """キュー全体の終了・失敗・処理中の作業単位の数"""
+        return {
+            'done': sum(1 for _ in self.done_dir.iterdir()),
+            'failed': sum(1 for _ in self.failed_dir.iterdir()),
+            'running': sum(1 for _ in self.lease_dir.glob('*.lease')),
+        }
+
+    def status(self, units) -> dict:
+        """作業単位を done / failed / running / pending に分類する"""
+        result = {'done': [], 'failed': [], 'running': [], 'pending': []}
+        for unit in map(str, units):
+            name = _unit_filename(unit)
+            if (self.done_dir / name).exists():
+                result['done'].append(unit)
+            elif (self.failed_dir / name).exists():
+                result['failed'].append(unit)
+            elif (self.lease_dir / f"{name}.lease").exists():
+                result['running'].append(unit)
+            else:
+                result['pending'].append(unit)
+        return result
+
+
+# --- 各ステージからの利用 ---
+
+def add_queue_arguments(parser):
+    """ワークキューで分担実行するためのオプションを追加する"""
+    group = parser.add_argument_group("shared work queue")
+    group.add_argument('--queue', metavar='NAME',
+                       help="共有ディレクトリ上のワークキュー NAME から作業を取得して処理する (複数ホストで同じ NAME を指定する)")
+    group.add_argument('--worker-id', help="ワーカーの識別名 (既定: ホスト名-プロセスID)")
+    group.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                       help="リースの有効期限 (秒)。ワーカーが落ちた場合、この時間が過ぎると他のワーカーが作業を引き継ぐ")
+
+
+def open_queue(args, stage: str):
+    """--queue が指定されていればステージのワークキューを返す。指定がなければ None (単独実行)"""
+    if not getattr(args, 'queue', None):
+        return None
+    queue = WorkQueue(QUEUE_DIR / args.queue / stage, args.worker_id, args.lease_seconds)
+    print(f"Work queue: '{queue.queue_dir}' (worker: {queue.worker_id})")
+    return queue
+
+
+def claim_items(queue, items, key=str):
+    """
+    (項目, リース) を順に返す。queue が None の場合は全ての項目を、何もしないリースとともに返す。
+    キューを使う場合は、key(項目) を作業単位の名前としてリースを取得できた項目だけを返す。
+    """
+    if queue is None:
+        for item in items:
+            yield item, _LocalLease()
+        return
+    lookup = {key(item): item for item in items}
+    for lease in queue.claims(lookup):
+        yield lookup[lease.unit], lease
+
+
+def shared_lock(queue, name: str):
+    """キューを使う場合は共有ファイルの排他ロックを、使わない場合は何もしないコンテキストを返す"""
+    return queue.lock(name) if queue is not None else nullcontext()
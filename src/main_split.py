@@ -0,0 +1,217 @@
+# src/main_split.py
+
+import sys
+import re
+import csv
+import json
+import argparse
+from pathlib import Path
+from collections import OrderedDict
+
+import pandas as pd
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.config import COLUMN_FAMILIES, COLUMN_FAMILY_OTHER, ID_CANDIDATE_COLUMNS
+from src.lib.reader import glob_tables, iter_rows, read_csv
+from src.lib.paths import NORMALIZED_DIR, SPLIT_DIR
+
+# --- 定数定義 ---
+# 分割後の全ファイルに付与する行キー (元ファイルでの0始まりの行番号)
+ROW_KEY_COLUMN = 'row_id'
+MANIFEST_NAME = '_manifest.json'
+
+# 同時に開いておくライターの上限と、ファミリーごとに溜めてから書き出す行数
+DEFAULT_MAX_OPEN_WRITERS = 8
+DEFAULT_FLUSH_ROWS = 1000
+
+COMPILED_FAMILIES = [(name, re.compile(pattern)) for name, pattern in COLUMN_FAMILIES.items()]
+
+
+def classify_column(column_name: str) -> str:
+    """列名がどの列ファミリーに属するかを返す"""
+    for family, regex in COMPILED_FAMILIES:
+        if regex.match(str(column_name)):
+            return family
+    return COLUMN_FAMILY_OTHER
+
+
+def plan_families(header: list) -> OrderedDict:
+    """
+    ヘッダーから、ファミリーごとの列インデックスの対応表を作る。
+    事業番号の列は行キーとして全ファミリーに含める。
+    """
+    key_indices = [i for i, col in enumerate(header) if col in ID_CANDIDATE_COLUMNS]
+    plan = OrderedDict((family, list(key_indices)) for family, _ in COMPILED_FAMILIES)
+    plan[COLUMN_FAMILY_OTHER] = list(key_indices)
+    for i, col in enumerate(header):
+        if i in key_indices:
+            continue
+        plan[classify_column(col)].append(i)
+    # キー列しか持たないファミリーは出力しない
+    return OrderedDict((f, idx) for f, idx in plan.items() if len(idx) > len(key_indices))
+
+
+class BoundedWriterPool:
+    """
+    同時に開くファイル数を max_open 以下に抑えるCSVライターのプール。
+    上限を超えると最も長く使われていないファイルを閉じ、次に必要になったら追記モードで開き直す。
+    """
+
+    def __init__(self, max_open: int):
+        self.max_open = max(1, max_open)
+        self._open = OrderedDict()
+        self._started = set()
+        self.reopen_count = 0
+
+    def writerows(self, path: Path, header: list, rows: list):
+        writer = self._get(path, header)
+        writer.writerows(rows)
+
+    def _get(self, path: Path, header: list):
+        if path in self._open:
+            self._open.move_to_end(path)
+            return self._open[path][1]
+
+        if len(self._open) >= self.max_open:
+            _, (old_file, _) = self._open.popitem(last=False)
+            old_file.close()
+
+        if path in self._started:
+            self.reopen_count += 1
+            f = open(path, 'a', encoding='utf-8-sig', newline='')
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        else:
+            f = open(path, 'w', encoding='utf-8-sig', newline='')
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+            self._started.add(path)
+        self._open[path] = (f, writer)
+        return writer
+
+    def close(self):
+        for f, _ in self._open.values():
+            f.close()
+        self._open.clear()
+
+
+def family_filename(family: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', family) + '.csv'
+
+
+def split_file(input_path: Path, output_dir: Path, max_open_writers: int = DEFAULT_MAX_OPEN_WRITERS,
+               flush_rows: int = DEFAULT_FLUSH_ROWS) -> dict:
+    """
+    1つの超横長シートを、1回のストリーミング読み込みで列ファミリーごとのファイルに縦分割する。
+    各ファミリーの行は flush_rows 行ずつバッファしてからまとめて書き出す。
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = iter_rows(input_path)
+    header = next(rows, None)
+    if not header:
+        return {}
+
+    plan = plan_families(header)
+    paths = {family: output_dir / family_filename(family) for family in plan}
+    headers = {family: [ROW_KEY_COLUMN] + [header[i] for i in idx] for family, idx in plan.items()}
+    buffers = {family: [] for family in plan}
+    width = len(header)
+    pool = BoundedWriterPool(max_open_writers)
+
+    def flush():
+        for family, buffered in buffers.items():
+            if buffered:
+                pool.writerows(paths[family], headers[family], buffered)
+                buffers[family] = []
+
+    row_count = 0
+    try:
+        for row_id, row in enumerate(rows):
+            if len(row) < width:
+                row = row + [''] * (width - len(row))
+            for family, idx in plan.items():
+                buffers[family].append([row_id] + [row[i] for i in idx])
+            row_count += 1
+            if row_count % flush_rows == 0:
+                flush()
+                print(f"  - Split {row_count} rows...", end='\r')
+        flush()
+    finally:
+        pool.close()
+
+    manifest = {
+        'source': input_path.name,
+        'row_key': ROW_KEY_COLUMN,
+        'rows': row_count,
+        'families': {
+            family: {'file': paths[family].name, 'columns': headers[family][1:]}
+            for family in plan
+        },
+    }
+    with open(output_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"  - Split {row_count} rows into {len(plan)} families "
+          f"(writer reopens: {pool.reopen_count}). Done. ")
+    return manifest
+
+
+def read_families(split_dir: Path, families: list, usecols: list = None) -> pd.DataFrame:
+    """
+    分割済みディレクトリから、指定したファミリーだけを読み込んで行キーで結合する。
+    usecols を指定すると、各ファミリーのうちその列だけを読み込む。
+    """
+    with open(split_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    merged = None
+    for family in families:
+        entry = manifest['families'].get(family)
+        if entry is None:
+            continue
+        cols = None
+        if usecols is not None:
+            cols = [ROW_KEY_COLUMN] + [c for c in entry['columns'] if c in usecols]
+        df = read_csv(split_dir / entry['file'], usecols=cols)
+        if merged is None:
+            merged = df
+        else:
+            new_cols = [ROW_KEY_COLUMN] + [c for c in df.columns if c not in merged.columns]
+            merged = merged.merge(df[new_cols], on=ROW_KEY_COLUMN, how='outer')
+    return merged if merged is not None else pd.DataFrame(columns=[ROW_KEY_COLUMN])
+
+
+def main():
+    """
+    normalizedフォルダ内の超横長シートを列ファミリーごとに縦分割し、splitフォルダに出力する。
+    """
+    parser = argparse.ArgumentParser(description="超横長シートを列ファミリーごとに縦分割する")
+    parser.add_argument('--pattern', default='*レビューシート', help="対象ファイルのglobパターン (拡張子なし)")
+    parser.add_argument('--max-open-writers', type=int, default=DEFAULT_MAX_OPEN_WRITERS)
+    parser.add_argument('--flush-rows', type=int, default=DEFAULT_FLUSH_ROWS)
+    args = parser.parse_args()
+
+    print("--- main_split.py: Start ---")
+    SPLIT_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"Output directory: '{SPLIT_DIR}'")
+
+    input_paths = glob_tables(NORMALIZED_DIR, args.pattern)
+    if not input_paths:
+        print(f"\n[Warning] No files matching '{args.pattern}' found in 'data/normalized/' directory.")
+        print("--- main_split.py: Finished ---")
+        return
+
+    for input_path in input_paths:
+        print(f"\nSplitting '{input_path.name}'...")
+        try:
+            split_file(input_path, SPLIT_DIR / input_path.stem, args.max_open_writers, args.flush_rows)
+        except Exception as e:
+            print(f"\n[Error] Failed to split {input_path.name}: {e}")
+
+    print("\n--- main_split.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
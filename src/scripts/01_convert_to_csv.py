@@ -1,24 +1,75 @@
 # src/scripts/01_convert_to_csv.py
 
+import sys
 import csv
+import shutil
+import argparse
+import tempfile
 import zipfile
 import openpyxl
 from pathlib import Path
 
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.business_keys import get_year_from_filename
+from src.lib.ingest import load_state, save_state, is_changed, mark_processed
+from src.lib.pipeline import Pipeline
+from src.lib.sampling import RowSampler, format_sample_spec, is_segment_sheet, order_release_sheets
+from src.lib.paths import DOWNLOAD_DIR, FULL_RAW_DIR, RAW_DIR, SAMPLE_SPEC
+from src.lib.workqueue import add_queue_arguments, open_queue, claim_items, shared_lock
+
 # --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-DOWNLOAD_DIR = PROJECT_ROOT / "data" / "download"
-RAW_DIR = PROJECT_ROOT / "data" / "raw"
+# 変換済みのダウンロードファイルを記録し、新しいリリースだけを変換するための状態ファイル
+CONVERT_STATE_PATH = RAW_DIR / "_convert_state.json"
+
+# --- パイプラインモードの設定 ---
+# 行はこの件数ずつまとめてステージ間で受け渡す (キュー操作の回数を抑えるため)
+PIPELINE_BATCH_ROWS = 500
+# 解析ステージと書き込みステージの間に溜められるバッチ数の上限
+PIPELINE_QUEUE_BATCHES = 16
+# zip内のExcelを展開する一時ファイルのうち、メモリ上に置く上限 (超えた分はディスクに書かれる)
+SPOOL_MEMORY_BYTES = 64 * 1024 * 1024
+INFLATE_CHUNK_BYTES = 1024 * 1024
+
+
+def escape_cell(cell) -> str:
+    """セルの値を文字列にし、改行コードをエスケープされた文字列に置換する"""
+    cell_str = str(cell) if cell is not None else ""
+    return cell_str.replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\r')
+
+def write_sampled_rows(csv_writer, rows, sample_spec, linked_keys=None, file_year=None):
+    """
+    ヘッダー行を書き出したあと、サンプルとして選ばれたデータ行だけを書き出す。
+    rows はエスケープ済みの文字列のリストを返すイテレータとする。使った RowSampler を返す (空のシートでは None)。
+    """
+    header = next(rows, None)
+    if header is None:
+        return None
+    csv_writer.writerow(header)
+    sampler = RowSampler(sample_spec, header, linked_keys, file_year)
+    csv_writer.writerows(sampler.select(rows))
+    if linked_keys is not None and sampler.linked_rows == 0:
+        print(f"    [Warning] No rows were linked to the {len(linked_keys)} sampled businesses. "
+              f"The segment sheet is left empty; check its business number columns and fiscal year ({sampler.file_year}).")
+    return sampler
 
-def convert_excel_to_csv_low_memory(excel_source, file_stem, output_dir):
+def convert_excel_to_csv_low_memory(excel_source, file_stem, output_dir, sample_spec=None):
     """
     Excelファイルを低メモリ消費で読み込み、シートごとにCSVへ変換する。
     セル内の改行は '\\n' にエスケープし、全セルをダブルクォートで囲む。
+    sample_spec を指定した場合はサンプルとして選ばれた行だけを書き出す
+    (セグメントシートは同じブックのレビューシートで選ばれた事業の行に絞る)。
+    成功した場合は True を返す。
     """
     try:
         workbook = openpyxl.load_workbook(excel_source, read_only=True)
-        
-        for sheet_name in workbook.sheetnames:
+        sheet_names = order_release_sheets(workbook.sheetnames) if sample_spec else workbook.sheetnames
+        # 代理キーの年度レイアウトはリリース内で共通にする (ファイル名から判定できなければレビューシートから)
+        release_keys, release_year = None, get_year_from_filename(file_stem)
+
+        for sheet_name in sheet_names:
             worksheet = workbook[sheet_name]
             
             output_filename = f"{file_stem}_{sheet_name}.csv"
@@ -30,28 +81,226 @@ def convert_excel_to_csv_low_memory(excel_source, file_stem, output_dir):
                 # 全てのフィールドをダブルクォーテーションで囲むように設定
                 csv_writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
                 
+                if sample_spec:
+                    rows = ([escape_cell(cell) for cell in row] for row in worksheet.iter_rows(values_only=True))
+                    linked_keys = release_keys if is_segment_sheet(sheet_name) else None
+                    sampler = write_sampled_rows(csv_writer, rows, sample_spec, linked_keys, release_year)
+                    if sampler is not None and linked_keys is None:
+                        release_keys = (release_keys or set()) | sampler.selected_keys
+                        release_year = release_year or sampler.file_year
+                    continue
+
                 for row in worksheet.iter_rows(values_only=True):
-                    escaped_row = []
-                    for cell in row:
-                        cell_str = str(cell) if cell is not None else ""
-                        # 改行コードをエスケープされた文字列に置換
-                        escaped_str = cell_str.replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\r')
-                        escaped_row.append(escaped_str)
-                    
-                    csv_writer.writerow(escaped_row)
+                    csv_writer.writerow([escape_cell(cell) for cell in row])
 
+        return True
     except Exception as e:
         print(f"  [Error] Failed to process {file_stem}: {e}")
+        return False
+
+def _inflate_to_spool(zf, member):
+    """zip内のファイルを一時ファイルへ展開する (openpyxlは読み込み中にシークするため)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    with zf.open(member) as stream:
+        shutil.copyfileobj(stream, spool, INFLATE_CHUNK_BYTES)
+    spool.seek(0)
+    return spool
+
+def convert_pipelined(path, output_dir):
+    """
+    zip/xlsxを3つのステージに分けたパイプラインで変換する。
+      reader: zip内のExcelを順に展開する (次のExcelの展開を、前のExcelの解析と並行して行う)
+      parser: シートのXMLを解析し、行のタプルをバッチにまとめて渡す
+      writer: セルのエスケープとCSVへのバッファ付き書き込みを行う
+    出力は convert_excel_to_csv_low_memory と同一。成功した場合は True を返す。
+    """
+    pipeline = Pipeline()
+    # 展開済みのExcelは1つ先読みするだけに留め、メモリとディスクの使用量を抑える
+    workbooks = pipeline.channel(maxsize=1)
+    batches = pipeline.channel(maxsize=PIPELINE_QUEUE_BATCHES)
+
+    def read_stage(stats):
+        if path.suffix == '.xlsx':
+            workbooks.put((path.stem, path), stats)
+            stats.items += 1
+        else:
+            with zipfile.ZipFile(path, 'r') as zf:
+                for file_in_zip in zf.namelist():
+                    if not file_in_zip.endswith('.xlsx'):
+                        continue
+                    print(f"  - Found Excel file in zip: '{file_in_zip}'")
+                    spool = _inflate_to_spool(zf, file_in_zip)
+                    try:
+                        workbooks.put((Path(file_in_zip).stem, spool), stats)
+                    except BaseException:
+                        # 渡せなかった一時ファイルは自分で閉じる
+                        spool.close()
+                        raise
+                    stats.items += 1
+        workbooks.close(stats)
+
+    def parse_stage(stats):
+        for file_stem, source in workbooks.iter(stats):
+            try:
+                workbook = openpyxl.load_workbook(source, read_only=True)
+                try:
+                    for sheet_name in workbook.sheetnames:
+                        batches.put(('sheet', f"{file_stem}_{sheet_name}.csv"), stats)
+                        batch = []
+                        for row in workbook[sheet_name].iter_rows(values_only=True):
+                            batch.append(row)
+                            if len(batch) >= PIPELINE_BATCH_ROWS:
+                                batches.put(('rows', batch), stats)
+                                stats.items += len(batch)
+                                batch = []
+                        if batch:
+                            batches.put(('rows', batch), stats)
+                            stats.items += len(batch)
+                finally:
+                    workbook.close()
+            finally:
+                if hasattr(source, 'close'):
+                    source.close()
+        batches.close(stats)
+
+    def write_stage(stats):
+        csv_file = None
+        try:
+            for kind, payload in batches.iter(stats):
+                if kind == 'sheet':
+                    if csv_file is not None:
+                        csv_file.close()
+                    output_path = output_dir / payload
+                    print(f"  - Saving sheet -> '{output_path.name}'")
+                    csv_file = open(output_path, 'w', newline='', encoding='utf-8-sig')
+                    csv_writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+                else:
+                    csv_writer.writerows([escape_cell(cell) for cell in row] for row in payload)
+                    stats.items += len(payload)
+        finally:
+            if csv_file is not None:
+                csv_file.close()
+
+    pipeline.add_stage('reader', read_stage)
+    pipeline.add_stage('parser', parse_stage)
+    pipeline.add_stage('writer', write_stage)
+    try:
+        pipeline.run()
+        return True
+    except Exception as e:
+        print(f"  [Error] Failed to process {path.name}: {e}")
+        return False
+    finally:
+        # 中断した場合は、解析されないままキューに残った展開済みのExcelを閉じる
+        for _, source in workbooks.drain():
+            if hasattr(source, 'close'):
+                source.close()
+        pipeline.print_summary()
+
+def release_name(csv_path: Path) -> str:
+    """'database2014_レビューシート.csv' -> 'database2014' (シート名を除いたリリースの名前)"""
+    return csv_path.stem.rsplit('_', 1)[0]
+
+def sample_raw_release(csv_paths, output_dir, sample_spec):
+    """
+    変換済みの本番の生CSVから、1リリース分のシートのサンプルを切り出す (Excelを読み直さずに済む)。
+    成功した場合は True を返す。
+    """
+    release_keys, release_year = None, get_year_from_filename(release_name(csv_paths[0]))
+    try:
+        for csv_path in order_release_sheets(csv_paths):
+            output_path = output_dir / csv_path.name
+            print(f"  - Sampling sheet -> '{output_path.name}'")
+            with open(csv_path, 'r', newline='', encoding='utf-8-sig') as infile, \
+                    open(output_path, 'w', newline='', encoding='utf-8-sig') as outfile:
+                csv_writer = csv.writer(outfile, quoting=csv.QUOTE_ALL)
+                linked_keys = release_keys if is_segment_sheet(csv_path.name) else None
+                sampler = write_sampled_rows(csv_writer, csv.reader(infile), sample_spec, linked_keys, release_year)
+                if sampler is not None and linked_keys is None:
+                    release_keys = (release_keys or set()) | sampler.selected_keys
+                    release_year = release_year or sampler.file_year
+        return True
+    except Exception as e:
+        print(f"  [Error] Failed to sample {csv_paths[0].name}: {e}")
+        return False
+
+def main_sample(force: bool):
+    """
+    サンプルモード: 本番の生CSV (なければダウンロードファイル) から行を選び、サンプル用の出力ルートに書き出す。
+    サンプルの指定が前回と変わった場合は全て作り直す。
+    """
+    spec_text = format_sample_spec(SAMPLE_SPEC)
+    print(f"[Sample mode] {spec_text} -> '{RAW_DIR}'")
+
+    state = load_state(CONVERT_STATE_PATH)
+    if state.get('sample') != spec_text:
+        force = True
+        state = {'files': {}, 'sample': spec_text}
+
+    raw_paths = sorted(FULL_RAW_DIR.glob('*.csv'))
+    if raw_paths:
+        releases = {}
+        for path in raw_paths:
+            releases.setdefault(release_name(path), []).append(path)
+        print(f"\nFound {len(releases)} converted releases in '{FULL_RAW_DIR}'.")
+        for name, paths in releases.items():
+            # セグメントシートの絞り込みにレビューシートの結果を使うため、リリース単位で作り直す
+            if not force and not any(is_changed(path, state) for path in paths):
+                print(f"\nSkipping '{name}' (already sampled).")
+                continue
+            print(f"\nProcessing '{name}'...")
+            if sample_raw_release(paths, RAW_DIR, SAMPLE_SPEC):
+                for path in paths:
+                    mark_processed(path, state)
+                save_state(state, CONVERT_STATE_PATH)
+        return
+
+    source_paths = sorted(DOWNLOAD_DIR.glob('*.zip')) + sorted(DOWNLOAD_DIR.glob('*.xlsx'))
+    if not source_paths:
+        print("\n[Warning] Neither converted CSVs nor downloaded files were found.")
+        return
+    print(f"\nFound {len(source_paths)} files to sample.")
+    for path in source_paths:
+        if not force and not is_changed(path, state):
+            print(f"\nSkipping '{path.name}' (already sampled).")
+            continue
+        print(f"\nProcessing '{path.name}'...")
+        succeeded = True
+        if path.suffix == '.zip':
+            with zipfile.ZipFile(path, 'r') as zf:
+                for file_in_zip in zf.namelist():
+                    if file_in_zip.endswith('.xlsx'):
+                        with zf.open(file_in_zip) as excel_stream:
+                            succeeded &= convert_excel_to_csv_low_memory(
+                                excel_stream, Path(file_in_zip).stem, RAW_DIR, SAMPLE_SPEC)
+        else:
+            succeeded = convert_excel_to_csv_low_memory(path, path.stem, RAW_DIR, SAMPLE_SPEC)
+        if succeeded:
+            mark_processed(path, state)
+            save_state(state, CONVERT_STATE_PATH)
 
 def main():
     """
     downloadフォルダ内のzipとxlsxを処理し、rawフォルダにCSVを出力するメイン関数
     """
+    parser = argparse.ArgumentParser(description="ダウンロードしたzip/xlsxをシートごとのCSVに変換する")
+    parser.add_argument('--force', action='store_true', help="変換済みのファイルも含めて全て再変換する")
+    parser.add_argument('--pipelined', action='store_true',
+                        help="展開・解析・書き込みを別スレッドで並行して行い、ステージごとの待ち時間を表示する")
+    add_queue_arguments(parser)
+    args = parser.parse_args()
+
     print("--- 01_convert_to_csv.py (Force Quoting & Escape Newlines): Start ---")
 
-    RAW_DIR.mkdir(exist_ok=True)
+    RAW_DIR.mkdir(parents=True, exist_ok=True)
     print(f"Output directory: '{RAW_DIR}'")
 
+    if SAMPLE_SPEC:
+        # サンプルは少量のため、パイプラインモードやワークキューは使わずに順に切り出す
+        main_sample(args.force)
+        print("\n--- 01_convert_to_csv.py: Finished ---")
+        return
+
     source_paths = list(DOWNLOAD_DIR.glob('*.zip')) + list(DOWNLOAD_DIR.glob('*.xlsx'))
     
     if not source_paths:
@@ -61,24 +310,51 @@ def main():
         return
 
     print(f"\nFound {len(source_paths)} files to process.")
+    state = load_state(CONVERT_STATE_PATH)
+    queue = open_queue(args, '01_convert_to_csv')
 
-    for path in source_paths:
+    for path, lease in claim_items(queue, sorted(source_paths), key=lambda p: p.name):
+        # 前回から変わっていないダウンロードファイルは変換済みとしてスキップする
+        if not args.force and not is_changed(path, state):
+            print(f"\nSkipping '{path.name}' (already converted).")
+            lease.complete()
+            continue
         print(f"\nProcessing '{path.name}'...")
-        
-        if path.suffix == '.zip':
+        succeeded = False
+
+        if args.pipelined:
+            succeeded = convert_pipelined(path, RAW_DIR)
+
+        elif path.suffix == '.zip':
             try:
                 with zipfile.ZipFile(path, 'r') as zf:
+                    succeeded = True
                     for file_in_zip in zf.namelist():
                         if file_in_zip.endswith('.xlsx'):
                             file_stem = Path(file_in_zip).stem
                             print(f"  - Found Excel file in zip: '{file_in_zip}'")
                             with zf.open(file_in_zip) as excel_stream:
-                                convert_excel_to_csv_low_memory(excel_stream, file_stem, RAW_DIR)
+                                succeeded &= convert_excel_to_csv_low_memory(excel_stream, file_stem, RAW_DIR)
             except Exception as e:
                 print(f"  [Error] Failed to process zip file {path.name}: {e}")
+                succeeded = False
 
         elif path.suffix == '.xlsx':
-            convert_excel_to_csv_low_memory(path, path.stem, RAW_DIR)
+            succeeded = convert_excel_to_csv_low_memory(path, path.stem, RAW_DIR)
+
+        if not lease.held():
+            # リースを回収したワーカーが変換し直すため、状態ファイルには記録しない
+            continue
+        if succeeded:
+            # 他のワーカーの記録を消さないよう、ロックを取って最新の状態に追記する
+            with shared_lock(queue, 'convert_state'):
+                if queue is not None:
+                    state = load_state(CONVERT_STATE_PATH)
+                mark_processed(path, state)
+                save_state(state, CONVERT_STATE_PATH)
+            lease.complete()
+        else:
+            lease.fail(f"conversion of '{path.name}' failed")
 
     print("\n--- 01_convert_to_csv.py: Finished ---")
 
@@ -2,59 +2,242 @@
 
 import sys
 import csv
+import argparse
+import itertools
+import os
 from pathlib import Path
 
+import pandas as pd
+
 # このスクリプトの親のさらに親をPythonのモジュール検索パスに追加
 # これにより `python -m` なしでも `src` を見つけられる
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
-from src.lib.normalization import normalize_text
+from src.lib.normalization import normalize_text, RuleStats
+from src.lib import rowblock, sparse
+from src.lib.quality import QualityReport, StreamingQualityChecker, write_quality_report
+from src.lib.ingest import is_up_to_date
+from src.lib.checkpoint import (
+    checkpoint_path_for, load_checkpoint, save_checkpoint, clear_checkpoint,
+    work_path_for, work_keys_path, adopt_work_file, remove_work_files,
+)
+from src.lib.workqueue import add_queue_arguments, open_queue, claim_items, shared_lock, LeaseLost
+from src.lib.reader import read_csv, read_columns
+from src.lib.paths import RAW_DIR, NORMALIZED_DIR, ANALYSIS_DIR, QUALITY_DIR
 
 # --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-RAW_DIR = PROJECT_ROOT / "data" / "raw"
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
+QUALITY_REPORT_PATH = QUALITY_DIR / "02_normalize_data.csv"
+# --rule-stats を指定した場合に、ファイル・列・正規化ルールごとの適用回数と処理時間を出力する
+RULE_STATS_PATH = ANALYSIS_DIR / "02_normalization_rules.csv"
+RULE_STATS_COLUMNS = ['filename', 'column_position', 'column', 'rule', 'cells', 'hits', 'seconds']
+
+# 出力形式: 'csv' (従来どおり全セルをクォートしたCSV)、
+# 'rowblock' (固定行数ブロックごとに圧縮し、ブロック索引を付けた形式)、または
+# 'sparse' (ブロック内の列ごとに値のあるセルだけを格納する疎な列形式。空の列が大半を占める横長シート向け)
+OUTPUT_FORMATS = ('csv', 'rowblock', 'sparse')
+# ブロック形式の既定の1ブロックあたりの行数
+DEFAULT_BLOCK_ROWS = {'rowblock': rowblock.DEFAULT_BLOCK_ROWS, 'sparse': sparse.DEFAULT_BLOCK_ROWS}
+
+def output_path_for(input_path: Path, output_format: str) -> Path:
+    """出力形式に応じた正規化済みファイルのパスを返す"""
+    if output_format == 'rowblock':
+        return NORMALIZED_DIR / (input_path.stem + rowblock.ROWBLOCK_SUFFIX)
+    if output_format == 'sparse':
+        return NORMALIZED_DIR / (input_path.stem + sparse.SPARSE_SUFFIX)
+    return NORMALIZED_DIR / input_path.name
+
+# この行数ごとにチェックポイントを保存する (中断した場合は最後のチェックポイントから再開する)
+DEFAULT_CHECKPOINT_ROWS = 20000
+# ワークキューで処理する場合、この行数ごとにリースを保持しているか確認する
+LEASE_CHECK_ROWS = 1000
+# キューを使わない単独実行での作業ファイルの名前
+LOCAL_WORKER = 'local'
+
+def open_writer(output_path: Path, output_format: str, block_rows: int, compression: str, resume_state: dict = None):
+    """
+    出力形式に応じたライターを返す。(ライター, 後始末の対象) のタプルを返す。
+    resume_state を渡した場合は、チェックポイントの時点まで部分出力を切り詰めて続きから書き込む。
+    """
+    if output_format == 'rowblock':
+        writer = rowblock.RowBlockWriter(output_path, block_rows=block_rows, compression=compression,
+                                         resume_state=resume_state)
+        return writer, writer
+    if output_format == 'sparse':
+        writer = sparse.SparseColumnWriter(output_path, block_rows=block_rows, resume_state=resume_state)
+        return writer, writer
+    if resume_state is None:
+        outfile = open(output_path, 'w', encoding='utf-8-sig', newline='')
+    else:
+        with open(output_path, 'r+b') as f:
+            f.truncate(resume_state['bytes'])
+        # 追記モードではBOMは書かれない
+        outfile = open(output_path, 'a', encoding='utf-8-sig', newline='')
+    # 全てのフィールドをダブルクォーテーションで囲むように設定
+    return csv.writer(outfile, quoting=csv.QUOTE_ALL), outfile
+
+def output_files(path: Path, output_format: str) -> list:
+    """出力形式に応じた、出力を構成するファイル (ブロック形式では索引を先に置き換える)"""
+    if output_format == 'rowblock':
+        return [rowblock.index_path_for(path), path]
+    if output_format == 'sparse':
+        return [sparse.index_path_for(path), path]
+    return [path]
+
+def publish_output(work_path: Path, output_path: Path, output_format: str):
+    """完成した作業ファイルを出力の名前に置き換える"""
+    for source, target in zip(output_files(work_path, output_format), output_files(output_path, output_format)):
+        os.replace(source, target)
 
-def process_csv_file(input_path: Path, output_path: Path):
+def writer_checkpoint_state(writer, closer, output_format: str) -> dict:
+    """部分出力をディスクに書き出し、再開に必要な状態を返す"""
+    if output_format in ('rowblock', 'sparse'):
+        return writer.checkpoint_state()
+    closer.flush()
+    return {'bytes': closer.buffer.tell()}
+
+def process_csv_file(input_path: Path, output_path: Path, output_format: str = 'csv',
+                     block_rows: int = rowblock.DEFAULT_BLOCK_ROWS,
+                     compression: str = rowblock.DEFAULT_COMPRESSION,
+                     checkpoint_rows: int = DEFAULT_CHECKPOINT_ROWS,
+                     rule_stats: RuleStats = None, lease=None, worker: str = LOCAL_WORKER):
     """
     単一のCSVファイルを読み込み、全セルを正規化して別ファイルに保存する。
-    出力時は全セルをダブルクォーテーションで囲む。
+    CSV出力時は全セルをダブルクォーテーションで囲む。
+    行ブロック形式では block_rows 行ごとに独立して圧縮し、ブロック索引を併せて出力する。
+    疎な列形式では block_rows 行ごとに、列ごとの値のあるセルだけを索引とともに出力する。
+    正規化と同じ読み込みの中で品質チェックを行い、QualityReport を返す。
+    checkpoint_rows 行ごとに処理済み行数・部分出力の大きさ・品質チェックの途中経過をチェックポイントに保存し、
+    前回の実行が中断していた場合はそこから再開する。出力は中断しなかった場合と同一になる。
+    rule_stats を渡した場合は、データ行の正規化ルールごとの適用回数と処理時間を列ごとに集計する (途中経過もチェックポイントに含める)。
+    失敗した場合は例外を送出する (チェックポイントは残り、次回の実行で再開される)。
+    部分出力は worker ごとの作業ファイルに書き、完了してから出力の名前に置き換える。
+    lease を渡した場合は、LEASE_CHECK_ROWS 行ごと・チェックポイントを保存する前・出力を置き換える前に
+    リースを保持しているか確認し、他のワーカーに回収されていれば LeaseLost を送出する
+    (作業ファイルは自分専用のため、回収したワーカーの出力には触れない。回収したワーカーがチェックポイントから再開する)。
     """
-    try:
-        with open(input_path, 'r', encoding='utf-8-sig') as infile, \
-             open(output_path, 'w', encoding='utf-8-sig', newline='') as outfile:
-            
-            reader = csv.reader(infile)
-            # 全てのフィールドをダブルクォーテーションで囲むように設定
-            writer = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-            
-            header = next(reader, None)
-            if header:
-                normalized_header = [normalize_text(cell) for cell in header]
+    report = QualityReport(input_path.name, '02_normalize_data')
+    settings = {'output_format': output_format, 'block_rows': block_rows, 'compression': compression}
+    checkpoint_path = checkpoint_path_for(output_path)
+    work_path = work_path_for(output_path, worker)
+    checkpoint = load_checkpoint(checkpoint_path, input_path, settings)
+    resume_path = output_path.with_name(checkpoint['work_file']) if checkpoint and checkpoint.get('work_file') else None
+    if not (checkpoint and checkpoint.get('output') and resume_path.exists()):
+        checkpoint = None
+        # 書き込みを始める前に記録し、途中で落ちた出力が完成済みとみなされないようにする
+        save_checkpoint(checkpoint_path, input_path, settings, work_file=work_path.name,
+                        rows=0, output=None, quality=None, rule_stats=None)
+    elif resume_path != work_path:
+        # 他のワーカーが中断した部分出力を、チェックポイントの位置まで自分の作業ファイルに写して続ける
+        adopt_work_file(resume_path, work_path, checkpoint['output']['bytes'])
+    if output_format in ('rowblock', 'sparse'):
+        # ブロックの区切りを変えないよう、チェックポイントはブロック境界でのみ取る
+        checkpoint_rows = -(-checkpoint_rows // block_rows) * block_rows
+
+    writer, closer = open_writer(work_path, output_format, block_rows, compression,
+                                 resume_state=checkpoint['output'] if checkpoint else None)
+    with open(input_path, 'r', encoding='utf-8-sig') as infile, closer:
+        
+        reader = csv.reader(infile)
+        
+        header = next(reader, None)
+        normalized_header = []
+        if header:
+            normalized_header = [normalize_text(cell) for cell in header]
+            if checkpoint is None:
                 writer.writerow(normalized_header)
-            
-            processed_rows = 0
-            for row in reader:
+        checker = StreamingQualityChecker(report, normalized_header, unique_keys='セグメント' not in input_path.name,
+                                          keys_path=work_keys_path(work_path))
+        
+        processed_rows = 0
+        if checkpoint:
+            # 処理済みの行は正規化せずに読み飛ばす
+            processed_rows = checkpoint['rows']
+            checker.restore(checkpoint['quality'])
+            if rule_stats is not None:
+                if checkpoint.get('rule_stats') is not None:
+                    rule_stats.restore(checkpoint['rule_stats'])
+                else:
+                    print("  - [Warning] The checkpoint has no rule statistics. They will cover only the remaining rows.")
+            next(itertools.islice(reader, processed_rows, processed_rows), None)
+            print(f"  - Resuming from checkpoint at row {processed_rows}...")
+
+        for row in reader:
+            if rule_stats is None:
                 normalized_row = [normalize_text(cell) for cell in row]
-                writer.writerow(normalized_row)
-                
-                processed_rows += 1
-                if processed_rows % 500 == 0:
-                    print(f"  - Processed {processed_rows} rows...", end='\r')
+            else:
+                normalized_row = [rule_stats.normalize(cell, i) for i, cell in enumerate(row)]
+            writer.writerow(normalized_row)
+            checker.add_row(normalized_row)
             
-            print(f"  - Processed {processed_rows} total rows. Done. ")
+            processed_rows += 1
+            if processed_rows % 500 == 0:
+                print(f"  - Processed {processed_rows} rows...", end='\r')
+            if lease is not None and processed_rows % LEASE_CHECK_ROWS == 0:
+                lease.ensure_held()
+            if processed_rows % checkpoint_rows == 0:
+                if lease is not None:
+                    lease.ensure_held()
+                save_checkpoint(checkpoint_path, input_path, settings, work_file=work_path.name, rows=processed_rows,
+                                output=writer_checkpoint_state(writer, closer, output_format),
+                                quality=checker.checkpoint_state(),
+                                rule_stats=rule_stats.checkpoint_state() if rule_stats is not None else None)
+        
+        checker.finish()
+    if lease is not None:
+        lease.ensure_held()
+    publish_output(work_path, output_path, output_format)
+    clear_checkpoint(checkpoint_path)
+    remove_work_files(output_path)
+    print(f"  - Processed {processed_rows} total rows. Done. ")
+    report.print_summary()
+    if rule_stats is not None:
+        print_rule_stats(rule_stats)
+
+    return report
+
+def print_rule_stats(rule_stats: RuleStats):
+    """ルールごとのヒット数と処理時間を、全ての列について合計して表示する"""
+    print("  - Normalization rules (hits / seconds):")
+    for rule, hits, seconds in rule_stats.rule_totals():
+        print(f"    - {rule}: {hits} / {seconds:.3f}s")
 
-    except Exception as e:
-        print(f"\n[Error] Failed to process {input_path.name}: {e}")
+def write_rule_stats(records: list, filename: str):
+    """ルールの集計を書き出す。既存の集計は残し、そのファイルの行だけを置き換える"""
+    RULE_STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    stats_df = pd.DataFrame([{'filename': filename, **record} for record in records], columns=RULE_STATS_COLUMNS)
+    if RULE_STATS_PATH.exists():
+        existing = read_csv(RULE_STATS_PATH)
+        stats_df = pd.concat([existing[existing['filename'] != filename], stats_df], ignore_index=True)
+    stats_df.to_csv(RULE_STATS_PATH, index=False, encoding='utf-8-sig')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="rawフォルダ内のCSVを正規化する")
+    parser.add_argument('--format', dest='output_format', choices=OUTPUT_FORMATS, default='csv',
+                        help="出力形式 (default: csv)")
+    parser.add_argument('--block-rows', type=int,
+                        help="rowblock/sparse形式の1ブロックあたりの行数 "
+                             f"(default: rowblock {rowblock.DEFAULT_BLOCK_ROWS}, sparse {sparse.DEFAULT_BLOCK_ROWS})")
+    parser.add_argument('--compression', choices=list(rowblock.COMPRESSORS), default=rowblock.DEFAULT_COMPRESSION,
+                        help="rowblock形式の圧縮方式")
+    parser.add_argument('--force', action='store_true',
+                        help="出力が入力より新しいファイルも含めて全て再処理する (チェックポイントも破棄する)")
+    parser.add_argument('--checkpoint-rows', type=int, default=DEFAULT_CHECKPOINT_ROWS,
+                        help="チェックポイントを保存する間隔 (行数)")
+    parser.add_argument('--rule-stats', action='store_true',
+                        help=f"正規化ルールごとの適用回数と処理時間をファイル・列ごとに集計し、'{RULE_STATS_PATH.name}' に出力する")
+    add_queue_arguments(parser)
+    return parser.parse_args()
 
 def main():
     """
     rawフォルダ内の全CSVを正規化し、normalizedフォルダに出力するメイン関数。
     """
-    print("--- 02_normalize_data.py (Force Quoting): Start ---")
+    args = parse_args()
+    block_rows = args.block_rows or DEFAULT_BLOCK_ROWS.get(args.output_format, rowblock.DEFAULT_BLOCK_ROWS)
+    print(f"--- 02_normalize_data.py (Format: {args.output_format}): Start ---")
 
-    NORMALIZED_DIR.mkdir(exist_ok=True)
+    NORMALIZED_DIR.mkdir(parents=True, exist_ok=True)
     print(f"Output directory: '{NORMALIZED_DIR}'")
 
     csv_files = list(RAW_DIR.glob('*.csv'))
@@ -67,10 +250,54 @@ def main():
         
     print(f"\nFound {len(csv_files)} CSV files to normalize.")
 
-    for input_path in csv_files:
+    processed_files = []
+    failed_files = []
+    queue = open_queue(args, '02_normalize_data')
+    # ワーカーが落ちた場合、リースを引き継いだワーカーはチェックポイントから再開する
+    for input_path, lease in claim_items(queue, sorted(csv_files), key=lambda p: p.name):
+        output_path = output_path_for(input_path, args.output_format)
+        checkpoint_path = checkpoint_path_for(output_path)
+        if args.force:
+            clear_checkpoint(checkpoint_path)
+            remove_work_files(output_path)
+        # 新しいリリースの分だけを処理するため、正規化済みの出力が新しいファイルはスキップする
+        # (チェックポイントが残っている出力は中断されたものなので、続きから処理する)
+        elif is_up_to_date(input_path, output_path) and not checkpoint_path.exists():
+            print(f"\nSkipping '{input_path.name}' (already normalized).")
+            lease.complete()
+            continue
         print(f"\nProcessing '{input_path.name}'...")
-        output_path = NORMALIZED_DIR / input_path.name
-        process_csv_file(input_path, output_path)
+        rule_stats = RuleStats() if args.rule_stats else None
+        try:
+            report = process_csv_file(input_path, output_path, args.output_format, block_rows,
+                                      args.compression, args.checkpoint_rows, rule_stats, lease,
+                                      worker=queue.worker_id if queue is not None else LOCAL_WORKER)
+        except LeaseLost as e:
+            print(f"\n  - [Queue] Stopped processing '{input_path.name}': {e}.")
+            continue
+        except Exception as e:
+            print(f"\n[Error] Failed to process {input_path.name}: {e}")
+            print(f"  - Progress is kept in '{checkpoint_path.name}'. Re-run to resume.")
+            failed_files.append(input_path.name)
+            lease.fail(e)
+            continue
+        # 品質レポートはファイルごとに書き出し、そのファイルの行だけを置き換える
+        # (ワーカーが途中で落ちても、処理を終えたファイルの結果は失われない)
+        with shared_lock(queue, 'quality_report'):
+            write_quality_report(report.to_records(), QUALITY_REPORT_PATH, replace_files=[input_path.name])
+        if rule_stats is not None:
+            with shared_lock(queue, 'rule_stats'):
+                write_rule_stats(rule_stats.to_records(read_columns(output_path)), input_path.name)
+        processed_files.append(input_path.name)
+        lease.complete()
+
+    if processed_files:
+        print(f"\nQuality report saved to '{QUALITY_REPORT_PATH}'")
+
+    if failed_files:
+        print(f"\n[Error] {len(failed_files)} files failed: {', '.join(failed_files)}")
+        print("--- 02_normalize_data.py: Finished with errors ---")
+        sys.exit(1)
 
     print("\n--- 02_normalize_data.py: Finished ---")
 
@@ -1,5 +1,8 @@
 import sys
 import re
+import shutil
+import argparse
+import itertools
 import pandas as pd
 from pathlib import Path
 from collections import Counter
@@ -8,127 +11,167 @@ from collections import Counter
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
-# --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
-ANALYSIS_DIR = PROJECT_ROOT / "analysis"
+from src.lib.reader import glob_tables, read_table, read_columns, table_format
+from src.lib.memory import add_memory_arguments, resolve_memory_budget, plan_load, format_size
+from src.lib.checkpoint import load_checkpoint, save_checkpoint
+from src.lib.workqueue import add_queue_arguments, open_queue, claim_items
+from src.lib.amounts import AMOUNT_SCALE, parse_amounts, is_amount_column
+from src.lib.paths import NORMALIZED_DIR, ANALYSIS_DIR
 
+# --- 定数定義 ---
 # 列名分割用の正規表現
 DELIMITER_REGEX = re.compile(r'[_\.｜\s\n/-]+')
 
-# メモリを節約するため、一度に読み込む行数
-CHUNKSIZE = 10000
+# このチャンク数ごとに、途中まで蓄積した列の統計をチェックポイントに保存する
+CHECKPOINT_CHUNKS = 5
+# ファイルごとのチェックポイント (分析済みファイルの結果も含む)。全ての出力を書き終えたら削除する
+CHECKPOINT_DIR = ANALYSIS_DIR / "_checkpoints"
+
+def new_metrics() -> dict:
+    return {
+        'total_count': 0, 'null_count': 0, 'numeric_count': 0, 'integer_count': 0,
+        'max_len': 0, 'max_val': -float('inf'), 'min_val': float('inf'), 'amount_failure_count': 0
+    }
+
+def checkpoint_settings() -> dict:
+    # チャンクの行数はメモリ予算から決まるため設定には含めず、途中経過とともに記録する
+    return {'amount_scale': AMOUNT_SCALE}
+
+def analysis_checkpoint_path(filepath: Path) -> Path:
+    return CHECKPOINT_DIR / f"{filepath.name}.json"
 
-def analyze_csv_content(filepath: Path) -> list:
+def load_analyzed_results(filepath: Path):
+    """チェックポイントに残っている分析済みの結果を返す (分析が終わっていない場合は None)"""
+    checkpoint = load_checkpoint(analysis_checkpoint_path(filepath), filepath, checkpoint_settings())
+    return checkpoint.get('results') if checkpoint else None
+
+def iter_chunks(filepath: Path, chunksize: int, start_chunk: int):
     """
-    CSVファイルをチャンクごとに読み込み、各列の詳細な統計情報を分析する。
+    start_chunk 番目以降のチャンクを返す。CSVでは読み飛ばす行を解析しない。
+    chunksize が None の場合はファイル全体を1つのチャンクとして返す。
     """
-    try:
-        # まずヘッダーだけを読み込む
-        header = pd.read_csv(filepath, nrows=0, encoding='utf-8-sig').columns.tolist()
-        if not header:
-            return []
+    if chunksize is None:
+        return iter([read_table(filepath)])
+    if start_chunk and table_format(filepath) == 'csv':
+        return read_table(filepath, chunksize=chunksize,
+                          skiprows=range(1, start_chunk * chunksize + 1))
+    return itertools.islice(read_table(filepath, chunksize=chunksize), start_chunk, None)
+
+def update_metrics(col_metrics: dict, chunk: pd.DataFrame, amount_cols: set):
+    """1チャンク分の統計を各列の集計値に加算する"""
+    for col, metrics in col_metrics.items():
+        # 基本統計
+        metrics['total_count'] += len(chunk)
+        metrics['null_count'] += int(chunk[col].isnull().sum())
         
-        # 各列の統計情報を保持する辞書を初期化
-        col_metrics = {col: {
-            'total_count': 0, 'null_count': 0, 'numeric_count': 0, 'integer_count': 0,
-            'max_len': 0, 'max_val': -float('inf'), 'min_val': float('inf')
-        } for col in header}
-
-        # チャンクごとにファイルを読み込んで処理
-        for chunk in pd.read_csv(filepath, chunksize=CHUNKSIZE, low_memory=True, encoding='utf-8-sig'):
-            for col in header:
-                metrics = col_metrics[col]
-                
-                # 基本統計
-                metrics['total_count'] += len(chunk)
-                metrics['null_count'] += chunk[col].isnull().sum()
-                
-                # 文字列長
-                max_len_chunk = chunk[col].astype(str).str.len().max()
-                if max_len_chunk > metrics['max_len']:
-                    metrics['max_len'] = max_len_chunk
-                    
-                # 数値関連の統計
-                numeric_series = pd.to_numeric(chunk[col], errors='coerce')
-                metrics['numeric_count'] += numeric_series.notna().sum()
-                
-                # 整数判定（浮動小数点数でない数値）
-                integer_series = numeric_series[numeric_series.notna() & (numeric_series == numeric_series.round(0))]
-                metrics['integer_count'] += len(integer_series)
-
-                # 最大値・最小値
-                if not numeric_series.isnull().all():
-                    max_val_chunk = numeric_series.max()
-                    min_val_chunk = numeric_series.min()
-                    if max_val_chunk > metrics['max_val']: metrics['max_val'] = max_val_chunk
-                    if min_val_chunk < metrics['min_val']: metrics['min_val'] = min_val_chunk
-
-        # 最終的な分析結果をリストにまとめる
-        final_results = []
-        for col, metrics in col_metrics.items():
-            total_count = metrics['total_count']
-            
-            # データ型を推論
-            col_type = 'string'
-            non_null_count = total_count - metrics['null_count']
-            if non_null_count == 0:
-                col_type = 'empty'
-            elif metrics['numeric_count'] == non_null_count:
-                if metrics['integer_count'] == non_null_count:
-                    col_type = 'integer'
-                else:
-                    col_type = 'float'
+        # 文字列長
+        max_len_chunk = chunk[col].astype(str).str.len().max()
+        if max_len_chunk > metrics['max_len']:
+            metrics['max_len'] = int(max_len_chunk)
             
-            final_results.append({
-                'filename': filepath.name,
-                'column_name': col,
-                'column_type': col_type,
-                'null_rate': metrics['null_count'] / total_count if total_count > 0 else 0,
-                'only_num_rate': metrics['numeric_count'] / total_count if total_count > 0 else 0,
-                'max_len': metrics['max_len'],
-                'max_val': metrics['max_val'] if metrics['max_val'] != -float('inf') else None,
-                'min_val': metrics['min_val'] if metrics['min_val'] != float('inf') else None,
-            })
+        # 数値関連の統計
+        if col in amount_cols:
+            # 「-」「―」などの未記入記号は金額の列として矛盾しない値とみなす
+            scaled, failed = parse_amounts(chunk[col])
+            compatible = chunk[col].notna() & ~failed
+            metrics['amount_failure_count'] += int(failed.sum())
+            metrics['numeric_count'] += int(compatible.sum())
+            metrics['integer_count'] += int((compatible & (scaled.isna() | (scaled % AMOUNT_SCALE == 0))).sum())
+            numeric_series = scaled.dropna() / AMOUNT_SCALE
+        else:
+            numeric_series = pd.to_numeric(chunk[col], errors='coerce')
+            metrics['numeric_count'] += int(numeric_series.notna().sum())
+
+            # 整数判定（浮動小数点数でない数値）
+            integer_series = numeric_series[numeric_series.notna() & (numeric_series == numeric_series.round(0))]
+            metrics['integer_count'] += len(integer_series)
+
+        # 最大値・最小値
+        if not numeric_series.isnull().all():
+            max_val_chunk = float(numeric_series.max())
+            min_val_chunk = float(numeric_series.min())
+            if max_val_chunk > metrics['max_val']: metrics['max_val'] = max_val_chunk
+            if min_val_chunk < metrics['min_val']: metrics['min_val'] = min_val_chunk
+
+def summarize_metrics(filepath: Path, col_metrics: dict, amount_cols: set) -> list:
+    """蓄積した統計からデータ型を推論し、列ごとの分析結果のリストにまとめる"""
+    final_results = []
+    for col, metrics in col_metrics.items():
+        total_count = metrics['total_count']
         
-        return final_results
-    except Exception as e:
-        print(f"\n[Error] Failed to analyze {filepath.name}: {e}")
-        return []
+        # データ型を推論
+        col_type = 'string'
+        non_null_count = total_count - metrics['null_count']
+        if non_null_count == 0:
+            col_type = 'empty'
+        elif metrics['numeric_count'] == non_null_count:
+            if metrics['integer_count'] == non_null_count:
+                col_type = 'integer'
+            else:
+                col_type = 'float'
+        
+        final_results.append({
+            'filename': filepath.name,
+            'column_name': col,
+            'column_type': col_type,
+            'null_rate': metrics['null_count'] / total_count if total_count > 0 else 0,
+            'only_num_rate': metrics['numeric_count'] / total_count if total_count > 0 else 0,
+            'max_len': metrics['max_len'],
+            'max_val': metrics['max_val'] if metrics['max_val'] != -float('inf') else None,
+            'min_val': metrics['min_val'] if metrics['min_val'] != float('inf') else None,
+            'amount_failure_count': metrics['amount_failure_count'] if col in amount_cols else None,
+        })
+    return final_results
 
-def main():
+def analyze_csv_content(filepath: Path, checkpoint_path: Path = None, budget: int = None) -> list:
     """
-    normalizedフォルダ内の全CSVを分析し、3つの分析ファイルを出力する。
+    CSVファイルを読み込み、各列の詳細な統計情報を分析する。
+    メモリ予算 budget に収まればファイル全体を一括で、収まらなければ予算に収まる行数のチャンクごとに読み込む。
+    checkpoint_path を指定した場合は CHECKPOINT_CHUNKS チャンクごとに途中までの統計を保存し、
+    前回の分析が中断していればそこから再開する。分析を終えたファイルは結果をチェックポイントに残し、次回は読み直さない。
+    失敗した場合は例外を送出する。
     """
-    print("--- 03_analyze_columns.py: Start ---")
-
-    ANALYSIS_DIR.mkdir(exist_ok=True)
-    print(f"Input directory: '{NORMALIZED_DIR}'")
-    print(f"Output directory: '{ANALYSIS_DIR}'")
+    # まずヘッダーだけを読み込む
+    header = read_columns(filepath)
+    if not header:
+        return []
+    # 金額の列は桁区切りや注記を含むため、金額パーサーで固定小数点の整数に変換して数値とみなす
+    amount_cols = {col for col in header if is_amount_column(col)}
 
-    csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
-    if not csv_files:
-        print("\n[Warning] No .csv files found in 'data/normalized/' directory.")
-        return
+    settings = checkpoint_settings()
+    checkpoint = load_checkpoint(checkpoint_path, filepath, settings) if checkpoint_path else None
+    if checkpoint and checkpoint.get('results') is not None:
+        print("  - Already analyzed (restored from checkpoint).")
+        return checkpoint['results']
+    if checkpoint:
+        # 各列の統計を保持する辞書を、途中まで蓄積した値で復元する。
+        # 中断した実行と同じチャンクの区切りで続きを読む (予算が変わっていても結果は中断しなかった場合と同じになる)
+        col_metrics, chunks_done, chunksize = checkpoint['metrics'], checkpoint['chunks'], checkpoint['chunksize']
+        print(f"  - Resuming from checkpoint at row {chunks_done * chunksize}...")
+    else:
+        # 各列の統計情報を保持する辞書を初期化
+        col_metrics, chunks_done = {col: new_metrics() for col in header}, 0
+        plan = plan_load(filepath, budget=budget)
+        print(f"  - {plan.describe()}")
+        chunksize = plan.chunksize
 
-    all_column_headers = []
-    all_column_analysis = []
+    # チャンクごとにファイルを読み込んで処理
+    for chunk in iter_chunks(filepath, chunksize, chunks_done):
+        update_metrics(col_metrics, chunk, amount_cols)
+        chunks_done += 1
+        if checkpoint_path and chunks_done % CHECKPOINT_CHUNKS == 0:
+            save_checkpoint(checkpoint_path, filepath, settings, chunks=chunks_done, chunksize=chunksize,
+                            metrics=col_metrics, results=None)
 
-    for i, filepath in enumerate(csv_files):
-        print(f"\n({i+1}/{len(csv_files)}) Analyzing '{filepath.name}'...")
-        
-        # 1. 列名マトリクス用のヘッダー情報を収集
-        header = pd.read_csv(filepath, nrows=0, encoding='utf-8-sig').columns.tolist()
-        for col in header:
-            all_column_headers.append({'filename': filepath.name, 'column_name': col})
-        
-        # 2. 列の型や統計情報を分析
-        print("  - Analyzing column contents (this may take a while)...")
-        analysis_results = analyze_csv_content(filepath)
-        all_column_analysis.extend(analysis_results)
-        print(f"  - Analysis for '{filepath.name}' complete.")
+    # 最終的な分析結果をリストにまとめる
+    final_results = summarize_metrics(filepath, col_metrics, amount_cols)
+    if checkpoint_path:
+        save_checkpoint(checkpoint_path, filepath, settings, chunks=chunks_done, chunksize=chunksize,
+                        metrics=None, results=final_results)
+    return final_results
 
-    # --- 分析結果をCSVに出力 ---
+def write_outputs(all_column_headers: list, all_column_analysis: list):
+    """分析結果を3つの分析ファイルに出力する"""
     print("\nSaving analysis results...")
 
     # 1. column_name_matrix.csv の作成
@@ -156,7 +199,112 @@ def main():
         type_df.to_csv(ANALYSIS_DIR / 'column_type.csv', index=False, encoding='utf-8-sig')
         print(f"  - Saved 'column_type.csv' ({len(type_df)} rows)")
 
+def header_records(filepath: Path) -> list:
+    """列名マトリクス用のヘッダー情報"""
+    header = read_columns(filepath)
+    return [{'filename': filepath.name, 'column_name': col} for col in header]
+
+def merge_results(csv_files: list, queue):
+    """
+    ワーカーがファイルごとに残した分析結果を集め、3つの分析ファイルを出力する。
+    結果のないファイルがある場合は出力せずに終了する。
+    """
+    if queue is not None:
+        status = queue.status(p.name for p in csv_files)
+        print("Queue status: " + ", ".join(f"{k}={len(v)}" for k, v in status.items()))
+
+    all_column_headers, all_column_analysis, missing = [], [], []
+    for filepath in csv_files:
+        results = load_analyzed_results(filepath)
+        if results is None:
+            missing.append(filepath.name)
+            continue
+        all_column_headers.extend(header_records(filepath))
+        all_column_analysis.extend(results)
+
+    if missing:
+        print(f"\n[Error] {len(missing)} files have not been analyzed yet: {', '.join(missing)}")
+        print("--- 03_analyze_columns.py: Finished with errors ---")
+        sys.exit(1)
+    write_outputs(all_column_headers, all_column_analysis)
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="正規化済みファイルの列を分析する")
+    parser.add_argument('--merge', action='store_true',
+                        help="ワーカーがファイルごとに残した分析結果を集めて分析ファイルを出力する")
+    add_memory_arguments(parser)
+    add_queue_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    """
+    normalizedフォルダ内の全CSVを分析し、3つの分析ファイルを出力する。
+    --queue を指定した場合はワークキューから取得したファイルだけを分析して結果を残し、
+    全ワーカーの終了後に --merge で分析ファイルを出力する。
+    """
+    args = parse_args()
+    print("--- 03_analyze_columns.py: Start ---")
+
+    ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"Input directory: '{NORMALIZED_DIR}'")
+    print(f"Output directory: '{ANALYSIS_DIR}'")
+
+    csv_files = glob_tables(NORMALIZED_DIR)
+    if not csv_files:
+        print("\n[Warning] No .csv files found in 'data/normalized/' directory.")
+        return
+
+    queue = open_queue(args, '03_analyze_columns')
+    if args.merge:
+        merge_results(csv_files, queue)
+        print("\n--- 03_analyze_columns.py: Finished ---")
+        return
+
+    budget = resolve_memory_budget(args.memory_budget)
+    print(f"Memory budget: {format_size(budget)}")
+    all_column_headers = []
+    all_column_analysis = []
+    failed_files = []
+
+    for i, (filepath, lease) in enumerate(claim_items(queue, csv_files, key=lambda p: p.name)):
+        print(f"\n({i+1}/{len(csv_files)}) Analyzing '{filepath.name}'...")
+        
+        # 1. 列名マトリクス用のヘッダー情報を収集
+        all_column_headers.extend(header_records(filepath))
+        
+        # 2. 列の型や統計情報を分析
+        print("  - Analyzing column contents (this may take a while)...")
+        try:
+            analysis_results = analyze_csv_content(filepath, analysis_checkpoint_path(filepath), budget)
+        except Exception as e:
+            print(f"\n[Error] Failed to analyze {filepath.name}: {e}")
+            failed_files.append(filepath.name)
+            lease.fail(e)
+            continue
+        if not lease.held():
+            # リースを回収したワーカーの結果を使う
+            continue
+        all_column_analysis.extend(analysis_results)
+        lease.complete()
+        print(f"  - Analysis for '{filepath.name}' complete.")
+
+    if queue is None:
+        # --- 分析結果をCSVに出力 ---
+        write_outputs(all_column_headers, all_column_analysis)
+    else:
+        print(f"\nPer-file results are kept in '{CHECKPOINT_DIR}'. Run with --merge after all workers finish.")
+
+    if failed_files:
+        # 失敗したファイルの途中経過と、分析済みファイルの結果は次回の実行のために残す
+        print(f"\n[Error] {len(failed_files)} files failed: {', '.join(failed_files)}")
+        print(f"Checkpoints are kept in '{CHECKPOINT_DIR}'. Re-run to resume.")
+        print("--- 03_analyze_columns.py: Finished with errors ---")
+        sys.exit(1)
+    if queue is None:
+        shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+
     print("\n--- 03_analyze_columns.py: Finished ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
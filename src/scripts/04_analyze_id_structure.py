@@ -7,17 +7,13 @@ from itertools import product
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.reader import glob_tables, read_table, read_csv
+from src.lib.paths import NORMALIZED_DIR, ANALYSIS_DIR
+
 # --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
-ANALYSIS_DIR = PROJECT_ROOT / "analysis"
 COLUMN_TYPE_PATH = ANALYSIS_DIR / "column_type.csv"
 
-# 分析対象とする事業番号関連の列名
-ID_CANDIDATE_COLUMNS = [
-    '事業番号', '事業番号-1', '事業番号-2', 
-    '事業番号-3', '事業番号-4', '事業番号-5'
-]
 
 def analyze_id_structure_evolution():
     """
@@ -27,7 +23,7 @@ def analyze_id_structure_evolution():
         print(f"[Error] '{COLUMN_TYPE_PATH}' not found. Please run 03_analyze_columns.py first.")
         return None
         
-    df = pd.read_csv(COLUMN_TYPE_PATH)
+    df = read_csv(COLUMN_TYPE_PATH)
     
     # ID候補列のみに絞り込む
     id_df = df[df['column_name'].isin(ID_CANDIDATE_COLUMNS)].copy()
@@ -59,7 +55,7 @@ def analyze_id_combination_patterns():
     """
     all_patterns = []
     
-    csv_files = sorted(list(NORMALIZED_DIR.glob('*レビューシート.csv')) + list(NORMALIZED_DIR.glob('*セグメントシート.csv')))
+    csv_files = sorted(glob_tables(NORMALIZED_DIR, '*レビューシート') + glob_tables(NORMALIZED_DIR, '*セグメントシート'))
     if not csv_files:
         print("[Warning] No review/segment sheet files found in 'data/normalized/'.")
         return pd.DataFrame()
@@ -67,7 +63,7 @@ def analyze_id_combination_patterns():
     for i, filepath in enumerate(csv_files):
         print(f"({i+1}/{len(csv_files)}) Analyzing combination patterns in '{filepath.name}'...")
         try:
-            df = pd.read_csv(filepath, usecols=lambda col: col in ID_CANDIDATE_COLUMNS, low_memory=True)
+            df = read_table(filepath, usecols=lambda col: col in ID_CANDIDATE_COLUMNS)
             
             # 存在しないID候補列を追加しておく
             for col in ID_CANDIDATE_COLUMNS:
@@ -100,7 +96,7 @@ def main():
     事業番号関連列の構造とパターンの分析を実行し、結果をCSVに出力する。
     """
     print("--- 04_analyze_id_structure.py: Start ---")
-    ANALYSIS_DIR.mkdir(exist_ok=True)
+    ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
 
     # --- 分析1: ID構造の変遷 ---
     print("\n[1/2] Analyzing ID structure evolution from column_type.csv...")
@@ -6,42 +6,18 @@ from pathlib import Path
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.reader import read_table, read_csv
+from src.lib.business_keys import get_year_from_filename
+from src.lib.paths import ANALYSIS_DIR, NORMALIZED_DIR
+
 # --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-ANALYSIS_DIR = PROJECT_ROOT / "analysis"
 COLUMN_TYPE_PATH = ANALYSIS_DIR / "column_type.csv"
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
-
-# ユーザー提供のファイル名と年度の対応表
-FILENAME_YEAR_MAP = {
-    'database240918': 2023,
-    'database240502': 2022,
-    'database220524': 2021,
-    'database_220427': 2020,
-    'database2019_220427': 2019,
-    'database2018_220427': 2018,
-    'database2017': 2017,
-    'database2016': 2016,
-    'database2015': 2015,
-    'database2014': 2014,
-}
-
-ID_CANDIDATE_COLUMNS = [
-    '事業番号', '事業番号-1', '事業番号-2', 
-    '事業番号-3', '事業番号-4', '事業番号-5'
-]
-
-def get_year_from_filename(filename):
-    """ファイル名から正確な年度を取得する"""
-    for key, year in FILENAME_YEAR_MAP.items():
-        if key in filename:
-            return year
-    return None
 
 def analyze_string_content(filepath, column_name):
     """指定されたCSVの文字列カラムの内容を分析する"""
     try:
-        series = pd.read_csv(filepath, usecols=[column_name], squeeze=True).dropna()
+        series = read_table(filepath, usecols=[column_name])[column_name].dropna()
         if series.empty:
             return 'empty', 0, 0
             
@@ -77,7 +53,7 @@ def main():
         print(f"[Error] '{COLUMN_TYPE_PATH}' not found. Please run 03 first.")
         return
 
-    df = pd.read_csv(COLUMN_TYPE_PATH)
+    df = read_csv(COLUMN_TYPE_PATH)
     
     # ID候補列に絞り込み、正確な年度をマッピング
     id_df = df[df['column_name'].isin(ID_CANDIDATE_COLUMNS)].copy()
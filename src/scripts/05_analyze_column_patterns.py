@@ -1,5 +1,4 @@
 import sys
-import pandas as pd
 import re
 from pathlib import Path
 
@@ -7,9 +6,10 @@ from pathlib import Path
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
+from src.lib.paths import ANALYSIS_DIR
+from src.lib.reader import read_csv
+
 # --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-ANALYSIS_DIR = PROJECT_ROOT / "analysis"
 COLUMN_TYPE_PATH = ANALYSIS_DIR / "column_type.csv"
 
 # 分析したい列名のパターンを正規表現で定義
@@ -32,7 +32,7 @@ def main():
         print(f"[Error] '{COLUMN_TYPE_PATH}' not found. Please run 03 first.")
         return
 
-    df = pd.read_csv(COLUMN_TYPE_PATH)
+    df = read_csv(COLUMN_TYPE_PATH)
 
     # 各列がどのパターンに属するかを判定する
     def classify_column(column_name):
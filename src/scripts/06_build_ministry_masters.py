@@ -7,10 +7,8 @@ PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
 from src.config import MINISTRY_MASTER_DATA
+from src.lib.paths import PROCESSED_DIR
 
-# --- 定数定義 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
 def main():
     """
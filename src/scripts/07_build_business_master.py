@@ -1,4 +1,6 @@
 import sys
+import shutil
+import argparse
 import pandas as pd
 from pathlib import Path
 
@@ -6,123 +8,249 @@ from pathlib import Path
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
-from src.config import MINISTRY_NAME_VARIATIONS, MINISTRY_MASTER_DATA
-from src.lib.normalization import normalize_text
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.periods import parse_periods, summarize_periods
+from src.lib.business_keys import find_review_sheets, resolve_file_year, map_ministry_ids, build_business_ids, resolve_collisions
+from src.lib.reader import read_csv
+from src.lib.memory import add_memory_arguments, resolve_memory_budget, plan_load, format_size
+from src.lib.quality import QualityReport, check_ministry_names, write_quality_report
+from src.lib.partitions import add_layout_arguments, table_output_path, table_output_exists, write_table_from_shards
+from src.lib.ingest import load_state, save_state, group_files_by_year, plan_year_rebuild, mark_year_processed
+from src.lib.paths import NORMALIZED_DIR, PROCESSED_DIR, QUALITY_DIR
 
 # --- 定数と設定 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
-PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
-
-FILENAME_YEAR_MAP = {
-    'database240918': 2023, 'database240502': 2022, 'database220524': 2021,
-    'database_220427': 2020, 'database2019_220427': 2019, 'database2018_220427': 2018,
-    'database2017': 2017, 'database2016': 2016, 'database2015': 2015,
-    'database2014': 2014,
+QUALITY_REPORT_PATH = QUALITY_DIR / "07_build_business_master.csv"
+
+# 年度ごとの中間テーブル (シャード) と、どの入力ファイルを取り込み済みかを記録する状態ファイル。
+# 新しいリリースが届いたときは、その年度のシャードだけを作り直して最終テーブルを組み立て直す
+SHARD_DIR = PROCESSED_DIR / "_shards"
+INGEST_STATE_PATH = PROCESSED_DIR / "_ingest_state.json"
+
+MASTER_OUTPUT_COLUMNS = [
+    'id', 'ministry_id', '府省庁',
+    '事業番号', '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5',
+    '事業名', '事業開始年度', '事業終了(予定)年度', 'is_open_ended', 'has_multiple_periods'
+]
+PERIOD_OUTPUT_COLUMNS = ['id', 'period_sequence', 'comment', 'start_year', 'end_year', 'is_open_ended']
+# レビューシートから読み込む列 (これ以外の列は読み込まない)
+SOURCE_COLUMNS = ['府省', '府省庁', '事業名', '事業開始・終了(予定)年度'] + ID_CANDIDATE_COLUMNS
+
+OUTPUT_TABLES = {
+    'business_master': MASTER_OUTPUT_COLUMNS,
+    'business_period_master': PERIOD_OUTPUT_COLUMNS,
 }
+# 年度シャードと最終テーブルの並び順 (列, 数値として比較する列)。
+# シャードはこの順に並べて書き出し、最終テーブルはシャードの k-way merge で作る
+SORT_KEYS = {
+    'business_master': (['id'], []),
+    'business_period_master': (['id', 'period_sequence'], ['period_sequence']),
+}
+SAMPLE_ROWS = 5
 
-# --- マスターデータの準備 ---
-MINISTRY_DF = pd.DataFrame(MINISTRY_MASTER_DATA)
-MINISTRY_NAME_TO_ID = pd.Series(MINISTRY_DF.ministry_id.values, index=MINISTRY_DF.ministry_name).to_dict()
+def build_period_tables(master_df: pd.DataFrame):
+    """
+    読み込んだ全ファイル分の「事業開始・終了(予定)年度」を1回で解析し、
+    事業期間マスタと、事業マスタ用の代表期間 (最初の期間)、解析結果そのものを返す。
+    """
+    if '事業開始年度_raw' not in master_df.columns:
+        return pd.DataFrame(columns=PERIOD_OUTPUT_COLUMNS), pd.DataFrame(index=master_df['id']), None
 
-def get_year_from_filename(filename):
-    for key, year in FILENAME_YEAR_MAP.items():
-        if key in filename: return year
-    return None
+    periods = parse_periods(master_df.set_index('id')['事業開始年度_raw'])
+    period_df = periods.rename(columns={'source_index': 'id'})
+    period_df = period_df.reindex(columns=PERIOD_OUTPUT_COLUMNS)
 
-def split_start_end_years(series):
-    """事業開始・終了年度を分割する堅牢かつシンプルな関数"""
-    s = series.astype(str).str.strip()
-    
-    result_df = pd.DataFrame(index=s.index, columns=['start_year', 'end_year'])
-    
-    # 1. '終了(予定)なし' のパターンを処理
-    no_end_mask = (s == '終了(予定)なし')
-    result_df.loc[no_end_mask, 'start_year'] = None
-    result_df.loc[no_end_mask, 'end_year'] = '終了(予定)なし'
-    
-    # 2. 残りのデータ（'終了(予定)なし'ではないもの）を処理
-    remaining_s = s[~no_end_mask]
-    remaining_s = remaining_s.str.replace(r'[～~]', '・', regex=True)
-    
-    split_parts = remaining_s.str.split('・', n=1, expand=True)
-    
-    result_df.loc[~no_end_mask, 'start_year'] = split_parts[0]
-    result_df.loc[~no_end_mask, 'end_year'] = split_parts[1]
-    
-    # 3. 各列を正規化して返す (normalize_textはNoneをそのまま返す)
-    start_year = result_df['start_year'].str.strip().replace('', None).apply(normalize_text)
-    end_year = result_df['end_year'].str.strip().replace('', None).apply(
-        lambda x: normalize_text(x) if x != '終了(予定)なし' else x
-    )
-    
-    return start_year, end_year
+    unparsed = (~periods['is_parsed']).sum()
+    if unparsed:
+        print(f"  - [Warning] {unparsed} period entries could not be parsed as years (kept in 'comment').")
 
-def main():
-    print("--- 07_build_business_master.py (Robust Version): Start ---")
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    summary = summarize_periods(periods).rename(columns={
+        'start_year': '事業開始年度', 'end_year': '事業終了(予定)年度',
+    })
+    return period_df, summary, periods
+
+def check_period_quality(quality_reports: dict, master_df: pd.DataFrame, periods: pd.DataFrame):
+    """年度として解釈できなかった期間を、ファイルごとの品質レポートに加算する"""
+    if periods is None:
+        return
+    source_files = periods['source_index'].map(master_df.set_index('id')['source_file'])
+    for filename, group in periods.groupby(source_files):
+        report = quality_reports.get(filename)
+        if report is not None:
+            group = group.set_index('source_index')
+            report.record('unparsable_period', len(group), ~group['is_parsed'], group['comment'])
+
+def load_review_sheet(filepath: Path, file_year: int, quality_reports: dict, budget: int = None) -> pd.DataFrame:
+    """
+    1つのレビューシートの必要な列 (SOURCE_COLUMNS) だけを読み込み、府省庁IDと代理キーを付与する。
+    代理キーの衝突はファイル全体で判定するため、チャンクには分けずに読み込む。
+    """
+    plan = plan_load(filepath, usecols=lambda col: col in SOURCE_COLUMNS, budget=budget, allow_chunks=False)
+    print(f"    - {plan.describe()}")
+    df = plan.read()
     
-    all_master_records = []
+    for col in ['事業番号-3', '事業番号-4', '事業番号-5']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+
+    df.rename(columns={'府省': '府省庁', '事業開始・終了(予定)年度': '事業開始年度_raw'}, inplace=True)
     
-    review_sheets = sorted(
-        list(NORMALIZED_DIR.glob('*レビューシート.csv')) + 
-        list(NORMALIZED_DIR.glob('*データベース.csv')) +
-        list(NORMALIZED_DIR.glob('*_Sheet1.csv'))
-    )
+    if '府省庁' in df.columns:
+        df['ministry_id'] = map_ministry_ids(df['府省庁'])
+    else:
+        df['ministry_id'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    # exhibition_tracker と共通の年度別レイアウトで代理キーを生成し、衝突を同時に検出する
+    business_ids, collisions = build_business_ids(df, file_year, df['ministry_id'])
+    if collisions.any():
+        samples = business_ids[collisions].unique()[:3].tolist()
+        print(f"    [Warning] {int(collisions.sum())} rows share a business id (e.g. {samples}). "
+              f"Suffixes are added to keep ids unique.")
+    df['id'] = resolve_collisions(business_ids)
+    df['source_file'] = filepath.name
 
-    for filepath in review_sheets:
-        file_year = get_year_from_filename(filepath.name)
-        if not file_year: continue
+    # 読み込み済みの列に対して品質チェックを行う (追加の読み込みは発生しない)
+    report = QualityReport(filepath.name, '07_build_business_master')
+    if '府省庁' in df.columns:
+        check_ministry_names(report, df['府省庁'])
+    report.record('business_id_collision', business_ids.notna().sum(), collisions, business_ids)
+    quality_reports[filepath.name] = report
+    return df
+
+def build_year(file_year: int, filepaths: list, quality_reports: dict, budget: int = None):
+    """
+    1年度分のファイルから事業マスタと事業期間マスタを作る。
+    (事業マスタ, 事業期間マスタ) を返す。読み込めるファイルがなければ None を返す。
+    """
+    year_records = []
+    for filepath in filepaths:
         print(f"  - Processing '{filepath.name}' (Year: {file_year})...")
-        
         try:
-            df = pd.read_csv(filepath, low_memory=False)
-            
-            for col in ['事業番号-3', '事業番号-4', '事業番号-5']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-
-            df.rename(columns={'府省': '府省庁', '事業開始・終了(予定)年度': '事業開始年度_raw'}, inplace=True)
-            
-            df['id'] = [f"{file_year}-{str(i+1).zfill(5)}" for i in range(len(df))]
-            
-            if '府省庁' in df.columns:
-                df['normalized_ministry_name'] = df['府省庁'].replace(MINISTRY_NAME_VARIATIONS)
-                df['ministry_id'] = df['normalized_ministry_name'].map(MINISTRY_NAME_TO_ID).astype('Int64')
-            else:
-                df['ministry_id'] = pd.Series(dtype='Int64')
-                
-            if '事業開始年度_raw' in df.columns:
-                df['事業開始年度'], df['事業終了(予定)年度'] = split_start_end_years(df['事業開始年度_raw'])
-            
-            all_master_records.append(df)
-
+            year_records.append(load_review_sheet(filepath, file_year, quality_reports, budget))
         except Exception as e:
             print(f"    [Error] Failed to process {filepath.name}: {e}")
 
-    master_df = pd.concat(all_master_records, ignore_index=True)
+    if not year_records:
+        return None
+    master_df = pd.concat(year_records, ignore_index=True)
+    # 同じ年度に複数のファイルがある場合も、年度内で代理キーが一意になるようにする
+    master_df['id'] = resolve_collisions(master_df['id'])
 
-    final_output_columns = [
-        'id', 'ministry_id', '府省庁',
-        '事業番号', '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5',
-        '事業名', '事業開始年度', '事業終了(予定)年度'
-    ]
-    
-    final_df = master_df.reindex(columns=final_output_columns)
-    final_df.sort_values(by='id', inplace=True)
-    
-    output_path = PROCESSED_DIR / 'business_master.csv'
-    final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    # 事業期間は年度内の全ファイルをまとめて1回で解析する (同じ表記は一度だけ解析される)
+    period_df, period_summary, periods = build_period_tables(master_df)
+    master_df = master_df.join(period_summary, on='id')
+    check_period_quality(quality_reports, master_df, periods)
+
+    final_df = master_df.reindex(columns=MASTER_OUTPUT_COLUMNS)
+    return final_df, period_df
+
+def shard_path(table: str, year: int) -> Path:
+    return SHARD_DIR / table / f"{year}.csv"
+
+def write_year_shards(year: int, tables: dict):
+    """年度ごとのシャードを SORT_KEYS の順に並べて書き出す"""
+    for table, df in tables.items():
+        path = shard_path(table, year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sort_columns, _ = SORT_KEYS[table]
+        df.sort_values(by=sort_columns, kind='stable').to_csv(path, index=False, encoding='utf-8-sig')
+
+def assemble_table(table: str, columns: list, layout: str) -> int:
+    """
+    整列済みの年度シャードを k-way merge して最終テーブルを作り、行数を返す。
+    各シャードから1行ずつ読み込みながら書き出すため、年度が増えてもメモリ使用量は増えない。
+    シャードの値は文字列のまま最終テーブルに引き継がれる。
+    layout が partitioned の場合は、年度・府省庁IDごとのディレクトリに分けて書き出す。
+    """
+    shard_paths = sorted((SHARD_DIR / table).glob('*.csv'))
+    sort_columns, numeric_columns = SORT_KEYS[table]
+    return write_table_from_shards(shard_paths, PROCESSED_DIR, table, columns, layout,
+                                   sort_columns=sort_columns, numeric_columns=numeric_columns)
+
+def print_sample(table: str):
+    """
+    最終テーブルの先頭と末尾の行を表示する。代理キーは年度で始まるため、
+    先頭は最も古い年度の、末尾は最も新しい年度のシャードから読み込む (読み込むのはシャード1つ分まで)。
+    """
+    shard_paths = sorted((SHARD_DIR / table).glob('*.csv'))
+    if not shard_paths:
+        return
+    print(read_csv(shard_paths[0], dtype=str, nrows=SAMPLE_ROWS).to_string())
+    print("...")
+    print(read_csv(shard_paths[-1], dtype=str).tail(SAMPLE_ROWS).to_string())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="事業マスタ・事業期間マスタを生成する")
+    parser.add_argument('--full', action='store_true',
+                        help="取り込み状態を無視して全年度を作り直す")
+    parser.add_argument('--year', type=int, action='append', default=[],
+                        help="指定した年度を強制的に作り直す (複数指定可)")
+    add_memory_arguments(parser)
+    add_layout_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    print("--- 07_build_business_master.py (Incremental): Start ---")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    budget = resolve_memory_budget(args.memory_budget)
+    print(f"  - Memory budget: {format_size(budget)}")
+
+    if args.full and SHARD_DIR.exists():
+        shutil.rmtree(SHARD_DIR)
+    state = {'files': {}} if args.full else load_state(INGEST_STATE_PATH)
+    files_by_year = group_files_by_year(find_review_sheets(NORMALIZED_DIR), state, resolve_file_year)
+
+    # 新規・変更ファイルを含む年度、ファイル構成が前回と変わった年度、
+    # シャードが存在しない年度だけを処理する。入力ファイルがなくなった年度のシャードは取り除く
+    dirty_years, removed_years = plan_year_rebuild(
+        files_by_year, state, forced_years=args.year,
+        shard_exists=lambda year: all(shard_path(table, year).exists() for table in OUTPUT_TABLES),
+    )
+    for year in removed_years:
+        for table in OUTPUT_TABLES:
+            shard_path(table, year).unlink(missing_ok=True)
+    print(f"  - Years found: {sorted(files_by_year)}")
+    print(f"  - Years to (re)build: {dirty_years if dirty_years else 'none'}")
+
+    quality_reports = {}
+    for file_year in dirty_years:
+        built = build_year(file_year, files_by_year[file_year], quality_reports, budget)
+        if built is None:
+            continue
+        master_df, period_df = built
+        write_year_shards(file_year, {'business_master': master_df, 'business_period_master': period_df})
+        mark_year_processed(state, file_year, files_by_year[file_year], processed_names=quality_reports)
+        save_state(state, INGEST_STATE_PATH)
+        print(f"    -> Year {file_year}: {len(master_df)} businesses, {len(period_df)} periods.")
+
+    output_exists = all(table_output_exists(PROCESSED_DIR, table, args.layout) for table in OUTPUT_TABLES)
+    if not dirty_years and not removed_years and output_exists:
+        print("\nNo new or changed releases. Processed tables are up to date.")
+        print("\n--- 07_build_business_master.py: Finished ---")
+        return
+
+    # 年度シャードから最終テーブルを組み立て直す (正規化済みシートの再読み込みは不要)
+    print("\n  - Assembling processed tables from year shards...")
+    master_rows = assemble_table('business_master', MASTER_OUTPUT_COLUMNS, args.layout)
+    period_rows = assemble_table('business_period_master', PERIOD_OUTPUT_COLUMNS, args.layout)
     
-    print(f"\nBusiness master creation complete. Total {len(final_df)} records.")
-    print(f"Result saved to '{output_path}'")
+    print(f"\nBusiness master creation complete. Total {master_rows} records.")
+    print(f"Result saved to '{table_output_path(PROCESSED_DIR, 'business_master', args.layout)}'")
+    print(f"Business period master saved to '{table_output_path(PROCESSED_DIR, 'business_period_master', args.layout)}' "
+          f"({period_rows} records).")
+
+    quality_records = []
+    for report in quality_reports.values():
+        report.print_summary()
+        quality_records.extend(report.to_records())
+    write_quality_report(quality_records, QUALITY_REPORT_PATH, replace_files=list(quality_reports))
+    print(f"Quality report saved to '{QUALITY_REPORT_PATH}'")
+
     print("\n--- Generated Business Master (Sample) ---")
-    print(final_df.head().to_string())
-    print("...")
-    print(final_df.tail().to_string())
+    print_sample('business_master')
     
     print("\n--- 07_build_business_master.py: Finished ---")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,84 @@
+import sys
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.config import SEARCH_TEXT_COLUMNS, ID_CANDIDATE_COLUMNS
+from src.lib.reader import read_table
+from src.lib.business_keys import find_review_sheets, resolve_file_year, assign_business_ids, resolve_collisions
+from src.lib.ingest import group_files_by_year
+from src.lib.search_index import SearchIndexBuilder
+from src.lib.paths import NORMALIZED_DIR, INDEX_DIR
+
+# --- 定数定義 ---
+# 代理キーの生成に必要な列と、検索対象の列だけを読み込む
+KEY_COLUMNS = ['府省庁', '府省'] + ID_CANDIDATE_COLUMNS
+
+def load_file(filepath: Path, file_year: int):
+    """1ファイル分の代理キーと検索対象の列を読み込む。検索対象の列がなければ None を返す"""
+    wanted = set(KEY_COLUMNS) | set(SEARCH_TEXT_COLUMNS)
+    df = read_table(filepath, usecols=lambda col: col in wanted, dtype=str)
+    text_cols = [col for col in SEARCH_TEXT_COLUMNS if col in df.columns]
+    if not text_cols:
+        print("  -> No searchable text columns. Skipping.")
+        return None
+    _, business_ids = assign_business_ids(df, file_year)
+    return business_ids, df[text_cols]
+
+def index_year(builder: SearchIndexBuilder, file_year: int, filepaths: list) -> int:
+    """
+    1年度分の事業を文書としてインデックスに追加する。
+    代理キーは 07_build_business_master と同じく、ファイルごとに付与したあと年度内で一意にする。
+    """
+    loaded = []
+    for filepath in filepaths:
+        print(f"  - Indexing '{filepath.name}' (Year: {file_year})...")
+        try:
+            result = load_file(filepath, file_year)
+        except Exception as e:
+            print(f"    [Error] Failed to index {filepath.name}: {e}")
+            continue
+        if result is not None:
+            loaded.append((filepath, *result))
+    if not loaded:
+        return 0
+
+    year_ids = resolve_collisions(pd.concat([business_ids for _, business_ids, _ in loaded], ignore_index=True))
+    offset = 0
+    for filepath, business_ids, texts in loaded:
+        file_ids = year_ids.iloc[offset:offset + len(texts)]
+        offset += len(texts)
+        for business_id, fields in zip(file_ids, texts.itertuples(index=False, name=None)):
+            if pd.isna(business_id):
+                continue
+            builder.add_document(business_id, file_year, filepath.name, dict(zip(texts.columns, fields)))
+    return offset
+
+def main():
+    """
+    全リリースのレビューシートから、事業名・事業概要・目的などのバイグラム転置インデックスを作る。
+    """
+    print("--- 08_build_search_index.py: Start ---")
+
+    files = find_review_sheets(NORMALIZED_DIR)
+    if not files:
+        print("\n[Warning] No normalized files found in 'data/normalized/' directory.")
+        print("--- 08_build_search_index.py: Finished ---")
+        return
+
+    builder = SearchIndexBuilder(SEARCH_TEXT_COLUMNS)
+    files_by_year = group_files_by_year(files, {'files': {}}, resolve_file_year)
+    for file_year, filepaths in files_by_year.items():
+        index_year(builder, file_year, filepaths)
+
+    doc_count, term_count = builder.write(INDEX_DIR)
+    print(f"\nIndexed {doc_count} business rows ({term_count} distinct terms).")
+    print(f"Index saved to '{INDEX_DIR}'")
+    print("\n--- 08_build_search_index.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
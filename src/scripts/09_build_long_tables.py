@@ -0,0 +1,187 @@
+import sys
+import shutil
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.business_keys import find_review_sheets, resolve_file_year, assign_business_ids, resolve_collisions
+from src.lib.long_tables import (
+    BUDGET_COLUMNS, EXPENSE_COLUMNS, RE_BUDGET_COLUMN, RE_EXPENSE_COLUMN,
+    melt_budget, melt_expense, attach_amounts,
+)
+from src.lib.quality import QualityReport, write_quality_report
+from src.lib.reader import read_table
+from src.lib.ingest import (
+    load_state, save_state, group_files_by_year, plan_year_rebuild, mark_year_processed,
+)
+from src.lib.partitions import add_layout_arguments, table_output_path, table_output_exists, write_table_from_shards
+from src.lib.paths import NORMALIZED_DIR, PROCESSED_DIR, QUALITY_DIR
+from src.lib.workqueue import add_queue_arguments, open_queue, claim_items, shared_lock
+
+# --- 定数と設定 ---
+QUALITY_REPORT_PATH = QUALITY_DIR / "09_build_long_tables.csv"
+
+# 縦持ちテーブルは年度ごとのシャードとして保持し、変更のあった年度だけを作り直す
+SHARD_DIR = PROCESSED_DIR / "_shards"
+INGEST_STATE_PATH = PROCESSED_DIR / "_long_tables_state.json"
+
+OUTPUT_TABLES = {
+    'budget_execution': BUDGET_COLUMNS,
+    'expense_details': EXPENSE_COLUMNS,
+}
+
+KEY_COLUMNS = ['府省庁', '府省'] + ID_CANDIDATE_COLUMNS
+
+def is_wanted_column(col) -> bool:
+    """代理キーの生成に必要な列と、縦持ちに変換する列だけを読み込む"""
+    col = str(col)
+    return col in KEY_COLUMNS or bool(RE_BUDGET_COLUMN.match(col) or RE_EXPENSE_COLUMN.match(col))
+
+def build_year(file_year: int, filepaths: list, report: QualityReport):
+    """
+    1年度分のレビューシートから予算執行テーブルと費目使途テーブルを作る。
+    代理キーは 07_build_business_master と同じく、ファイルごとに付与したあと年度内で一意にする。
+    金額は固定小数点の整数に変換し、解析できなかった値を品質レポートに記録する。
+    ({テーブル名: DataFrame}, 処理できたファイル名のリスト) を返す。
+    """
+    frames, processed = [], []
+    for filepath in filepaths:
+        print(f"  - Processing '{filepath.name}' (Year: {file_year})...")
+        try:
+            df = read_table(filepath, usecols=is_wanted_column, dtype=str)
+            df['ministry_id'], df['id'] = assign_business_ids(df, file_year)
+            frames.append(df)
+            processed.append(filepath.name)
+        except Exception as e:
+            print(f"    [Error] Failed to process {filepath.name}: {e}")
+
+    if not frames:
+        return None, processed
+    year_df = pd.concat(frames, ignore_index=True)
+    business_ids = resolve_collisions(year_df['id'])
+    tables = {
+        'budget_execution': melt_budget(year_df, business_ids, year_df['ministry_id'], file_year),
+        'expense_details': melt_expense(year_df, business_ids, year_df['ministry_id'], file_year),
+    }
+    for table, df in tables.items():
+        failed = attach_amounts(df)
+        amounts = df.set_index('id')['金額']
+        report.record(f'unparsable_amount:{table}', amounts.notna().sum(), failed.set_axis(amounts.index), amounts)
+    return tables, processed
+
+def shard_path(table: str, year: int) -> Path:
+    return SHARD_DIR / table / f"{year}.csv"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="予算執行・費目使途の縦持ちテーブルを生成する")
+    parser.add_argument('--full', action='store_true',
+                        help="取り込み状態を無視して全年度を作り直す")
+    parser.add_argument('--year', type=int, action='append', default=[],
+                        help="指定した年度を強制的に作り直す (複数指定可)")
+    parser.add_argument('--merge', action='store_true',
+                        help="年度シャードを連結して縦持ちテーブルを出力するだけを行う (--queue で分担したあとに実行する)")
+    add_layout_arguments(parser)
+    add_queue_arguments(parser)
+    return parser.parse_args()
+
+def assemble_tables(layout: str):
+    """年度シャードを連結して縦持ちテーブルを出力する"""
+    print("\n  - Assembling long tables from year shards...")
+    for table, columns in OUTPUT_TABLES.items():
+        shard_paths = sorted((SHARD_DIR / table).glob('*.csv'))
+        rows = write_table_from_shards(shard_paths, PROCESSED_DIR, table, columns, layout)
+        print(f"Result saved to '{table_output_path(PROCESSED_DIR, table, layout)}' ({rows} records).")
+
+def main():
+    args = parse_args()
+    print("--- 09_build_long_tables.py (Incremental): Start ---")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    queue = open_queue(args, '09_build_long_tables')
+
+    if args.merge:
+        if queue is not None:
+            summary = queue.summary()
+            print("Queue status: " + ", ".join(f"{k}={v}" for k, v in summary.items()))
+            if summary['running'] or summary['failed']:
+                print("  - [Warning] Some years are still running or have failed. Their shards may be missing or stale.")
+        assemble_tables(args.layout)
+        print("\n--- 09_build_long_tables.py: Finished ---")
+        return
+
+    if args.full:
+        for table in OUTPUT_TABLES:
+            shutil.rmtree(SHARD_DIR / table, ignore_errors=True)
+    state = {'files': {}} if args.full else load_state(INGEST_STATE_PATH)
+
+    review_sheets = find_review_sheets(NORMALIZED_DIR)
+    files_by_year = group_files_by_year(review_sheets, state, resolve_file_year)
+    dirty_years, removed_years = plan_year_rebuild(
+        files_by_year, state, forced_years=args.year,
+        shard_exists=lambda year: all(shard_path(table, year).exists() for table in OUTPUT_TABLES),
+    )
+    for year in removed_years:
+        for table in OUTPUT_TABLES:
+            shard_path(table, year).unlink(missing_ok=True)
+    print(f"  - Years found: {sorted(files_by_year)}")
+    print(f"  - Years to (re)build: {dirty_years if dirty_years else 'none'}")
+
+    built_years = []
+    for file_year, lease in claim_items(queue, dirty_years):
+        # 縦持ちテーブルは年度単位で作るため、品質レポートも年度内のファイルをまとめて1行とする
+        report_name = ' + '.join(sorted(p.name for p in files_by_year[file_year]))
+        report = QualityReport(report_name, '09_build_long_tables')
+        tables, processed = build_year(file_year, files_by_year[file_year], report)
+        report.print_summary()
+        if not lease.held():
+            # リースを回収したワーカーが作り直すため、品質レポートもシャードも状態も書き出さない
+            continue
+        with shared_lock(queue, 'quality_report'):
+            write_quality_report(report.to_records(), QUALITY_REPORT_PATH, replace_files=[report_name])
+        if tables is None:
+            lease.fail(f"no readable review sheets for {file_year}")
+            continue
+        for table, df in tables.items():
+            path = shard_path(table, file_year)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+        # 他のワーカーの記録を消さないよう、ロックを取って最新の状態に追記する
+        with shared_lock(queue, 'ingest_state'):
+            if queue is not None:
+                state = load_state(INGEST_STATE_PATH)
+                for year in removed_years:
+                    state.get('years', {}).pop(str(year), None)
+            mark_year_processed(state, file_year, files_by_year[file_year], processed_names=processed)
+            save_state(state, INGEST_STATE_PATH)
+        lease.complete()
+        built_years.append(file_year)
+        print(f"    -> Year {file_year}: {len(tables['budget_execution'])} budget rows, "
+              f"{len(tables['expense_details'])} expense rows.")
+
+    if built_years:
+        print(f"Quality report saved to '{QUALITY_REPORT_PATH}'")
+
+    if queue is not None:
+        # 連結は全ワーカーの終了後に --merge で1回だけ行う
+        print(f"\nBuilt year shards: {built_years if built_years else 'none'}. "
+              "Run with --merge after all workers finish.")
+        print("\n--- 09_build_long_tables.py: Finished ---")
+        return
+
+    output_exists = all(table_output_exists(PROCESSED_DIR, table, args.layout) for table in OUTPUT_TABLES)
+    if not dirty_years and not removed_years and output_exists:
+        print("\nNo new or changed releases. Long tables are up to date.")
+        print("\n--- 09_build_long_tables.py: Finished ---")
+        return
+
+    assemble_tables(args.layout)
+
+    print("\n--- 09_build_long_tables.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
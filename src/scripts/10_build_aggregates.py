@@ -0,0 +1,160 @@
+import sys
+import shutil
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.amounts import AMOUNT_COLUMN
+from src.lib.ingest import is_up_to_date
+from src.lib.paths import PROCESSED_DIR
+from src.lib.reader import read_csv
+
+# --- 定数と設定 ---
+# 09_build_long_tables が書き出す年度ごとの縦持ちテーブル
+LONG_SHARD_DIR = PROCESSED_DIR / "_shards"
+AGGREGATE_DIR = PROCESSED_DIR / "aggregates"
+# 年度ごとの集計結果 (部分集計)。縦持ちテーブルのシャードより古いものだけを作り直す
+PARTIAL_DIR = AGGREGATE_DIR / "_partials"
+
+# 集計の定義。
+#   source:   集計元の縦持ちテーブル
+#   measures: 合算できない項目の列。全ての粒度で保持する
+#             (予算項目は当初予算・補正予算・執行額などの種別であり、項目をまたいだ合計には意味がない)
+#   grains:   出力テーブル名 -> 集計キー。最も細かい粒度を先頭に置く
+AGGREGATES = {
+    'budget': {
+        'source': 'budget_execution',
+        'measures': ['budget_year', '予算項目'],
+        'grains': {
+            'budget_by_ministry_year': ['year', 'ministry_id'],
+            'budget_by_year': ['year'],
+        },
+    },
+    'expense': {
+        'source': 'expense_details',
+        'measures': [],
+        'grains': {
+            'expense_by_ministry_year_item': ['year', 'ministry_id', '費目'],
+            'expense_by_ministry_year': ['year', 'ministry_id'],
+            'expense_by_year': ['year'],
+        },
+    },
+}
+
+# 執行率などの比率は合計できないため、集計の対象から外す
+RE_NON_ADDITIVE_ITEM = r'率'
+
+# 金額は 09 で解析済みの固定小数点の整数 (千円単位) をそのまま合計するため、丸め誤差は生じない
+VALUE_COLUMNS = [AMOUNT_COLUMN, 'rows', 'businesses']
+
+def aggregate_year(spec: dict, long_df: pd.DataFrame) -> dict:
+    """
+    1年度分の縦持ちテーブルから、定義された全ての粒度の集計を作る。
+    元データは (最も細かい粒度 + 事業) の単位で1回だけグループ化し、
+    それより粗い粒度は、その小さな中間結果を集約し直して求める (事業数も重複なく数えられる)。
+    """
+    df = long_df
+    if '予算項目' in spec['measures']:
+        df = df[~df['予算項目'].astype('string').str.contains(RE_NON_ADDITIVE_ITEM, na=False)]
+    df = df[df[AMOUNT_COLUMN].notna()]
+
+    finest = list(spec['grains'].values())[0]
+    keys = list(dict.fromkeys(finest + spec['measures'] + ['id']))
+    per_business = (
+        df.groupby(keys, dropna=False, sort=False)[AMOUNT_COLUMN]
+        .agg(amount='sum', rows='count')
+        .reset_index()
+    )
+
+    results = {}
+    for name, grain in spec['grains'].items():
+        group_keys = grain + spec['measures']
+        results[name] = (
+            per_business.groupby(group_keys, dropna=False)
+            .agg(amount=('amount', 'sum'), rows=('rows', 'sum'), businesses=('id', 'nunique'))
+            .reset_index()
+            .rename(columns={'amount': AMOUNT_COLUMN})
+            .reindex(columns=group_keys + VALUE_COLUMNS)
+        )
+    return results
+
+def partial_path(name: str, year: str) -> Path:
+    return PARTIAL_DIR / name / f"{year}.csv"
+
+def refresh_partials(spec: dict, force: bool) -> tuple:
+    """
+    縦持ちテーブルのシャードが更新された年度だけ部分集計を作り直し、
+    シャードがなくなった年度の部分集計を削除する。(更新した年度, 削除した年度) を返す。
+    """
+    shard_paths = {p.stem: p for p in sorted((LONG_SHARD_DIR / spec['source']).glob('*.csv'))}
+    names = list(spec['grains'])
+
+    refreshed = []
+    for year, shard in shard_paths.items():
+        if not force and all(is_up_to_date(shard, partial_path(name, year)) for name in names):
+            continue
+        long_df = read_csv(shard, dtype={'id': str, 'ministry_id': 'Int64', 'year': 'Int64', AMOUNT_COLUMN: 'Int64'})
+        for name, df in aggregate_year(spec, long_df).items():
+            path = partial_path(name, year)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+        refreshed.append(year)
+
+    removed = []
+    for name in names:
+        for path in (PARTIAL_DIR / name).glob('*.csv'):
+            if path.stem not in shard_paths:
+                path.unlink()
+                removed.append(path.stem)
+    return refreshed, sorted(set(removed))
+
+def assemble_aggregate(name: str, columns: list) -> int:
+    """
+    年度ごとの部分集計を連結して集計テーブルを書き出す。
+    全ての粒度が年度をキーに含むため、年度をまたいだ再集計は不要。
+    部分集計は文字列のまま読み込み、書き出した値をそのまま引き継ぐ。
+    """
+    frames = [read_csv(p, dtype=str) for p in sorted((PARTIAL_DIR / name).glob('*.csv'))]
+    frames = [df for df in frames if not df.empty]
+    df = pd.concat(frames, ignore_index=True).reindex(columns=columns) if frames else pd.DataFrame(columns=columns)
+    df.to_csv(AGGREGATE_DIR / f"{name}.csv", index=False, encoding='utf-8-sig')
+    return len(df)
+
+def main():
+    """
+    予算執行・費目使途の縦持ちテーブルから、府省庁×年度×項目などの集計テーブルを作る。
+    ダッシュボード等は縦持ちテーブル全体ではなく、この小さな集計テーブルを読めばよい。
+    """
+    parser = argparse.ArgumentParser(description="府省庁×年度×項目の集計テーブルを生成する")
+    parser.add_argument('--full', action='store_true', help="全年度の部分集計を作り直す")
+    args = parser.parse_args()
+
+    print("--- 10_build_aggregates.py (Incremental): Start ---")
+    if args.full:
+        shutil.rmtree(PARTIAL_DIR, ignore_errors=True)
+    AGGREGATE_DIR.mkdir(parents=True, exist_ok=True)
+
+    for key, spec in AGGREGATES.items():
+        if not (LONG_SHARD_DIR / spec['source']).exists():
+            print(f"\n[Warning] No shards for '{spec['source']}'. Run 09_build_long_tables first.")
+            continue
+        refreshed, removed = refresh_partials(spec, args.full)
+        print(f"\n  - {key}: refreshed years {refreshed if refreshed else 'none'}"
+              f"{f', removed years {removed}' if removed else ''}")
+
+        outputs_exist = all((AGGREGATE_DIR / f"{name}.csv").exists() for name in spec['grains'])
+        if not refreshed and not removed and outputs_exist:
+            continue
+        for name, grain in spec['grains'].items():
+            rows = assemble_aggregate(name, grain + spec['measures'] + VALUE_COLUMNS)
+            print(f"    -> '{AGGREGATE_DIR / f'{name}.csv'}' ({rows} rows)")
+
+    print("\n--- 10_build_aggregates.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
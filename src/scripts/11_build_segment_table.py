@@ -0,0 +1,146 @@
+import sys
+import shutil
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.business_keys import resolve_file_year, map_ministry_ids, build_business_ids
+from src.lib.long_tables import SEGMENT_COLUMNS, melt_segments
+from src.lib.reader import glob_tables, read_table, read_csv
+from src.lib.ingest import (
+    load_state, save_state, group_files_by_year, plan_year_rebuild, mark_year_processed,
+)
+from src.lib.partitions import add_layout_arguments, table_output_path, table_output_exists, write_table_from_shards
+from src.lib.paths import NORMALIZED_DIR, PROCESSED_DIR
+
+# --- 定数と設定 ---
+TABLE_NAME = 'segment_details'
+SHARD_DIR = PROCESSED_DIR / "_shards" / TABLE_NAME
+INGEST_STATE_PATH = PROCESSED_DIR / "_segment_state.json"
+# 親事業の対応付けに使う 07_build_business_master の年度シャード
+BUSINESS_SHARD_DIR = PROCESSED_DIR / "_shards" / "business_master"
+
+# 一度に読み込む行数。ピーク時のメモリ使用量はこの行数で決まり、ファイルの大きさによらない
+CHUNKSIZE = 5000
+
+def load_parent_ids(year: int) -> set:
+    """事業マスタの年度シャードから、その年度の代理キーの集合を読み込む (存在しない場合は空集合)"""
+    path = BUSINESS_SHARD_DIR / f"{year}.csv"
+    if not path.exists():
+        return set()
+    return set(read_csv(path, usecols=['id'], dtype=str)['id'])
+
+def stream_segment_sheet(filepath: Path, file_year: int, parent_ids: set, writer, segment_counts: dict) -> dict:
+    """
+    1つのセグメントシートをチャンク単位で読み込み、事業番号から親事業の代理キーを求めて縦持ちで書き出す。
+    セグメントシートでは1事業が複数行になるため、代理キーの衝突は解消せず、事業マスタの代理キーにそのまま対応付ける。
+    segment_counts には事業ごとのセグメント数が蓄積され、チャンクをまたいでも連番が続く。
+    """
+    stats = {'rows': 0, 'records': 0, 'unlinked': 0}
+    for chunk in read_table(filepath, dtype=str, chunksize=CHUNKSIZE):
+        ministry_col = '府省庁' if '府省庁' in chunk.columns else '府省'
+        if ministry_col in chunk.columns:
+            ministry_ids = map_ministry_ids(chunk[ministry_col])
+        else:
+            ministry_ids = pd.Series(pd.NA, index=chunk.index, dtype='Int64')
+        business_ids, _ = build_business_ids(chunk, file_year, ministry_ids)
+
+        # 事業ごとのセグメントの連番 (前のチャンクまでの件数に続けて振る)
+        offsets = business_ids.map(segment_counts).fillna(0).astype(int)
+        sequence = (offsets + business_ids.groupby(business_ids).cumcount() + 1).astype('Int64')
+        for business_id, count in business_ids.value_counts().items():
+            segment_counts[business_id] = segment_counts.get(business_id, 0) + count
+
+        if parent_ids:
+            stats['unlinked'] += int((~business_ids.isin(parent_ids)).sum())
+        long = melt_segments(chunk, business_ids, ministry_ids, file_year, sequence)
+        long.to_csv(writer, header=False, index=False)
+        stats['rows'] += len(chunk)
+        stats['records'] += len(long)
+    return stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="セグメントシートの縦持ちテーブルを生成する")
+    parser.add_argument('--full', action='store_true',
+                        help="取り込み状態を無視して全年度を作り直す")
+    parser.add_argument('--year', type=int, action='append', default=[],
+                        help="指定した年度を強制的に作り直す (複数指定可)")
+    add_layout_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    """
+    セグメントシートをストリーミングで読み込み、各セグメント行を親事業に対応付けた縦持ちテーブルを作る。
+    """
+    args = parse_args()
+    print("--- 11_build_segment_table.py (Streaming): Start ---")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.full:
+        shutil.rmtree(SHARD_DIR, ignore_errors=True)
+    state = {'files': {}} if args.full else load_state(INGEST_STATE_PATH)
+
+    segment_sheets = glob_tables(NORMALIZED_DIR, '*セグメントシート')
+    files_by_year = group_files_by_year(segment_sheets, state, resolve_file_year)
+    dirty_years, removed_years = plan_year_rebuild(
+        files_by_year, state, forced_years=args.year,
+        shard_exists=lambda year: (SHARD_DIR / f"{year}.csv").exists(),
+    )
+    for year in removed_years:
+        (SHARD_DIR / f"{year}.csv").unlink(missing_ok=True)
+    print(f"  - Years found: {sorted(files_by_year)}")
+    print(f"  - Years to (re)build: {dirty_years if dirty_years else 'none'}")
+
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    for file_year in dirty_years:
+        parent_ids = load_parent_ids(file_year)
+        if not parent_ids:
+            print(f"  - [Warning] No business master shard for {file_year}. Parent links are not verified.")
+
+        processed = []
+        segment_counts = {}
+        shard = SHARD_DIR / f"{file_year}.csv"
+        tmp_shard = shard.with_suffix('.tmp')
+        # ファイルごとに一時ファイルへ書き出し、最後まで処理できたファイルだけをシャードに追加する。
+        # 途中で失敗したファイルの行とセグメント数は、シャードにも連番にも残さない
+        file_part = shard.with_suffix('.part')
+        with open(tmp_shard, 'w', newline='', encoding='utf-8-sig') as writer:
+            writer.write(','.join(SEGMENT_COLUMNS) + '\n')
+            for filepath in files_by_year[file_year]:
+                print(f"  - Streaming '{filepath.name}' (Year: {file_year})...")
+                file_counts = dict(segment_counts)
+                try:
+                    with open(file_part, 'w', newline='', encoding='utf-8') as part_writer:
+                        stats = stream_segment_sheet(filepath, file_year, parent_ids, part_writer, file_counts)
+                except Exception as e:
+                    print(f"    [Error] Failed to process {filepath.name}: {e}")
+                    continue
+                with open(file_part, 'r', newline='', encoding='utf-8') as part_reader:
+                    shutil.copyfileobj(part_reader, writer)
+                segment_counts = file_counts
+                processed.append(filepath.name)
+                print(f"    -> {stats['rows']} segment rows, {stats['records']} records.")
+                if stats['unlinked']:
+                    print(f"    [Warning] {stats['unlinked']} segment rows have no matching business in the master.")
+        file_part.unlink(missing_ok=True)
+        tmp_shard.replace(shard)
+        mark_year_processed(state, file_year, files_by_year[file_year], processed_names=processed)
+        save_state(state, INGEST_STATE_PATH)
+
+    output_path = table_output_path(PROCESSED_DIR, TABLE_NAME, args.layout)
+    if not dirty_years and not removed_years and table_output_exists(PROCESSED_DIR, TABLE_NAME, args.layout):
+        print("\nNo new or changed releases. Segment table is up to date.")
+    else:
+        rows = write_table_from_shards(sorted(SHARD_DIR.glob('*.csv')), PROCESSED_DIR, TABLE_NAME, SEGMENT_COLUMNS,
+                                       args.layout, chunksize=CHUNKSIZE)
+        print(f"\nResult saved to '{output_path}' ({rows} records).")
+
+    print("\n--- 11_build_segment_table.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import sys
+import shutil
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.business_keys import find_review_sheets, resolve_file_year, assign_business_ids, resolve_collisions
+from src.lib.amounts import AMOUNT_COLUMN
+from src.lib.long_tables import PAYEE_COLUMNS, RE_PAYEE_COLUMN, melt_payees, attach_amounts
+from src.lib.payees import normalize_corporate_numbers, resolve_payees, MATCH_AMBIGUOUS_NAME, MATCH_NAME_TO_NUMBER
+from src.lib.quality import QualityReport, write_quality_report
+from src.lib.reader import read_table, read_csv
+from src.lib.ingest import load_state, save_state, group_files_by_year, plan_year_rebuild, mark_year_processed
+from src.lib.partitions import add_layout_arguments, table_output_exists, write_table
+from src.lib.paths import NORMALIZED_DIR, PROCESSED_DIR, QUALITY_DIR
+
+# --- 定数と設定 ---
+QUALITY_REPORT_PATH = QUALITY_DIR / "12_build_payee_master.csv"
+
+# 縦持ちにした支出先レコードは年度ごとのシャードとして保持し、変更のあった年度だけを作り直す。
+# 名寄せは年度をまたいで行うため、支出先マスタと対応表は毎回全シャードから作る
+SHARD_DIR = PROCESSED_DIR / "_shards" / "payee_records"
+INGEST_STATE_PATH = PROCESSED_DIR / "_payee_state.json"
+
+PAYEE_MASTER_PATH = PROCESSED_DIR / "payee_master.csv"
+# 事業→支出先の対応表は年度・府省庁IDの列を持つため、--layout partitioned でパーティションに分けて書き出せる。
+# 支出先マスタは年度をまたいだ名寄せの結果なので、常に1つのファイルとして書き出す
+PAYEE_LINK_TABLE = 'business_payee_links'
+
+KEY_COLUMNS = ['府省庁', '府省'] + ID_CANDIDATE_COLUMNS
+
+def is_wanted_column(col) -> bool:
+    """代理キーの生成に必要な列と、支出先上位10者リストの列だけを読み込む"""
+    col = str(col)
+    return col in KEY_COLUMNS or bool(RE_PAYEE_COLUMN.match(col))
+
+def build_year(file_year: int, filepaths: list, report: QualityReport):
+    """
+    1年度分のレビューシートから支出先レコードを作る。代理キーは 09_build_long_tables と同じ手順で付与する。
+    支出額は固定小数点の整数に変換し、解析できない支出額と13桁にならない法人番号を品質レポートに記録する。
+    (DataFrame, 処理できたファイル名のリスト) を返す。
+    """
+    frames, processed = [], []
+    for filepath in filepaths:
+        print(f"  - Processing '{filepath.name}' (Year: {file_year})...")
+        try:
+            df = read_table(filepath, usecols=is_wanted_column, dtype=str)
+            df['ministry_id'], df['id'] = assign_business_ids(df, file_year)
+            frames.append(df)
+            processed.append(filepath.name)
+        except Exception as e:
+            print(f"    [Error] Failed to process {filepath.name}: {e}")
+
+    if not frames:
+        return None, processed
+    year_df = pd.concat(frames, ignore_index=True)
+    business_ids = resolve_collisions(year_df['id'])
+    records = melt_payees(year_df, business_ids, year_df['ministry_id'], file_year)
+
+    failed = attach_amounts(records)
+    amounts = records.set_index('id')['金額']
+    report.record('unparsable_amount:payee_records', amounts.notna().sum(), failed.set_axis(amounts.index), amounts)
+    numbers = records.set_index('id')['法人番号']
+    invalid = numbers.notna() & normalize_corporate_numbers(numbers).isna()
+    report.record('invalid_corporate_number', numbers.notna().sum(), invalid, numbers)
+    return records, processed
+
+def shard_path(year: int) -> Path:
+    return SHARD_DIR / f"{year}.csv"
+
+def load_records() -> pd.DataFrame:
+    """全年度のシャードを読み込む"""
+    frames = [read_csv(path, dtype=str) for path in sorted(SHARD_DIR.glob('*.csv'))]
+    if not frames:
+        return pd.DataFrame(columns=PAYEE_COLUMNS)
+    records = pd.concat(frames, ignore_index=True)
+    for col in ['year', 'ministry_id', '順位', AMOUNT_COLUMN]:
+        records[col] = pd.to_numeric(records[col]).astype('Int64')
+    return records
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="支出先マスタと事業→支出先の対応表を生成する")
+    parser.add_argument('--full', action='store_true',
+                        help="取り込み状態を無視して全年度を作り直す")
+    parser.add_argument('--year', type=int, action='append', default=[],
+                        help="指定した年度を強制的に作り直す (複数指定可)")
+    add_layout_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    """
+    支出先上位10者リストを縦持ちにし、法人番号と正規化名称をキーに支出先を名寄せして、
+    支出先マスタと事業→支出先の対応表を作る。
+    """
+    args = parse_args()
+    print("--- 12_build_payee_master.py (Incremental): Start ---")
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.full:
+        shutil.rmtree(SHARD_DIR, ignore_errors=True)
+    state = {'files': {}} if args.full else load_state(INGEST_STATE_PATH)
+
+    review_sheets = find_review_sheets(NORMALIZED_DIR)
+    files_by_year = group_files_by_year(review_sheets, state, resolve_file_year)
+    dirty_years, removed_years = plan_year_rebuild(
+        files_by_year, state, forced_years=args.year, shard_exists=lambda year: shard_path(year).exists(),
+    )
+    for year in removed_years:
+        shard_path(year).unlink(missing_ok=True)
+    print(f"  - Years found: {sorted(files_by_year)}")
+    print(f"  - Years to (re)build: {dirty_years if dirty_years else 'none'}")
+
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    for file_year in dirty_years:
+        report_name = ' + '.join(sorted(p.name for p in files_by_year[file_year]))
+        report = QualityReport(report_name, '12_build_payee_master')
+        records, processed = build_year(file_year, files_by_year[file_year], report)
+        report.print_summary()
+        write_quality_report(report.to_records(), QUALITY_REPORT_PATH, replace_files=[report_name])
+        if records is None:
+            continue
+        records.to_csv(shard_path(file_year), index=False, encoding='utf-8-sig')
+        mark_year_processed(state, file_year, files_by_year[file_year], processed_names=processed)
+        save_state(state, INGEST_STATE_PATH)
+        print(f"    -> Year {file_year}: {len(records)} payee records.")
+
+    links_exist = table_output_exists(PROCESSED_DIR, PAYEE_LINK_TABLE, args.layout)
+    if not dirty_years and not removed_years and PAYEE_MASTER_PATH.exists() and links_exist:
+        print("\nNo new or changed releases. Payee master is up to date.")
+        print("\n--- 12_build_payee_master.py: Finished ---")
+        return
+
+    print("\n  - Resolving payees across all years...")
+    records = load_records()
+    master, links = resolve_payees(records)
+    master.to_csv(PAYEE_MASTER_PATH, index=False, encoding='utf-8-sig')
+    link_path = write_table(links, PROCESSED_DIR, PAYEE_LINK_TABLE, list(links.columns), args.layout)
+
+    methods = links['match_method'].value_counts()
+    print(f"    -> {len(records)} records -> {len(master)} payees "
+          f"({master['法人番号'].notna().sum()} with corporate numbers).")
+    print(f"    -> Linked by name to a corporate number: {methods.get(MATCH_NAME_TO_NUMBER, 0)} records.")
+    if methods.get(MATCH_AMBIGUOUS_NAME, 0):
+        print(f"    [Warning] {methods[MATCH_AMBIGUOUS_NAME]} records have a name shared by several corporate numbers "
+              "and were kept as name-only payees.")
+    print(f"Result saved to '{PAYEE_MASTER_PATH}' and '{link_path}'")
+
+    print("\n--- 12_build_payee_master.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
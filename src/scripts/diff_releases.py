@@ -0,0 +1,88 @@
+import sys
+import time
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.business_keys import resolve_file_year
+from src.lib.fingerprint import (
+    CHANGE_COLUMNS, common_family_columns, schema_changes, row_keys,
+    fingerprint_table, compare_fingerprints, drill_down,
+)
+from src.lib.reader import glob_tables, read_columns
+from src.lib.paths import NORMALIZED_DIR, ANALYSIS_DIR
+
+# --- 定数定義 ---
+DIFF_DIR = ANALYSIS_DIR / "diff"
+
+def resolve_table(name: str) -> Path:
+    """ファイルのパス、または data/normalized/ 内のファイル名 (拡張子なしでも可) から正規化済みテーブルを探す"""
+    path = Path(name)
+    if path.exists():
+        return path
+    matches = glob_tables(NORMALIZED_DIR, f"{path.stem}")
+    if not matches:
+        raise FileNotFoundError(f"'{name}' was not found in '{NORMALIZED_DIR}'.")
+    return matches[0]
+
+def main():
+    """
+    2つのリリース (同じ年度を再掲したものなど) の正規化済みレビューシートを比較し、変更テーブルを出力する。
+    事業ごと・列ファミリーごとのフィンガープリントを比べ、一致しないファミリーだけをセル単位で比較する。
+    """
+    parser = argparse.ArgumentParser(description="リリース間の差分を行フィンガープリントで求める")
+    parser.add_argument('old', help="比較元のファイル (パス、または data/normalized/ 内のファイル名)")
+    parser.add_argument('new', help="比較先のファイル")
+    parser.add_argument('--keep-year', action='store_true',
+                        help="代理キーの年度部分も含めて事業を対応付ける (既定では年度部分を除く)")
+    parser.add_argument('--output', type=Path, help="変更テーブルの出力先 (既定: analysis/diff/<old>__<new>.csv)")
+    args = parser.parse_args()
+
+    old_path, new_path = resolve_table(args.old), resolve_table(args.new)
+    print(f"--- diff_releases.py: '{old_path.name}' -> '{new_path.name}' ---")
+    started = time.perf_counter()
+
+    tables = {}
+    for label, path in (('old', old_path), ('new', new_path)):
+        year = resolve_file_year(path)
+        if not year:
+            print(f"[Error] Could not determine the fiscal year of '{path.name}'.")
+            return
+        tables[label] = {'path': path, 'year': year, 'header': read_columns(path)}
+
+    families = common_family_columns(tables['old']['header'], tables['new']['header'])
+    fingerprints = {}
+    for label, table in tables.items():
+        keys = row_keys(table['path'], table['year'], strip_year=not args.keep_year)
+        fingerprints[label] = fingerprint_table(table['path'], keys, families)
+        print(f"  - Fingerprinted {label} ({table['year']}): {len(fingerprints[label])} businesses, "
+              f"{len(families)} column families")
+
+    row_changes, mismatches = compare_fingerprints(fingerprints['old'], fingerprints['new'], list(families))
+    print(f"  - Businesses added: {(row_changes['change'] == 'added').sum()}, "
+          f"removed: {(row_changes['change'] == 'removed').sum()}, "
+          f"changed: {mismatches['key'].nunique()}")
+
+    cell_changes = drill_down(old_path, new_path, fingerprints['old'], fingerprints['new'], mismatches, families)
+    parts = [schema_changes(tables['old']['header'], tables['new']['header']), row_changes, cell_changes]
+    parts = [df for df in parts if not df.empty]
+    changes = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    output_path = args.output or DIFF_DIR / f"{old_path.stem}__{new_path.stem}.csv"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    changes.to_csv(output_path, index=False, encoding='utf-8-sig')
+
+    if not mismatches.empty:
+        print("\n  Changed cells by column family:")
+        summary = cell_changes.groupby('family').agg(businesses=('key', 'nunique'), cells=('column', 'size'))
+        print(summary.to_string())
+    print(f"\nChange table saved to '{output_path}' ({len(changes)} rows, {time.perf_counter() - started:.2f}s).")
+    print("--- diff_releases.py: Finished ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import sys
+import argparse
 import pandas as pd
 import re
 from pathlib import Path
@@ -7,52 +8,25 @@ from pathlib import Path
 PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
 
-# --- ★★★ config.pyから府省庁マスター定義をインポート ★★★ ---
-from src.config import MINISTRY_NAME_VARIATIONS, MINISTRY_MASTER_DATA
+from src.config import ID_CANDIDATE_COLUMNS
+from src.lib.reader import read_columns
+from src.lib.memory import add_memory_arguments, resolve_memory_budget, plan_load, format_size
+from src.lib.business_keys import find_review_sheets, resolve_file_year, assign_business_ids, build_business_ids
+from src.lib.amounts import AMOUNT_COLUMN, parse_amounts
+from src.lib.paths import NORMALIZED_DIR
 
 # --- 定数と設定 ---
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-NORMALIZED_DIR = PROJECT_ROOT / "data" / "normalized"
 TARGET_BUSINESS_NAME = "高度情報通信ネットワーク社会推進経費"
+EXPENSE_COLUMN_PREFIX = "費目・使途(「資金の流れ」においてブロックごとに最大の金額が支出されている者について記載する。費目と使途の双方で実情が分かるように記載)-"
+KEY_COLUMNS = ['事業名', '府省', '府省庁'] + ID_CANDIDATE_COLUMNS
 
-FILENAME_YEAR_MAP = {
-    'database240918': 2023, 'database240502': 2022, 'database220524': 2021,
-    'database_220427': 2020, 'database2019_220427': 2019, 'database2018_220427': 2018,
-    'database2017': 2017, 'database2016': 2016, 'database2015': 2015,
-    'database2014': 2014,
-}
-
-# --- ★★★ 事前に府省庁名とIDの対応辞書を作成 ★★★ ---
-MINISTRY_DF = pd.DataFrame(MINISTRY_MASTER_DATA)
-MINISTRY_NAME_TO_ID = pd.Series(MINISTRY_DF.ministry_id.values, index=MINISTRY_DF.ministry_name).to_dict()
+def is_wanted_column(col) -> bool:
+    """代理キーの生成に必要な列と、予算額・費目・使途の列だけを読み込む"""
+    col = str(col)
+    return col in KEY_COLUMNS or col.startswith('予算額') or col.startswith(EXPENSE_COLUMN_PREFIX)
 
 # --- データ変換ロジック ---
 
-def get_year_from_filename(filename):
-    for key, year in FILENAME_YEAR_MAP.items():
-        if key in filename: return year
-    return None
-
-def generate_business_id(row, file_year, ministry_id):
-    """府省庁IDを使って代理キーを生成する"""
-    ministry_code = str(ministry_id).zfill(4) if pd.notna(ministry_id) else "XXXX"
-
-    if file_year == 2014:
-        num = str(row.get('事業番号', '')).zfill(4)
-        return f"{file_year}-{ministry_code}-{num}-0000"
-    elif 2015 <= file_year <= 2020:
-        num = str(row.get('事業番号-2', '')).zfill(4)
-        branch = str(row.get('事業番号-3', '')).zfill(4) if pd.notna(row.get('事業番号-3')) else "0000"
-        return f"{file_year}-{ministry_code}-{num}-{branch}"
-    elif file_year >= 2021:
-        year = str(int(row.get('事業番号-1', file_year)))
-        code = f"{str(row.get('事業番号-2', '')).zfill(2)}{str(row.get('事業番号-3', '')).zfill(2)}"
-        num = str(row.get('事業番号-4', '')).zfill(4)
-        branch = str(row.get('事業番号-5', '')).zfill(4) if pd.notna(row.get('事業番号-5')) else "0000"
-        # 第2期の府省庁コードは事業番号-2,3に由来するが、ここでは仮にマスターIDを使う
-        return f"{year}-{ministry_code}-{num}-{branch}"
-    return None
-
 # (process_budget_columns と process_expense_columns は変更なし)
 def process_budget_columns(row, business_id):
     records = []
@@ -68,11 +42,10 @@ def process_budget_columns(row, business_id):
 
 def process_expense_columns(row, business_id):
     records = []
-    base_col_name = "費目・使途(「資金の流れ」においてブロックごとに最大の金額が支出されている者について記載する。費目と使途の双方で実情が分かるように記載)-"
     for block in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
         for i in range(10): 
             suffix = f'.{i}' if i > 0 else ''
-            himoku_col = f'{base_col_name}{block}.支払先費目{suffix}'
+            himoku_col = f'{EXPENSE_COLUMN_PREFIX}{block}.支払先費目{suffix}'
             if himoku_col in row and pd.notna(row[himoku_col]):
                 shito_col = himoku_col.replace('費目', '使途')
                 kingaku_col = himoku_col.replace('費目', '金額(百万円)')
@@ -80,41 +53,63 @@ def process_expense_columns(row, business_id):
             elif i == 0 and himoku_col not in row: break
     return records
 
+def find_target(filepath: Path, file_year: int, budget: int):
+    """
+    対象事業の行を探す。メモリ予算に応じて必要な列だけを一括で、またはチャンクごとに読み込む。
+    代理キーはファイル全体のキー列から07と同じ規則 (衝突の解消を含む) で付与する。
+    (対象の行, 府省庁ID, 代理キー, 衝突の有無) を返す。見つからなければ None を返す。
+    """
+    plan = plan_load(filepath, usecols=is_wanted_column, budget=budget)
+    print(f"  -> {plan.describe()}")
+    target_row, key_frames = None, []
+    for df in plan.iter_frames():
+        key_frames.append(df[[col for col in df.columns if col in KEY_COLUMNS]])
+        target_mask = df['事業名'] == TARGET_BUSINESS_NAME
+        if target_row is None and target_mask.any():
+            target_row = df.loc[target_mask.idxmax()].copy()
+
+    if target_row is None:
+        return None
+    # --- ★★★ 府省庁IDと代理キーを07と共通のロジックで確定 ★★★ ---
+    keys = pd.concat(key_frames)
+    ministry_ids, business_ids = assign_business_ids(keys, file_year)
+    _, collisions = build_business_ids(keys, file_year, ministry_ids)
+    target_index = target_row.name
+    return target_row, ministry_ids.loc[target_index], business_ids.loc[target_index], bool(collisions.loc[target_index])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"事業「{TARGET_BUSINESS_NAME}」を年度をまたいで追跡する")
+    add_memory_arguments(parser)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print(f"--- Exhibition Tracker for: '{TARGET_BUSINESS_NAME}' ---")
+    budget = resolve_memory_budget(args.memory_budget)
+    print(f"Memory budget: {format_size(budget)}")
     master_records, budget_records, expense_records = [], [], []
     
-    files_to_process = sorted([p for p in NORMALIZED_DIR.glob('*.csv') if 'セグメント' not in p.name])
+    files_to_process = find_review_sheets(NORMALIZED_DIR)
 
     for filepath in files_to_process:
-        file_year = get_year_from_filename(filepath.name)
+        file_year = resolve_file_year(filepath)
         if not file_year: continue
 
         print(f"\n[Processing {file_year}] Reading '{filepath.name}'...")
-        df = pd.read_csv(filepath, low_memory=False)
-        
-        if '事業名' not in df.columns:
+        if '事業名' not in read_columns(filepath):
             print("  -> '事業名' column not found. Skipping.")
             continue
-            
-        target_rows = df[df['事業名'] == TARGET_BUSINESS_NAME]
-        
-        if target_rows.empty:
+
+        found = find_target(filepath, file_year, budget)
+        if found is None:
             print("  -> Target business not found in this file.")
             continue
-            
-        target_row = target_rows.iloc[0].copy()
+
         print(f"  -> Found target business.")
-        
-        # --- ★★★ 府省庁IDの確定ロジック ★★★ ---
-        ministry_col_name = '府省' if '府省' in target_row else '府省庁'
-        ministry_name = target_row.get(ministry_col_name)
-        # 揺れを吸収
-        normalized_ministry_name = MINISTRY_NAME_VARIATIONS.get(ministry_name, ministry_name)
-        # マスターからIDを検索
-        ministry_id = MINISTRY_NAME_TO_ID.get(normalized_ministry_name)
-        
-        business_id = generate_business_id(target_row, file_year, ministry_id)
+        target_row, ministry_id, business_id, collided = found
+        if collided:
+            print(f"  -> [Warning] The surrogate key of this row is shared by other rows in this file "
+                  f"(resolved to '{business_id}').")
         
         master_records.append({
             'business_id': business_id, 'file_year': file_year,
@@ -132,6 +127,10 @@ def main():
     master_df = pd.DataFrame(master_records)
     budget_df = pd.DataFrame(budget_records)
     expense_df = pd.DataFrame(expense_records)
+    # 金額は表記のまま残し、集計用に固定小数点の整数 (千円単位) を併記する
+    for df in (budget_df, expense_df):
+        if '金額' in df.columns:
+            df[AMOUNT_COLUMN], _ = parse_amounts(df['金額'])
 
     print("\n1. 事業マスタ (business_master)")
     print("="*60)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.sampling import SAMPLE_ENV_VAR, parse_sample_spec, format_sample_spec
+from src.lib.paths import PROJECT_ROOT, SAMPLE_ROOT, SAMPLE_ROOT_ENV_VAR
+
+# --- 定数定義 ---
+# サンプルモードで順に実行するステージ (README の実行パイプラインと同じ順序)
+PIPELINE_STAGES = [
+    '01_convert_to_csv',
+    '02_normalize_data',
+    '06_build_ministry_masters',
+    '07_build_business_master',
+    '08_build_search_index',
+    '09_build_long_tables',
+    '10_build_aggregates',
+    '11_build_segment_table',
+    '12_build_payee_master',
+]
+# --with-analysis で 02 のあとに実行する列分析のステージ
+ANALYSIS_STAGES = ['03_analyze_columns', '04_analyze_id_structure', '04a_enhance_id_analysis', '05_analyze_column_patterns']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="縮小したコーパスでパイプライン全体を実行する (出力は sample/ 以下)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--head', type=int, metavar='N', help="各シートの先頭N行を使う")
+    group.add_argument('--stratified', type=int, metavar='N', help="リリース×府省庁ごとに先頭N行を使う")
+    parser.add_argument('--output-root', type=Path, help=f"出力ルート (既定: {SAMPLE_ROOT})")
+    parser.add_argument('--with-analysis', action='store_true', help="03〜05の列分析も実行する")
+    parser.add_argument('--clean', action='store_true', help="実行前に出力ルートを削除する")
+    return parser.parse_args()
+
+def main():
+    """
+    環境変数でサンプルモードを指定してパイプラインの各ステージを順に実行する。
+    いずれかのステージが失敗した時点で中断する。
+    """
+    args = parse_args()
+    spec = parse_sample_spec(f"head:{args.head}" if args.head is not None else f"stratified:{args.stratified}")
+    output_root = (args.output_root or SAMPLE_ROOT).resolve()
+    if output_root == PROJECT_ROOT:
+        print("[Error] The sample output root must differ from the project root.")
+        sys.exit(1)
+
+    print(f"--- run_sample.py ({format_sample_spec(spec)}): Start ---")
+    print(f"Output root: '{output_root}'")
+    if args.clean and output_root.exists():
+        shutil.rmtree(output_root)
+
+    stages = list(PIPELINE_STAGES)
+    if args.with_analysis:
+        stages[2:2] = ANALYSIS_STAGES
+    env = {**os.environ, SAMPLE_ENV_VAR: format_sample_spec(spec), SAMPLE_ROOT_ENV_VAR: str(output_root)}
+
+    started = time.perf_counter()
+    for stage in stages:
+        print(f"\n>>> {stage}")
+        stage_started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-m', f'src.scripts.{stage}'], cwd=PROJECT_ROOT, env=env)
+        if result.returncode != 0:
+            print(f"\n[Error] Stage '{stage}' failed (exit code {result.returncode}). Aborting.")
+            sys.exit(result.returncode)
+        print(f"<<< {stage} ({time.perf_counter() - stage_started:.1f}s)")
+
+    print(f"\n--- run_sample.py: Finished in {time.perf_counter() - started:.1f}s ---")
+
+
+if __name__ == "__main__":
+    main()
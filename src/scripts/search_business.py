@@ -0,0 +1,40 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(PROJECT_ROOT_FOR_IMPORT))
+
+from src.lib.search_index import SearchIndex, LEXICON_FILE
+from src.lib.paths import INDEX_DIR
+
+
+def main():
+    """
+    08_build_search_index で作成したインデックスを使って、キーワードで事業を検索する。
+    例: python -m src.scripts.search_business "サイバー セキュリティ" --limit 10
+    """
+    parser = argparse.ArgumentParser(description="事業名・事業概要・目的をキーワードで検索する")
+    parser.add_argument('query', help="検索キーワード (空白区切りで AND 検索)")
+    parser.add_argument('--limit', type=int, default=20, help="表示する最大件数")
+    args = parser.parse_args()
+
+    if not (INDEX_DIR / LEXICON_FILE).exists():
+        print(f"[Error] Search index not found in '{INDEX_DIR}'. Please run 08_build_search_index.py first.")
+        return
+
+    # インデックスを開く時間も含めて計測する (開くときに読み込むのは件数とブロック索引だけ)
+    started = time.perf_counter()
+    with SearchIndex(INDEX_DIR) as index:
+        results = index.search(args.query, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    print(f"--- '{args.query}': {len(results)} hits ({elapsed_ms:.1f} ms) ---")
+    for rank, hit in enumerate(results, start=1):
+        print(f"{rank:>3}. [{hit['score']:>8.3f}] {hit['business_id']} ({hit['year']}) {hit['事業名']}")
+
+
+if __name__ == "__main__":
+    main()
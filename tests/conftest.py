@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# --- モジュール検索パス設定 ---
+# スクリプトと同じく、プロジェクトのルートから src.* を読み込めるようにする
+PROJECT_ROOT_FOR_IMPORT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT_FOR_IMPORT))
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from src.lib.amounts import is_amount_column, parse_amounts, to_million_yen
+
+
+def test_amounts_become_fixed_point_thousand_yen():
+    values, failed = parse_amounts(pd.Series(
+        ['1,234', '12.5', '△3', '-', '※1 5', '１億円', '300千円', 'abc', None, '1,234'],
+    ))
+
+    assert values.tolist() == [1234000, 12500, -3000, pd.NA, 5000, 100000, 300, pd.NA, pd.NA, 1234000]
+    # 未記入記号と空欄は欠損で、解析の失敗には数えない
+    assert failed.tolist() == [False, False, False, False, False, False, False, True, False, False]
+    assert to_million_yen(values).iloc[1] == 12.5
+
+
+def test_amount_columns():
+    assert is_amount_column('予算額・執行額(単位:百万円)-2022年度-当初予算')
+    assert is_amount_column('支出先上位10者リスト-A.支払先-金額(百万円)')
+    assert not is_amount_column('事業名')
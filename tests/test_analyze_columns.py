@@ -0,0 +1,74 @@
+import importlib
+import json
+
+import pytest
+
+from src.lib import memory, rowblock, sparse
+
+analyze = importlib.import_module('src.scripts.03_analyze_columns')
+
+HEADER = ['事業名', '予算額・執行額(当初予算)', '事業番号', '備考']
+
+
+def write_table(path, output_format, rows=2300):
+    data = []
+    for i in range(rows):
+        amount = '-' if i % 11 == 0 else f'{i * 1.5:,}'
+        number = str(i) if i < 1700 else f'{i}.5'
+        note = '' if i % 3 else f'注{i}'
+        data.append([f'事業{i}', amount, number, note])
+    if output_format == 'rowblock':
+        with rowblock.RowBlockWriter(path, block_rows=300) as writer:
+            writer.writerow(HEADER)
+            for row in data:
+                writer.writerow(row)
+    elif output_format == 'sparse':
+        with sparse.SparseColumnWriter(path, block_rows=300) as writer:
+            writer.writerow(HEADER)
+            for row in data:
+                writer.writerow(row)
+    else:
+        lines = [','.join(HEADER)] + [','.join(f'"{cell}"' for cell in row) for row in data]
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8-sig')
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize('output_format, suffix', [('csv', '.csv'), ('rowblock', '.rbk'), ('sparse', '.spc')])
+def test_resumed_metrics_match_an_uninterrupted_run(tmp_path, monkeypatch, output_format, suffix):
+    # 予算を小さくして MIN_CHUNK_ROWS 行ずつ読み、2 チャンクごとにチェックポイントを取る
+    monkeypatch.setattr(memory, 'MIN_CHUNK_ROWS', 200)
+    monkeypatch.setattr(analyze, 'CHECKPOINT_CHUNKS', 2)
+    path = tmp_path / f'sheet{suffix}'
+    write_table(path, output_format)
+    expected = analyze.analyze_csv_content(path, budget=1)
+
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    real_save = analyze.save_checkpoint
+    saved = []
+
+    def save_then_interrupt(*args, **progress):
+        real_save(*args, **progress)
+        saved.append(progress['chunks'])
+        if len(saved) == 2:
+            raise Interrupted()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(analyze, 'save_checkpoint', save_then_interrupt)
+        with pytest.raises(Interrupted):
+            analyze.analyze_csv_content(path, checkpoint_path, budget=1)
+    assert saved == [2, 4]
+    checkpoint = json.loads(checkpoint_path.read_text(encoding='utf-8'))
+    assert checkpoint['chunksize'] == 200 and checkpoint['results'] is None
+
+    # 再開時は予算が変わっていても、中断した実行と同じチャンクの区切りで続きを読む
+    results = analyze.analyze_csv_content(path, checkpoint_path, budget=10 ** 12)
+    assert results == expected
+    assert {r['column_name']: r['column_type'] for r in results} == \
+        {'事業名': 'string', '予算額・執行額(当初予算)': 'float', '事業番号': 'float', '備考': 'string'}
+
+    # 分析を終えたファイルは結果をチェックポイントから返す
+    monkeypatch.setattr(analyze, 'iter_chunks', None)
+    assert analyze.analyze_csv_content(path, checkpoint_path) == expected
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from src.lib.business_keys import (
+    assign_business_ids, find_collisions, find_review_sheets, generate_business_ids, map_ministry_ids,
+    resolve_collisions,
+)
+
+
+def ids_for(rows, file_year):
+    df = pd.DataFrame(rows)
+    return generate_business_ids(df, file_year, map_ministry_ids(df['府省庁'])).tolist()
+
+
+def test_ids_follow_the_layout_of_each_period():
+    assert ids_for({'府省庁': ['内閣府'], '事業番号': ['7']}, 2014) == ['2014-0002-0007-0000']
+    assert ids_for({'府省庁': ['内閣府'], '事業番号-2': ['12.0'], '事業番号-3': ['3']}, 2016) == ['2016-0002-0012-0003']
+    # 2021年度以降は年度を事業番号-1 から取り、空なら対象年度を使う
+    assert ids_for({'府省庁': ['内閣府', '内閣府'], '事業番号-1': ['2022', ''],
+                    '事業番号-4': ['5', '5'], '事業番号-5': ['', '1']}, 2023) == [
+        '2022-0002-0005-0000', '2023-0002-0005-0001']
+
+
+def test_unknown_ministry_and_year_outside_the_layouts():
+    assert ids_for({'府省庁': ['存在しない省'], '事業番号-2': ['1']}, 2016) == ['2016-XXXX-0001-0000']
+    assert pd.isna(ids_for({'府省庁': ['内閣府'], '事業番号': ['1']}, 2010)[0])
+
+
+def test_collisions_get_suffixes_in_row_order():
+    ids = pd.Series(['a', 'b', 'a', pd.NA, 'a', pd.NA], dtype='string')
+
+    assert find_collisions(ids).tolist() == [True, False, True, False, True, False]
+    resolved = resolve_collisions(ids)
+    assert resolved.iloc[[0, 1, 2, 4]].tolist() == ['a', 'b', 'a-2', 'a-3']
+    assert resolved.iloc[[3, 5]].isna().all()
+
+
+def test_assign_resolves_collisions_without_a_ministry_column():
+    ministry_ids, business_ids = assign_business_ids(pd.DataFrame({'事業番号-2': ['1', '1', '2']}), 2016)
+
+    assert ministry_ids.isna().all()
+    assert business_ids.tolist() == ['2016-XXXX-0001-0000', '2016-XXXX-0001-0000-2', '2016-XXXX-0002-0000']
+
+
+def test_review_sheets_use_the_same_file_set_in_every_stage(tmp_path):
+    for name in ['database2014_レビューシート.csv', 'database2014_セグメントシート.csv',
+                 'h27_データベース.csv', 'release_Sheet1.csv', 'notes.csv']:
+        (tmp_path / name).write_text('事業名\n', encoding='utf-8')
+
+    names = [path.name for path in find_review_sheets(tmp_path)]
+
+    assert names == ['database2014_レビューシート.csv', 'h27_データベース.csv', 'release_Sheet1.csv']
@@ -0,0 +1,92 @@
+import importlib
+import zipfile
+
+import openpyxl
+import pytest
+
+convert = importlib.import_module('src.scripts.01_convert_to_csv')
+
+
+def write_workbook(path, rows=23):
+    workbook = openpyxl.Workbook()
+    review = workbook.active
+    review.title = 'レビューシート'
+    review.append(['事業名', '予算額', '備考'])
+    for i in range(rows):
+        review.append([f'事業{i}', i * 1000 if i % 4 else None, '改行\nあり' if i % 5 == 0 else f'"引用"{i}'])
+    segment = workbook.create_sheet('セグメントシート')
+    segment.append(['事業名', 'セグメント'])
+    segment.append(['事業0', 1.5])
+    workbook.create_sheet('空のシート')
+    workbook.save(path)
+    return path
+
+
+def converted(directory):
+    return {path.name: path.read_bytes() for path in sorted(directory.iterdir())}
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # バッチの区切りがシートの途中に来るようにする
+    monkeypatch.setattr(convert, 'PIPELINE_BATCH_ROWS', 4)
+
+
+def test_pipelined_xlsx_matches_low_memory_conversion(tmp_path):
+    xlsx = write_workbook(tmp_path / 'database2024.xlsx')
+    expected_dir, actual_dir = tmp_path / 'expected', tmp_path / 'actual'
+    expected_dir.mkdir()
+    actual_dir.mkdir()
+
+    assert convert.convert_excel_to_csv_low_memory(xlsx, xlsx.stem, expected_dir)
+    assert convert.convert_pipelined(xlsx, actual_dir)
+    assert converted(actual_dir) == converted(expected_dir)
+    assert len(converted(actual_dir)) == 3
+
+
+def test_pipelined_zip_matches_low_memory_conversion(tmp_path):
+    archive = tmp_path / 'download.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for name, rows in (('database2023', 9), ('database2024', 23)):
+            zf.write(write_workbook(tmp_path / f'{name}.xlsx', rows), f'data/{name}.xlsx')
+        zf.writestr('data/readme.txt', 'not a workbook')
+    expected_dir, actual_dir = tmp_path / 'expected', tmp_path / 'actual'
+    expected_dir.mkdir()
+    actual_dir.mkdir()
+
+    for name in ('database2023', 'database2024'):
+        assert convert.convert_excel_to_csv_low_memory(tmp_path / f'{name}.xlsx', name, expected_dir)
+    assert convert.convert_pipelined(archive, actual_dir)
+    assert converted(actual_dir) == converted(expected_dir)
+
+
+def test_spools_are_closed_when_the_pipeline_aborts(tmp_path, monkeypatch):
+    archive = tmp_path / 'download.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for i in range(4):
+            zf.write(write_workbook(tmp_path / f'book{i}.xlsx'), f'book{i}.xlsx')
+
+    spools = []
+    real_inflate = convert._inflate_to_spool
+
+    def recording_inflate(zf, member):
+        spool = real_inflate(zf, member)
+        spools.append(spool)
+        return spool
+
+    real_load = openpyxl.load_workbook
+
+    def fail_on_second_book(source, **kwargs):
+        if len(spools) >= 2 and source is spools[1]:
+            raise ValueError('broken workbook')
+        return real_load(source, **kwargs)
+
+    monkeypatch.setattr(convert, '_inflate_to_spool', recording_inflate)
+    monkeypatch.setattr(convert.openpyxl, 'load_workbook', fail_on_second_book)
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+
+    assert not convert.convert_pipelined(archive, output_dir)
+    assert len(spools) >= 2
+    # 解析中だったもの・キューに残ったもの・渡せなかったものを含め、展開した一時ファイルは全て閉じられる
+    assert all(spool.closed for spool in spools)
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from src.scripts.exhibition_tracker import TARGET_BUSINESS_NAME, find_target
+
+
+def test_target_gets_resolved_id_without_ministry_column(tmp_path):
+    """府省庁列のないファイルでも、07と同じく衝突を解消した代理キーを付与する"""
+    path = tmp_path / 'review.csv'
+    pd.DataFrame({
+        '事業名': ['他の事業', TARGET_BUSINESS_NAME],
+        '事業番号-2': ['1', '1'],
+        '事業番号-3': ['0', '0'],
+    }).to_csv(path, index=False, encoding='utf-8')
+
+    target_row, ministry_id, business_id, collided = find_target(path, 2016, budget=1 << 30)
+
+    assert target_row['事業名'] == TARGET_BUSINESS_NAME
+    assert pd.isna(ministry_id)
+    assert business_id == '2016-XXXX-0001-0000-2'
+    assert collided
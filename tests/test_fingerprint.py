@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+
+from src.lib.fingerprint import compare_fingerprints, fingerprint_table, row_keys
+
+
+def write_release(path, rows):
+    columns = ['府省庁', '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5', '事業名']
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False, encoding='utf-8')
+
+
+def test_keys_colliding_after_year_strip_are_made_unique(tmp_path, capsys):
+    """事業番号-1 の年度だけが異なる行は、年度を除くと同じキーになる"""
+    path = tmp_path / 'release.csv'
+    write_release(path, [
+        ['内閣府', '2022', '', '', '1', '0', '事業A'],
+        ['内閣府', '2023', '', '', '1', '0', '事業B'],
+        ['内閣府', '2023', '', '', '2', '0', '事業C'],
+    ])
+
+    with_year = row_keys(path, 2023, strip_year=False)
+    stripped = row_keys(path, 2023)
+
+    assert with_year.is_unique
+    assert stripped.is_unique
+    assert stripped.iloc[1] == stripped.iloc[0] + '-2'
+    assert 'share a key once the year is removed' in capsys.readouterr().out
+
+
+def test_compare_releases_with_colliding_stripped_keys(tmp_path):
+    old_path, new_path = tmp_path / 'old.csv', tmp_path / 'new.csv'
+    write_release(old_path, [
+        ['内閣府', '2022', '', '', '1', '0', '事業A'],
+        ['内閣府', '2023', '', '', '1', '0', '事業B'],
+    ])
+    write_release(new_path, [
+        ['内閣府', '2022', '', '', '1', '0', '事業A'],
+        ['内閣府', '2023', '', '', '1', '0', '事業B (改)'],
+    ])
+    families = OrderedDict([('事業名', ['事業名'])])
+
+    old_fp = fingerprint_table(old_path, row_keys(old_path, 2023), families)
+    new_fp = fingerprint_table(new_path, row_keys(new_path, 2023), families)
+    changes, mismatches = compare_fingerprints(old_fp, new_fp, list(families))
+
+    assert changes.empty
+    assert mismatches.to_dict('records') == [{'key': old_fp.index[1], 'family': '事業名'}]
+
+
+def test_compare_rejects_duplicated_keys():
+    fingerprints = pd.DataFrame({'row': [0, 1], '*': [1, 2], '事業名': [1, 2]}, index=['k', 'k'])
+    with pytest.raises(ValueError, match='not unique'):
+        compare_fingerprints(fingerprints, fingerprints, ['事業名'])
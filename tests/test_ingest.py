@@ -0,0 +1,46 @@
+import csv
+
+import pytest
+
+from src.lib.ingest import merge_sorted_csv_shards
+
+COLUMNS = ['id', 'year', 'value']
+
+
+def write_shard(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return list(csv.reader(f))
+
+
+def test_shards_are_merged_in_key_order(tmp_path):
+    write_shard(tmp_path / 'a.csv', COLUMNS, [['a', '9', 'a9'], ['b', '2', 'b2'], ['', '1', 'none']])
+    # 列の順序が異なるシャードも出力の列順に揃える
+    write_shard(tmp_path / 'b.csv', ['year', 'id', 'value'], [['10', 'a', 'a10'], ['2', 'b', 'b2 (b)']])
+    output = tmp_path / 'merged.csv'
+
+    total = merge_sorted_csv_shards([tmp_path / 'a.csv', tmp_path / 'b.csv'], output, COLUMNS,
+                                    sort_columns=['id', 'year'], numeric_columns=['year'])
+
+    assert total == 5
+    assert read_rows(output) == [
+        COLUMNS,
+        ['a', '9', 'a9'], ['a', '10', 'a10'],
+        # キーが同じ行はシャードの順に並ぶ
+        ['b', '2', 'b2'], ['b', '2', 'b2 (b)'],
+        # 値のない行は最後に並ぶ
+        ['', '1', 'none'],
+    ]
+
+
+def test_unsorted_shard_is_rejected(tmp_path):
+    write_shard(tmp_path / 'a.csv', COLUMNS, [['b', '1', ''], ['a', '1', '']])
+
+    with pytest.raises(ValueError, match='is not sorted'):
+        merge_sorted_csv_shards([tmp_path / 'a.csv'], tmp_path / 'merged.csv', COLUMNS, sort_columns=['id'])
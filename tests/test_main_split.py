@@ -0,0 +1,75 @@
+import codecs
+import csv
+import re
+
+import pandas as pd
+
+from src.lib.reader import read_csv
+from src.main_split import (
+    ROW_KEY_COLUMN, BoundedWriterPool, plan_families, read_families, split_file,
+)
+
+HEADER = [
+    '府省庁', '事業番号-1', '事業番号-2', '事業名', '事業概要',
+    '予算額・執行額(当初予算)', '予算額・執行額(補正予算)', '費目・使途(費目)',
+    '支出先上位10者リスト(A.支出先)', '成果目標及び成果実績(成果目標)',
+    '活動指標及び活動実績(活動指標)', '国庫債務負担行為等(金額)', '備考',
+]
+
+
+def write_source(path, rows=25):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(HEADER)
+        for i in range(rows):
+            row = ['内閣府', '2024', str(i)] + [f'{col[:2]}{i}' if (i + j) % 3 else '' for j, col in enumerate(HEADER[3:])]
+            # ヘッダーより短い行は空で埋めて分割する
+            writer.writerow(row[:8] if i == 7 else row)
+    return path
+
+
+def test_pool_evicts_the_least_recently_used_writer(tmp_path):
+    pool = BoundedWriterPool(max_open=2)
+    a, b, c = (tmp_path / f'{name}.csv' for name in 'abc')
+    pool.writerows(a, ['x'], [['a1']])
+    pool.writerows(b, ['x'], [['b1']])
+    pool.writerows(a, ['x'], [['a2']])
+    pool.writerows(c, ['x'], [['c1']])
+    # 最も長く使われていない b が閉じられる
+    assert list(pool._open) == [a, c]
+    assert pool.reopen_count == 0
+
+    # 閉じたファイルは追記モードで開き直し、ヘッダーやBOMを重ねて書かない
+    pool.writerows(b, ['x'], [['b2']])
+    assert list(pool._open) == [c, b]
+    assert pool.reopen_count == 1
+    pool.close()
+    assert b.read_bytes() == codecs.BOM_UTF8 + b'"x"\r\n"b1"\r\n"b2"\r\n'
+    assert a.read_bytes() == codecs.BOM_UTF8 + b'"x"\r\n"a1"\r\n"a2"\r\n'
+
+
+def test_split_with_fewer_writers_than_families_reassembles_to_the_source(tmp_path, capsys):
+    source = write_source(tmp_path / 'wide.csv')
+    split_dir = tmp_path / 'split'
+    families = list(plan_families(HEADER))
+    assert len(families) == 8
+
+    manifest = split_file(source, split_dir, max_open_writers=3, flush_rows=4)
+    assert manifest['rows'] == 25
+    # 書き出すたびに閉じたファイルを開き直している
+    assert int(re.search(r'writer reopens: (\d+)', capsys.readouterr().out).group(1)) > 0
+    assert list(manifest['families']) == families
+    for entry in manifest['families'].values():
+        data = (split_dir / entry['file']).read_bytes()
+        assert data.count(codecs.BOM_UTF8) == 1
+        assert data.count(f'"{ROW_KEY_COLUMN}"'.encode('utf-8')) == 1
+
+    merged = read_families(split_dir, families)
+    expected = read_csv(source)
+    merged = merged.sort_values(ROW_KEY_COLUMN).reset_index(drop=True)
+    assert merged[ROW_KEY_COLUMN].tolist() == list(range(25))
+    pd.testing.assert_frame_equal(merged[expected.columns.tolist()], expected)
+
+    # 一部のファミリー・列だけを読み込む
+    partial = read_families(split_dir, ['予算額・執行額', 'other'], usecols=['予算額・執行額(補正予算)', '備考'])
+    assert partial.columns.tolist() == [ROW_KEY_COLUMN, '予算額・執行額(補正予算)', '備考']
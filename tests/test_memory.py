@@ -0,0 +1,110 @@
+import csv
+
+import pandas as pd
+import pytest
+
+from src.lib import memory, rowblock, sparse
+
+HEADER = ['事業名', '府省庁', '予算額', '備考']
+
+
+def make_rows(count):
+    return [[f'事業{i}', '内閣府', str(i * 1000), '' if i % 3 else f'備考{i}'] for i in range(count)]
+
+
+def write_table(path, rows):
+    if path.suffix == rowblock.ROWBLOCK_SUFFIX:
+        writer = rowblock.RowBlockWriter(path, block_rows=50)
+    elif path.suffix == sparse.SPARSE_SUFFIX:
+        writer = sparse.SparseColumnWriter(path, block_rows=50)
+    else:
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+        return path
+    with writer:
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, 'MIN_CHUNK_ROWS', 20)
+    return write_table(tmp_path / 'table.csv', make_rows(300))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1024', 1024), ('512M', 512 * 1024 ** 2), ('4g', 4 * 1024 ** 3), ('1.5GB', int(1.5 * 1024 ** 3)),
+    (' 2 KiB ', 2048),
+])
+def test_parse_size(text, expected):
+    assert memory.parse_size(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'G', '4X', '-1G', '1,024', '4 GBs'])
+def test_parse_size_rejects_bad_input(text):
+    with pytest.raises(ValueError, match='Invalid memory size'):
+        memory.parse_size(text)
+
+
+def test_mode_flips_at_the_budget_boundary(table):
+    estimated = memory.plan_load(table, budget=10 ** 12).estimated_bytes
+
+    assert memory.plan_load(table, budget=estimated).mode == memory.LOAD_FULL
+    chunked = memory.plan_load(table, budget=estimated - 1)
+    assert chunked.mode == memory.LOAD_CHUNKED
+    # チャンク1つ分の見積もりは予算に収まる
+    assert chunked.estimated_bytes <= estimated - 1
+
+    projected = memory.plan_load(table, usecols=['事業名'], budget=10 ** 12)
+    assert projected.mode == memory.LOAD_PROJECTED
+    assert projected.estimated_bytes < estimated
+    assert memory.plan_load(table, usecols=['事業名'], budget=projected.estimated_bytes - 1).mode == memory.LOAD_CHUNKED
+
+
+def test_chunk_size_respects_min_chunk_rows(table):
+    plan = memory.plan_load(table, budget=1)
+    assert plan.mode == memory.LOAD_CHUNKED
+    assert plan.chunksize == memory.MIN_CHUNK_ROWS
+
+    chunks = list(plan.iter_frames(dtype=str))
+    assert [len(chunk) for chunk in chunks] == [20] * 15
+    pd.testing.assert_frame_equal(pd.concat(chunks), plan.read(dtype=str))
+
+
+def test_small_tables_are_not_chunked(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, 'MIN_CHUNK_ROWS', 500)
+    path = write_table(tmp_path / 'table.csv', make_rows(300))
+    plan = memory.plan_load(path, budget=1)
+    assert plan.mode == memory.LOAD_FULL and plan.chunksize is None
+
+
+def test_allow_chunks_false_only_warns(table, capsys):
+    plan = memory.plan_load(table, usecols=['事業名', '予算額'], budget=1, allow_chunks=False)
+    assert plan.mode == memory.LOAD_PROJECTED
+    assert plan.chunksize is None
+    assert '[Warning]' in capsys.readouterr().out
+    assert plan.read().columns.tolist() == ['事業名', '予算額']
+
+
+def test_estimates_agree_across_formats(tmp_path):
+    rows = make_rows(300)
+    estimates = {}
+    for suffix in ('.csv', rowblock.ROWBLOCK_SUFFIX, sparse.SPARSE_SUFFIX):
+        path = write_table(tmp_path / f'table{suffix}', rows)
+        profile = memory.profile_table(path)
+        assert profile.rows == 300
+        assert profile.columns == HEADER
+        estimates[suffix] = profile.row_bytes(profile.select_positions(None)) * profile.rows
+
+    # 同じ内容なら、形式が違っても全ての列を読む見積もりはほぼ同じになる
+    assert estimates['.rbk'] == pytest.approx(estimates['.csv'], rel=0.05)
+    assert estimates['.spc'] == pytest.approx(estimates['.csv'], rel=0.05)
+
+    # 疎な列形式は要求された列のトークンとテキストだけを見積もる
+    profile = memory.profile_table(tmp_path / 'table.spc')
+    csv_profile = memory.profile_table(tmp_path / 'table.csv')
+    positions = profile.select_positions(['事業名'])
+    assert profile.row_bytes(positions) < csv_profile.row_bytes(positions)
@@ -0,0 +1,127 @@
+import importlib
+
+import pytest
+
+from src.lib.checkpoint import checkpoint_path_for, load_checkpoint, work_path_for
+from src.lib.normalization import RuleStats
+from src.lib.workqueue import LeaseLost
+
+normalize = importlib.import_module('src.scripts.02_normalize_data')
+
+HEADER = ['府省庁', '事業番号-1', '事業番号-2', '事業番号-3', '事業名', '事業開始・終了(予定)年度']
+
+
+def write_sheet(path, rows=60):
+    lines = [','.join(HEADER)]
+    for i in range(rows):
+        # 事業番号は 25 行ごとに重複し、和暦の一部は西暦に変換できない
+        ministry = '内閣府' if i % 9 else '架空省'
+        period = '平成３０年度' if i % 4 else '昭和末期'
+        lines.append(f'{ministry},2024,{i % 5},{i % 25},ＡＢＣ　事業{i},{period}')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8-sig')
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_after_checkpoints(monkeypatch, count):
+    """count 回目のチェックポイントを保存した直後に処理を中断させる"""
+    real_save = normalize.save_checkpoint
+    saved = []
+
+    def save_then_interrupt(*args, **progress):
+        real_save(*args, **progress)
+        if progress['rows']:
+            saved.append(progress['rows'])
+            if len(saved) == count:
+                raise Interrupted()
+
+    monkeypatch.setattr(normalize, 'save_checkpoint', save_then_interrupt)
+    return saved
+
+
+def rule_hits(rule_stats):
+    return {position: (rule_stats.cells[position], rule_stats.hits[position]) for position in rule_stats.cells}
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'rowblock', 'sparse'])
+@pytest.mark.parametrize('checkpoints', [1, 3])
+def test_resumed_output_matches_an_uninterrupted_run(tmp_path, monkeypatch, output_format, checkpoints):
+    input_path = tmp_path / 'sheet.csv'
+    write_sheet(input_path, rows=95)
+    expected = tmp_path / 'expected' / 'sheet.csv'
+    expected.parent.mkdir()
+    expected_stats = RuleStats()
+    expected_report = normalize.process_csv_file(input_path, expected, output_format, block_rows=10,
+                                                 checkpoint_rows=20, rule_stats=expected_stats)
+
+    output_path = tmp_path / 'out' / 'sheet.csv'
+    output_path.parent.mkdir()
+    with monkeypatch.context() as patch:
+        saved = interrupt_after_checkpoints(patch, checkpoints)
+        with pytest.raises(Interrupted):
+            normalize.process_csv_file(input_path, output_path, output_format, block_rows=10,
+                                       checkpoint_rows=20, rule_stats=RuleStats())
+    assert saved[-1] == 20 * checkpoints
+    assert checkpoint_path_for(output_path).exists()
+
+    # 再開した実行の集計は、チェックポイントに記録された途中経過から続ける
+    stats = RuleStats()
+    report = normalize.process_csv_file(input_path, output_path, output_format, block_rows=10,
+                                        checkpoint_rows=20, rule_stats=stats)
+
+    # 出力 (ブロック形式では索引も) が同一で、作業ファイルやチェックポイントは残らない
+    assert sorted(p.name for p in output_path.parent.iterdir()) == \
+        sorted(p.name for p in expected.parent.iterdir())
+    for path in expected.parent.iterdir():
+        assert (output_path.parent / path.name).read_bytes() == path.read_bytes()
+    assert report.to_records() == expected_report.to_records()
+    assert report.rules['duplicate_business_number']['violations'] == 70
+    assert report.rules['unparsable_wareki']['violations'] == 24
+    assert rule_hits(stats) == rule_hits(expected_stats)
+
+
+class LosingLease:
+    """checks 回目の確認でリースを失ったことにするリース"""
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def ensure_held(self):
+        self.checks -= 1
+        if self.checks < 0:
+            raise LeaseLost('lost')
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'rowblock', 'sparse'])
+def test_worker_that_lost_its_lease_does_not_touch_the_new_owners_output(tmp_path, monkeypatch, output_format):
+    monkeypatch.setattr(normalize, 'LEASE_CHECK_ROWS', 5)
+    input_path = tmp_path / 'sheet.csv'
+    write_sheet(input_path)
+    expected = tmp_path / 'expected' / 'sheet.csv'
+    expected.parent.mkdir()
+    normalize.process_csv_file(input_path, expected, output_format, block_rows=10, checkpoint_rows=10)
+
+    output_path = tmp_path / 'out' / 'sheet.csv'
+    output_path.parent.mkdir()
+    with pytest.raises(LeaseLost):
+        normalize.process_csv_file(input_path, output_path, output_format, block_rows=10, checkpoint_rows=10,
+                                   lease=LosingLease(6), worker='a')
+    assert not output_path.exists()
+    stale_part = work_path_for(output_path, 'a')
+    assert load_checkpoint(checkpoint_path_for(output_path), input_path,
+                           {'output_format': output_format, 'block_rows': 10,
+                            'compression': normalize.rowblock.DEFAULT_COMPRESSION})['work_file'] == stale_part.name
+
+    # 回収されたワーカーが気づかずに書き続けても、引き継いだワーカーはチェックポイントの位置までしか使わない
+    with open(stale_part, 'ab') as f:
+        f.write(b'garbage written after the lease was lost')
+
+    normalize.process_csv_file(input_path, output_path, output_format, block_rows=10, checkpoint_rows=10,
+                               lease=LosingLease(1000), worker='b')
+
+    assert output_path.read_bytes() == expected.read_bytes()
+    assert not checkpoint_path_for(output_path).exists()
+    assert sorted(p.name for p in output_path.parent.iterdir()) == \
+        sorted(p.name for p in expected.parent.iterdir())
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from src.lib.partitions import (
+    LAYOUT_FILE, LAYOUT_PARTITIONED, UNKNOWN_PARTITION, load_manifest, read_partitioned, select_partitions,
+    table_output_path, write_table,
+)
+
+COLUMNS = ['id', '事業名', '事業開始年度']
+
+
+def make_master():
+    return pd.DataFrame({
+        'id': ['2020-0002-0001-0000', '2020-0003-0001-0000', '2021-0002-0001-0000', '2021-XXXX-0002-0000'],
+        '事業名': ['A', 'B', 'C', 'D'],
+        '事業開始年度': ['2010', '2019', '2021', ''],
+    })
+
+
+def test_tables_without_partition_columns_are_split_by_the_id(tmp_path):
+    write_table(make_master(), tmp_path, 'business_master', COLUMNS, LAYOUT_PARTITIONED)
+    manifest = load_manifest(tmp_path / 'business_master')
+
+    values = sorted((entry['values']['year'], entry['values']['ministry_id']) for entry in manifest['partitions'])
+    assert values == [('2020', '2'), ('2020', '3'), ('2021', '2'), ('2021', UNKNOWN_PARTITION)]
+    assert sum(entry['rows'] for entry in manifest['partitions']) == 4
+
+
+def test_reads_open_only_matching_partitions(tmp_path):
+    write_table(make_master(), tmp_path, 'business_master', COLUMNS, LAYOUT_PARTITIONED)
+    directory = tmp_path / 'business_master'
+
+    assert len(select_partitions(load_manifest(directory), filters={'year': 2020})) == 2
+    by_ministry = read_partitioned(directory, filters={'year': [2020, 2021], 'ministry_id': 2})
+    assert sorted(by_ministry['事業名']) == ['A', 'C']
+    by_range = read_partitioned(directory, ranges={'事業開始年度': (2015, None)})
+    assert sorted(by_range['事業名']) == ['B', 'C']
+
+
+def test_switching_layouts_removes_the_old_output(tmp_path):
+    write_table(make_master(), tmp_path, 'business_master', COLUMNS, LAYOUT_PARTITIONED)
+    write_table(make_master(), tmp_path, 'business_master', COLUMNS, LAYOUT_FILE)
+
+    assert table_output_path(tmp_path, 'business_master', LAYOUT_FILE).exists()
+    assert not table_output_path(tmp_path, 'business_master', LAYOUT_PARTITIONED).exists()
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from src.lib.long_tables import PAYEE_COLUMNS
+from src.lib.payees import (
+    MATCH_AMBIGUOUS_NAME, MATCH_CORPORATE_NUMBER, MATCH_NAME, MATCH_NAME_TO_NUMBER, name_payee_id, resolve_payees,
+)
+
+
+def make_records(payees):
+    rows = [{'id': f'2023-0002-{i:04d}-0000', 'year': 2023, 'ministry_id': 2, '支払ブロックID': 'A', '順位': 1,
+             '支出先': name, '法人番号': number, '金額': '1', 'amount_thousand_yen': 1000}
+            for i, (name, number) in enumerate(payees, start=1)]
+    return pd.DataFrame(rows, columns=PAYEE_COLUMNS)
+
+
+def test_payees_are_merged_by_corporate_number_and_name():
+    master, links = resolve_payees(make_records([
+        ('株式会社ABC', '1234567890123'),
+        ('ABC(株)', '1234567890123.0'),
+        ('ａｂｃ 株式会社', None),          # 法人番号なし -> 同じ正規化名称の法人番号つきの支出先に寄せる
+        ('XYZ', '1111111111111'),
+        ('XYZ', '2222222222222'),
+        ('XYZ株式会社', None),             # 寄せ先の法人番号が1つに決まらない
+        ('個人A', None),
+        (None, '123'),                     # 名称も有効な法人番号もない
+    ]))
+
+    assert links['payee_id'].tolist() == [
+        'C1234567890123', 'C1234567890123', 'C1234567890123',
+        'C1111111111111', 'C2222222222222', name_payee_id('XYZ'), name_payee_id('個人A'),
+    ]
+    assert links['match_method'].tolist() == [
+        MATCH_CORPORATE_NUMBER, MATCH_CORPORATE_NUMBER, MATCH_NAME_TO_NUMBER,
+        MATCH_CORPORATE_NUMBER, MATCH_CORPORATE_NUMBER, MATCH_AMBIGUOUS_NAME, MATCH_NAME,
+    ]
+
+    abc = master.set_index('payee_id').loc['C1234567890123']
+    assert abc['records'] == 3
+    assert abc['name_variants'] == 3
+    assert abc['match_method'] == MATCH_CORPORATE_NUMBER
+    assert len(master) == 5
+
+
+def test_name_payee_id_does_not_depend_on_other_records():
+    """名称だけの支出先のIDは正規化名称だけで決まり、データを追加しても変わらない"""
+    _, alone = resolve_payees(make_records([('個人A', None)]))
+    _, together = resolve_payees(make_records([('他の支出先', None), ('個人A', None)]))
+
+    assert alone['payee_id'].iloc[0] == together['payee_id'].iloc[1]
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from src.lib.periods import parse_periods, summarize_periods
+
+
+def test_periods_are_split_and_typed():
+    periods = parse_periods(pd.Series(
+        ['1997～2013年度', '2015年度～終了(予定)なし', 'サブ事業A:2018～2020\\nサブ事業B:2019～2021', '未定', None],
+        index=[10, 11, 12, 13, 14],
+    ))
+
+    assert periods['source_index'].tolist() == [10, 11, 12, 12, 13]
+    assert periods['period_sequence'].tolist() == [1, 1, 1, 2, 1]
+    assert periods['start_year'].tolist() == [1997, 2015, 2018, 2019, pd.NA]
+    assert periods['end_year'].tolist() == [2013, pd.NA, 2020, 2021, pd.NA]
+    assert periods['is_open_ended'].tolist() == [False, True, False, False, False]
+    # 年度として解釈できない表記はコメントとして残す
+    assert periods['comment'].tolist()[2:] == ['サブ事業A', 'サブ事業B', '未定']
+    assert periods['is_parsed'].tolist() == [True, True, True, True, False]
+
+
+def test_summary_takes_the_first_period():
+    summary = summarize_periods(parse_periods(pd.Series(['2018～2020\\n2019～2021', '2015～2016'])))
+
+    assert summary['start_year'].tolist() == [2018, 2015]
+    assert summary['has_multiple_periods'].tolist() == [True, False]
@@ -0,0 +1,86 @@
+import pytest
+
+from src.lib.pipeline import Pipeline, PipelineAborted, StageStats
+
+
+def test_channel_passes_items_in_order_until_closed():
+    pipeline = Pipeline()
+    channel = pipeline.channel(maxsize=2)
+    received = []
+
+    def producer(stats):
+        for i in range(10):
+            channel.put(i, stats)
+            stats.items += 1
+        channel.close(stats)
+
+    def consumer(stats):
+        for item in channel.iter(stats):
+            received.append(item)
+            stats.items += 1
+
+    pipeline.add_stage('producer', producer)
+    pipeline.add_stage('consumer', consumer)
+    pipeline.run()
+
+    assert received == list(range(10))
+    assert [stats.items for stats, _ in pipeline.stages] == [10, 10]
+    assert channel.drain() == []
+
+
+def test_failure_aborts_the_other_stages():
+    pipeline = Pipeline()
+    upstream = pipeline.channel(maxsize=1)
+    downstream = pipeline.channel(maxsize=1)
+    aborted = []
+
+    def producer(stats):
+        # 下流が止まったあとは put で待たされ続けるが、中断されて抜け出す
+        try:
+            for i in range(100):
+                upstream.put(i, stats)
+        except PipelineAborted:
+            aborted.append('producer')
+            raise
+
+    def failing(stats):
+        for item in upstream.iter(stats):
+            if item == 3:
+                raise RuntimeError('bad item')
+            downstream.put(item, stats)
+        downstream.close(stats)
+
+    def consumer(stats):
+        # 上流が失敗したため close() は届かないが、中断されて抜け出す
+        try:
+            for _ in downstream.iter(stats):
+                pass
+        except PipelineAborted:
+            aborted.append('consumer')
+            raise
+
+    pipeline.add_stage('producer', producer)
+    pipeline.add_stage('failing', failing)
+    pipeline.add_stage('consumer', consumer)
+    with pytest.raises(RuntimeError, match='bad item'):
+        pipeline.run()
+
+    assert sorted(aborted) == ['consumer', 'producer']
+    assert pipeline.abort.is_set()
+    assert all(stats.finished is not None for stats, _ in pipeline.stages)
+    # 中断した時点でキューに残っていた要素は drain() で取り出せる
+    assert upstream.drain() in ([], [4])
+
+
+def test_put_and_get_raise_after_abort():
+    pipeline = Pipeline()
+    channel = pipeline.channel(maxsize=1)
+    stats = StageStats('test')
+    channel.put('item', stats)
+    pipeline.abort.set()
+
+    with pytest.raises(PipelineAborted):
+        channel.put('more', stats)
+    with pytest.raises(PipelineAborted):
+        next(channel.iter(stats))
+    assert channel.drain() == ['item']
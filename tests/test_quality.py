@@ -0,0 +1,51 @@
+import json
+
+from src.lib.quality import QualityReport, StreamingQualityChecker
+
+HEADER = ['府省庁', '事業番号-2', '事業番号-3', '事業名']
+
+
+def make_checker(keys_path):
+    return StreamingQualityChecker(QualityReport('a.csv', 'test'), HEADER, batch_rows=2, keys_path=keys_path)
+
+
+def test_duplicates_are_found_across_a_resumed_checkpoint(tmp_path):
+    keys_path = tmp_path / 'a.csv.ckpt.json.keys'
+    first = make_checker(keys_path)
+    for number in ['1', '2', '2']:
+        first.add_row(['内閣府', number, '0', '事業'])
+    state = json.loads(json.dumps(first.checkpoint_state()))
+
+    # チェックポイントには件数だけを記録し、キーは付随するファイルに追記する
+    assert state['seen_keys'] == 2
+    assert keys_path.stat().st_size == 2 * 8
+
+    resumed = make_checker(keys_path)
+    resumed.restore(state)
+    for number in ['1', '3']:
+        resumed.add_row(['内閣府', number, '0', '事業'])
+    rules = resumed.finish().rules
+
+    assert rules['duplicate_business_number']['checked'] == 5
+    assert rules['duplicate_business_number']['violations'] == 2
+    assert resumed.checkpoint_state()['seen_keys'] == 3
+    assert keys_path.stat().st_size == 3 * 8
+
+
+def test_keys_appended_after_the_last_checkpoint_are_overwritten(tmp_path):
+    """チェックポイントを保存する前に中断した場合の余分な追記は、再開後の保存で上書きされる"""
+    keys_path = tmp_path / 'a.csv.ckpt.json.keys'
+    checker = make_checker(keys_path)
+    checker.add_row(['内閣府', '1', '0', '事業'])
+    state = checker.checkpoint_state()
+    checker.add_row(['内閣府', '2', '0', '事業'])
+    checker.checkpoint_state()  # このチェックポイントは保存されなかったものとする
+
+    resumed = make_checker(keys_path)
+    resumed.restore(state)
+    resumed.add_row(['内閣府', '2', '0', '事業'])
+    rules = resumed.finish().rules
+
+    assert rules['duplicate_business_number']['violations'] == 0
+    assert resumed.checkpoint_state()['seen_keys'] == 2
+    assert keys_path.stat().st_size == 2 * 8
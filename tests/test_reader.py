@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from src.lib import reader
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(reader, '_backend', None)
+    monkeypatch.setattr(reader, '_fallback_warned', False)
+    monkeypatch.delenv(reader.BACKEND_ENV_VAR, raising=False)
+
+
+def write_csv(path, header, rows=(('1', '2', '3'),)):
+    lines = [','.join(header)] + [','.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8-sig')
+    return path
+
+
+@pytest.mark.parametrize('available', [True, False])
+def test_c_is_the_default_backend(monkeypatch, available):
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', available)
+    assert reader.get_backend() == 'c'
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', True)
+    monkeypatch.setenv(reader.BACKEND_ENV_VAR, 'pyarrow')
+    assert reader.get_backend() == 'pyarrow'
+    monkeypatch.setenv(reader.BACKEND_ENV_VAR, 'auto')
+    assert reader.get_backend() == 'pyarrow'
+    # set_backend() は環境変数より優先される
+    reader.set_backend('c')
+    assert reader.get_backend() == 'c'
+
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', False)
+    reader.set_backend('auto')
+    assert reader.get_backend() == 'c'
+
+
+def test_unknown_backends_are_rejected(monkeypatch):
+    with pytest.raises(ValueError, match='Unknown CSV backend'):
+        reader.set_backend('arrow')
+    monkeypatch.setenv(reader.BACKEND_ENV_VAR, 'arrow')
+    with pytest.raises(ValueError, match=reader.BACKEND_ENV_VAR):
+        reader.get_backend()
+
+
+def test_missing_pyarrow_falls_back_with_one_warning(monkeypatch, capsys):
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', False)
+    reader.set_backend('pyarrow')
+    assert reader.get_backend() == 'c'
+    assert reader.get_backend() == 'c'
+    assert capsys.readouterr().out.count('[Warning]') == 1
+    # 選択は書き換えないため、pyarrow が使えるようになればそのまま使う
+    assert reader._backend == 'pyarrow'
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', True)
+    assert reader.get_backend() == 'pyarrow'
+
+
+@pytest.mark.parametrize('header, usecols, expected', [
+    (['a', 'b', 'c'], None, None),
+    (['a', 'b', 'c'], ['c', 'a'], ['a', 'c']),
+    (['a', 'b', 'c'], lambda name: name != 'b', ['a', 'c']),
+    # pyarrow で読めない指定
+    (['a', 'b', 'c'], ['a', 'missing'], False),
+    (['a', 'b', 'c'], [0, 2], False),
+    (['a', 'b', 'a'], None, False),
+    (['a', '', 'c'], ['a'], False),
+])
+def test_pyarrow_usecols(tmp_path, header, usecols, expected):
+    path = write_csv(tmp_path / 'table.csv', header)
+    assert reader._pyarrow_usecols(path, usecols, str, None, None, {}) == expected
+
+
+@pytest.mark.parametrize('dtype, nrows, chunksize, kwargs', [
+    (None, None, None, {}),
+    (str, 10, None, {}),
+    (str, None, 10, {}),
+    (str, None, None, {'skiprows': [1]}),
+])
+def test_pyarrow_is_used_only_for_whole_reads_with_dtype(tmp_path, dtype, nrows, chunksize, kwargs):
+    path = write_csv(tmp_path / 'table.csv', ['a', 'b', 'c'])
+    assert reader._pyarrow_usecols(path, None, dtype, nrows, chunksize, kwargs) is False
+
+
+def test_read_csv_passes_pyarrow_the_columns_in_file_order(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / 'table.csv', ['a', 'b', 'c'])
+    monkeypatch.setattr(reader, 'PYARROW_AVAILABLE', True)
+    reader.set_backend('pyarrow')
+    calls = []
+    real_read_csv = pd.read_csv
+
+    def fake_read_csv(*args, engine='c', **kwargs):
+        calls.append((engine, kwargs.get('usecols')))
+        return real_read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(reader.pd, 'read_csv', fake_read_csv)
+    reader.read_csv(path, usecols=lambda name: name in ('c', 'a'), dtype=str)
+    # 関数の usecols は列名のリストに直してから渡し、pyarrow で読めない指定は C パーサーで読む
+    reader.read_csv(path, usecols=['a'], dtype=str, chunksize=1)
+    assert calls == [('pyarrow', ['a', 'c']), ('c', ['a'])]
@@ -0,0 +1,84 @@
+import csv
+
+import pandas as pd
+import pytest
+
+from src.lib import rowblock
+from src.lib.reader import read_table
+
+HEADER = ['事業名', '金額', '金額', '備考']
+
+
+def make_rows(count=23):
+    return [[f'事業{i}', str(i * 10), '' if i % 2 else f'{i}.5', f'注,"{i}"\n改行' if i % 7 == 0 else '']
+            for i in range(count)]
+
+
+def write_both(tmp_path, rows, block_rows=5, compression=rowblock.DEFAULT_COMPRESSION):
+    csv_path = tmp_path / 'table.csv'
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    rbk_path = tmp_path / 'table.rbk'
+    with rowblock.RowBlockWriter(rbk_path, block_rows=block_rows, compression=compression) as writer:
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return csv_path, rbk_path
+
+
+@pytest.mark.parametrize('compression', sorted(rowblock.COMPRESSORS))
+@pytest.mark.parametrize('dtype', [None, str])
+def test_round_trip_matches_csv(tmp_path, compression, dtype):
+    csv_path, rbk_path = write_both(tmp_path, make_rows(), compression=compression)
+
+    pd.testing.assert_frame_equal(read_table(rbk_path, dtype=dtype), read_table(csv_path, dtype=dtype))
+    assert list(rowblock.iter_rows(rbk_path)) == make_rows()
+    assert rowblock.read_header(rbk_path) == HEADER
+
+
+def test_partial_last_block(tmp_path):
+    csv_path, rbk_path = write_both(tmp_path, make_rows(23), block_rows=5)
+    index = rowblock.read_index(rbk_path)
+    assert index['total_rows'] == 23
+    assert [block['rows'] for block in index['blocks']] == [5, 5, 5, 5, 3]
+
+    expected = read_table(csv_path, dtype=str)
+    # 行範囲の指定はブロックの途中から始まり、最後の短いブロックの途中で終わってもよい
+    pd.testing.assert_frame_equal(rowblock.read_frame(rbk_path, start=7, stop=22, dtype=str), expected.iloc[7:22])
+    pd.testing.assert_frame_equal(rowblock.read_frame(rbk_path, start=20, dtype=str), expected.iloc[20:])
+    assert list(rowblock.iter_rows(rbk_path, 18, 22)) == make_rows()[18:22]
+
+    chunks = list(rowblock.iter_frames(rbk_path, chunksize=8, dtype=str))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 3]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_index_is_not_written_when_the_writer_fails(tmp_path):
+    path = tmp_path / 'table.rbk'
+    with pytest.raises(RuntimeError):
+        with rowblock.RowBlockWriter(path, block_rows=5) as writer:
+            writer.writerow(HEADER)
+            writer.writerows(make_rows(12))
+            raise RuntimeError('interrupted')
+    assert not rowblock.index_path_for(path).exists()
+
+
+def test_resume_from_checkpoint_state(tmp_path):
+    rows = make_rows()
+    _, expected_path = write_both(tmp_path, rows)
+
+    path = tmp_path / 'resumed.rbk'
+    with pytest.raises(RuntimeError):
+        with rowblock.RowBlockWriter(path, block_rows=5) as writer:
+            writer.writerow(HEADER)
+            writer.writerows(rows[:10])
+            state = writer.checkpoint_state()
+            # チェックポイントのあとに書いたブロックは、再開時に切り詰められる
+            writer.writerows(rows[10:17])
+            raise RuntimeError('interrupted')
+
+    with rowblock.RowBlockWriter(path, block_rows=5, resume_state=state) as writer:
+        writer.writerows(rows[10:])
+    assert path.read_bytes() == expected_path.read_bytes()
+    assert rowblock.read_index(path) == rowblock.read_index(expected_path)
@@ -0,0 +1,41 @@
+import csv
+import importlib
+import io
+
+from src.lib.sampling import RowSampler
+
+convert = importlib.import_module('src.scripts.01_convert_to_csv')
+
+HEADER = ['府省庁', '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5', '事業名']
+
+
+def test_segment_rows_link_through_the_surrogate_key():
+    """レビューシートとセグメントシートで事業番号の表記が異なっても、同じ代理キーなら対応付ける"""
+    review = RowSampler(('head', 1), HEADER, file_year=2023)
+    selected = list(review.select(iter([
+        ['内閣府', '2023', '', '', '1', '0', '事業A'],
+        ['内閣府', '2023', '', '', '2', '0', '事業B'],
+    ])))
+    assert [row[-1] for row in selected] == ['事業A']
+    assert review.selected_keys == {'2023-0002-0001-0000'}
+
+    segment = RowSampler(('head', 1), HEADER, linked_keys=review.selected_keys, file_year=2023)
+    linked = list(segment.select(iter([
+        ['内閣府', '2023', '', '', '1.0', '0', 'セグメント1'],
+        ['内閣府', '2023', '', '', '2', '0', 'セグメント2'],
+        ['内閣府', '2023', '', '', '0001', '', 'セグメント3'],
+    ])))
+    assert [row[-1] for row in linked] == ['セグメント1', 'セグメント3']
+    assert segment.linked_rows == 2
+
+
+def test_warns_when_no_segment_row_is_linked(capsys):
+    rows = iter([HEADER, ['内閣府', '2023', '', '', '9', '0', 'セグメント1']])
+    out = io.StringIO()
+
+    sampler = convert.write_sampled_rows(csv.writer(out), rows, ('head', 1),
+                                         linked_keys={'2023-0002-0001-0000'}, file_year=2023)
+
+    assert sampler.linked_rows == 0
+    assert out.getvalue().count('\n') == 1  # ヘッダーのみ
+    assert 'No rows were linked' in capsys.readouterr().out
@@ -0,0 +1,56 @@
+import pytest
+
+from src.lib.search_index import SearchIndexBuilder, SearchIndex, positioned_ngrams, TOKEN_GAP
+
+FIELD_WEIGHTS = {'事業名': 3, '事業概要': 1}
+
+
+@pytest.fixture
+def index(tmp_path):
+    builder = SearchIndexBuilder(FIELD_WEIGHTS)
+    builder.add_document('2020-0001-0001-0000', 2020, 'a.csv', {'事業名': 'サイバー対策', '事業概要': 'セキュリティ情報の保護'})
+    # 同じバイグラムを含むが、語順が異なる
+    builder.add_document('2020-0001-0002-0000', 2020, 'a.csv', {'事業名': '対策', '事業概要': 'ティリュキセ'})
+    # 同じ事業が2つのリリースに含まれる
+    builder.add_document('2020-0001-0003-0000', 2020, 'a.csv', {'事業名': '防災', '事業概要': 'セキュリティ'})
+    builder.add_document('2020-0001-0003-0000', 2020, 'b.csv', {'事業名': 'セキュリティ強化', '事業概要': None})
+    builder.write(tmp_path)
+    with SearchIndex(tmp_path) as opened:
+        yield opened
+
+
+def test_positions_do_not_continue_across_tokens():
+    grams = positioned_ngrams('ab cd')
+    assert grams == [('ab', 0), ('cd', 1 + TOKEN_GAP)]
+
+
+def test_phrase_is_verified_by_positions(index):
+    hits = index.search('セキュリティ')
+    assert [hit['business_id'] for hit in hits] == ['2020-0001-0003-0000', '2020-0001-0001-0000']
+
+
+def test_keywords_across_tokens_do_not_match(index):
+    assert index.search('保護対策') == []
+
+
+def test_duplicate_business_rows_are_collapsed_to_the_best_score(index):
+    hits = index.search('セキュリティ')
+    best = hits[0]
+    assert best['business_id'] == '2020-0001-0003-0000'
+    # 事業名に含む b.csv の行がスコアの高い方
+    assert best['source_file'] == 'b.csv'
+    assert best['事業名'] == 'セキュリティ強化'
+
+
+def test_single_character_keyword(index):
+    assert {hit['business_id'] for hit in index.search('保')} == {'2020-0001-0001-0000'}
+    assert {hit['business_id'] for hit in index.search('策')} == {'2020-0001-0001-0000', '2020-0001-0002-0000'}
+
+
+def test_limit_keeps_the_highest_scores(index):
+    hits = index.search('セキュリティ', limit=1)
+    assert [hit['business_id'] for hit in hits] == ['2020-0001-0003-0000']
+
+
+def test_unknown_term(index):
+    assert index.search('存在しない') == []
@@ -0,0 +1,49 @@
+import importlib
+import sys
+
+import pandas as pd
+
+segment_table = importlib.import_module('src.scripts.11_build_segment_table')
+
+HEADER = ['府省庁', '事業番号-2', '事業番号-3', 'セグメント名', '予算額・執行額(単位:百万円)-執行額']
+
+
+def write_sheet(path, rows):
+    pd.DataFrame(rows, columns=HEADER).to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def test_failed_file_leaves_no_partial_rows_in_the_shard(tmp_path, monkeypatch):
+    """ファイルの途中で失敗した場合、そのファイルの行もセグメントの連番も年度シャードに残さない"""
+    normalized, processed = tmp_path / 'normalized', tmp_path / 'processed'
+    normalized.mkdir()
+    write_sheet(normalized / 'database2016_セグメントシート.csv', [
+        ['内閣府', '1', '0', 'A-1', '10'],
+        ['内閣府', '1', '0', 'A-2', '20'],
+    ])
+    write_sheet(normalized / 'database2016b_セグメントシート.csv', [
+        ['内閣府', '1', '0', 'B-1', '30'],
+        ['内閣府', '1', '0', 'B-2', '40'],
+    ])
+    monkeypatch.setattr(segment_table, 'NORMALIZED_DIR', normalized)
+    monkeypatch.setattr(segment_table, 'PROCESSED_DIR', processed)
+    monkeypatch.setattr(segment_table, 'SHARD_DIR', processed / '_shards' / 'segment_details')
+    monkeypatch.setattr(segment_table, 'INGEST_STATE_PATH', processed / '_segment_state.json')
+    monkeypatch.setattr(segment_table, 'BUSINESS_SHARD_DIR', processed / '_shards' / 'business_master')
+    monkeypatch.setattr(segment_table, 'CHUNKSIZE', 1)
+
+    real_read_table = segment_table.read_table
+
+    def failing_read_table(path, **kwargs):
+        for number, chunk in enumerate(real_read_table(path, **kwargs)):
+            if 'database2016b' in path.name and number == 1:
+                raise ValueError('broken row')
+            yield chunk
+
+    monkeypatch.setattr(segment_table, 'read_table', failing_read_table)
+    monkeypatch.setattr(sys, 'argv', ['11_build_segment_table', '--full'])
+    segment_table.main()
+
+    shard = pd.read_csv(processed / '_shards' / 'segment_details' / '2016.csv', dtype=str)
+    assert shard['セグメント名'].tolist() == ['A-1', 'A-2']
+    assert shard['segment_sequence'].tolist() == ['1', '2']
+    assert not list((processed / '_shards' / 'segment_details').glob('*.part'))
@@ -0,0 +1,134 @@
+import csv
+
+import pandas as pd
+import pytest
+
+from src.lib import sparse
+from src.lib.reader import read_table
+
+HEADER = ['事業名', '', '金額', '金額', '金額.1', '備考']
+
+
+def make_rows(count=23):
+    rows = []
+    for i in range(count):
+        rows.append([
+            f'事業{i}',
+            '' if i % 5 else f'x{i}',       # ほとんど空の列 (s で格納される)
+            str(i * 10),
+            '' if i % 2 else f'{i}.5',
+            '',                              # 全て空の列
+            f'注,"{i}"' if i % 7 == 0 else '',
+        ])
+    return rows
+
+
+def write_both(tmp_path, header, rows, block_rows=5):
+    csv_path = tmp_path / 'table.csv'
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        writer.writerows(rows)
+    spc_path = tmp_path / 'table.spc'
+    with sparse.SparseColumnWriter(spc_path, block_rows=block_rows) as writer:
+        writer.writerow(header)
+        writer.writerows(rows)
+    return csv_path, spc_path
+
+
+@pytest.mark.parametrize('dtype', [None, str])
+def test_read_table_matches_csv(tmp_path, dtype):
+    csv_path, spc_path = write_both(tmp_path, HEADER, make_rows())
+
+    expected = read_table(csv_path, dtype=dtype)
+    # 空の列名と重複する列名も pandas と同じ規則で名前を付ける
+    assert sparse.read_columns(spc_path) == expected.columns.tolist()
+    pd.testing.assert_frame_equal(read_table(spc_path, dtype=dtype), expected)
+    assert list(sparse.iter_rows(spc_path)) == make_rows()
+
+
+@pytest.mark.parametrize('usecols', [
+    ['金額.2', '事業名'],
+    lambda name: name.startswith('金額'),
+    [5, 1],
+])
+def test_usecols(tmp_path, usecols):
+    csv_path, spc_path = write_both(tmp_path, HEADER, make_rows())
+    expected = read_table(csv_path, usecols=usecols, dtype=str)
+    pd.testing.assert_frame_equal(read_table(spc_path, usecols=usecols, dtype=str), expected)
+
+
+def test_missing_usecols_are_rejected(tmp_path):
+    _, spc_path = write_both(tmp_path, HEADER, make_rows())
+    with pytest.raises(ValueError, match='not found'):
+        sparse.read_frame(spc_path, usecols=['事業名', 'ない列'])
+
+
+@pytest.mark.parametrize('chunksize', [3, 5, 7, 100])
+def test_chunks_spanning_block_boundaries(tmp_path, chunksize):
+    csv_path, spc_path = write_both(tmp_path, HEADER, make_rows())
+    chunks = list(sparse.iter_frames(spc_path, chunksize=chunksize, low_memory=False))
+    assert [len(chunk) for chunk in chunks[:-1]] == [chunksize] * (len(chunks) - 1)
+    pd.testing.assert_frame_equal(pd.concat(chunks), read_table(csv_path), check_dtype=False)
+
+    # 行範囲の指定はブロックの途中から始まってもよい
+    expected = read_table(csv_path, dtype=str).iloc[4:13]
+    pd.testing.assert_frame_equal(sparse.read_frame(spc_path, start=4, stop=13, dtype=str), expected)
+
+
+def test_ragged_rows(tmp_path):
+    rows = [['a', '1'], ['b'], ['c', '3', 'extra', 'cells']]
+    spc_path = tmp_path / 'table.spc'
+    with sparse.SparseColumnWriter(spc_path, block_rows=2) as writer:
+        writer.writerow(['name', 'value'])
+        writer.writerows(rows)
+
+    # 短い行は空で埋め、ヘッダーより長い行の余分なセルは捨てる
+    assert list(sparse.iter_rows(spc_path)) == [['a', '1'], ['b', ''], ['c', '3']]
+    expected = pd.DataFrame({'name': ['a', 'b', 'c'], 'value': ['1', None, '3']}, dtype=str)
+    pd.testing.assert_frame_equal(sparse.read_frame(spc_path, dtype=str), expected)
+
+
+def test_column_null_rates(tmp_path):
+    csv_path, spc_path = write_both(tmp_path, HEADER, make_rows())
+    expected = read_table(csv_path).isna().mean()
+    pd.testing.assert_series_equal(sparse.column_null_rates(spc_path), expected, check_names=False)
+
+
+def test_resume_from_checkpoint_state(tmp_path):
+    rows = make_rows()
+    _, expected_path = write_both(tmp_path, HEADER, rows)
+
+    path = tmp_path / 'resumed.spc'
+    with pytest.raises(RuntimeError):
+        with sparse.SparseColumnWriter(path, block_rows=5) as writer:
+            writer.writerow(HEADER)
+            writer.writerows(rows[:10])
+            state = writer.checkpoint_state()
+            # チェックポイントのあとに書いたブロックは、再開時に切り詰められる
+            writer.writerows(rows[10:17])
+            raise RuntimeError('interrupted')
+    # 例外で抜けた場合は索引を書き出さない
+    assert not sparse.index_path_for(path).exists()
+
+    with sparse.SparseColumnWriter(path, block_rows=5, resume_state=state) as writer:
+        writer.writerows(rows[10:])
+    assert path.read_bytes() == expected_path.read_bytes()
+    assert sparse.read_index(path) == sparse.read_index(expected_path)
+
+
+def test_checkpoint_state_requires_a_block_boundary(tmp_path):
+    with sparse.SparseColumnWriter(tmp_path / 'table.spc', block_rows=5) as writer:
+        writer.writerow(HEADER)
+        writer.writerows(make_rows(3))
+        with pytest.raises(RuntimeError):
+            writer.checkpoint_state()
+
+
+def test_empty_header_and_no_rows(tmp_path):
+    spc_path = tmp_path / 'table.spc'
+    with sparse.SparseColumnWriter(spc_path) as writer:
+        writer.writerow(['', 'a', ''])
+    assert sparse.read_columns(spc_path) == ['Unnamed: 0', 'a', 'Unnamed: 2']
+    assert sparse.read_frame(spc_path, dtype=str).shape == (0, 3)
+    assert list(sparse.iter_frames(spc_path)) == []
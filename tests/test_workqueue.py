@@ -0,0 +1,149 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from src.lib.workqueue import WorkQueue, LeaseLost, LOCK_POLL_SECONDS
+
+
+def write_lease(path, worker, expires):
+    path.write_text(json.dumps({'worker': worker, 'expires': expires}), encoding='utf-8')
+
+
+def test_expired_lease_is_recovered(tmp_path):
+    queue = WorkQueue(tmp_path, worker_id='a')
+    path = queue.lease_dir / 'unit.lease'
+    write_lease(path, 'crashed', time.time() - 1)
+
+    assert queue._acquire(path)
+    assert json.loads(path.read_text(encoding='utf-8'))['worker'] == 'a'
+
+
+def test_fresh_lease_moved_by_a_late_recovery_is_restored(tmp_path):
+    """期限切れを確認したあとに他のワーカーが先に回収した場合、新しいロックを奪わない"""
+    worker_a = WorkQueue(tmp_path, worker_id='a')
+    worker_b = WorkQueue(tmp_path, worker_id='b')
+    path = worker_a.lease_dir / 'unit.lease'
+    write_lease(path, 'crashed', time.time() - 1)
+
+    real_is_expired = worker_a._is_expired
+    calls = []
+
+    def is_expired_then_lose_the_race(p):
+        expired = real_is_expired(p)
+        if not calls:
+            # a が期限切れを確認した直後に、b が回収して新しいロックを作る
+            assert worker_b._acquire(path)
+        calls.append(p)
+        return expired
+
+    worker_a._is_expired = is_expired_then_lose_the_race
+    assert not worker_a._acquire(path)
+    assert json.loads(path.read_text(encoding='utf-8'))['worker'] == 'b'
+    assert not list(worker_a.lease_dir.glob('*.stale.*'))
+
+
+def test_fresh_lease_is_not_overwritten_when_restored(tmp_path):
+    """移した新しいロックを戻す前に別のワーカーがロックを作っていた場合、そのロックを上書きしない"""
+    worker_a = WorkQueue(tmp_path, worker_id='a')
+    worker_b = WorkQueue(tmp_path, worker_id='b')
+    worker_c = WorkQueue(tmp_path, worker_id='c')
+    path = worker_a.lease_dir / 'unit.lease'
+    write_lease(path, 'crashed', time.time() - 1)
+
+    real_is_expired = worker_a._is_expired
+    calls = []
+
+    def is_expired_while_others_race(p):
+        expired = real_is_expired(p)
+        if not calls:
+            # a が期限切れを確認した直後に b が回収する
+            assert worker_b._acquire(path)
+        elif len(calls) == 1:
+            # a が b のロックを移している間に c がロックを作る
+            assert worker_c._acquire(path)
+        calls.append(p)
+        return expired
+
+    worker_a._is_expired = is_expired_while_others_race
+    assert not worker_a._acquire(path)
+    assert json.loads(path.read_text(encoding='utf-8'))['worker'] == 'c'
+    assert not list(worker_a.lease_dir.glob('*.stale.*'))
+
+
+def test_lease_is_still_owned_while_being_moved_by_a_late_recovery(tmp_path):
+    queue = WorkQueue(tmp_path, worker_id='a')
+    lease = queue.try_claim('unit')
+    stale_path = lease.path.with_name(lease.path.name + '.stale.b')
+    os.rename(lease.path, stale_path)
+
+    def restore():
+        os.link(stale_path, lease.path)
+        stale_path.unlink()
+
+    # 判定を待つ間に、移したワーカーがロックを戻す
+    timer = threading.Timer(LOCK_POLL_SECONDS / 4, restore)
+    timer.start()
+    assert lease.held()
+    timer.join()
+    lease.complete()
+    assert queue.is_finished('unit')
+
+
+def run_worker(queue_dir, worker_id, units, log_path, crash_at):
+    queue = WorkQueue(queue_dir, worker_id=worker_id, lease_seconds=1)
+    while not all(queue.is_finished(unit) for unit in units):
+        for i, lease in enumerate(queue.claims(units)):
+            if i == crash_at:
+                # リースを持ったまま落ちる
+                os._exit(1)
+            time.sleep(0.01)
+            if lease.held():
+                with open(log_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{lease.unit}\n")
+            lease.complete()
+        time.sleep(0.05)
+
+
+def test_every_unit_is_completed_exactly_once_by_concurrent_workers(tmp_path):
+    units = [f"unit{i}" for i in range(30)]
+    lease_dir = tmp_path / 'leases'
+    lease_dir.mkdir()
+    # 半数の作業単位に期限切れのリースを置き、回収を競わせる
+    for unit in units[::2]:
+        write_lease(lease_dir / f"{unit}.lease", 'crashed', time.time() - 1)
+    log_path = tmp_path / 'completed.log'
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=run_worker, args=(tmp_path, f"w{i}", units, log_path, 1 if i == 0 else None))
+               for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    assert [worker.exitcode for worker in workers] == [1, 0, 0, 0]
+    assert sorted(log_path.read_text(encoding='utf-8').split()) == sorted(units)
+    queue = WorkQueue(tmp_path, worker_id='check')
+    assert queue.summary() == {'done': len(units), 'failed': 0, 'running': 0}
+    assert not list(queue.lease_dir.glob('*.stale.*'))
+
+
+def test_lost_lease_is_visible_to_the_caller(tmp_path):
+    queue = WorkQueue(tmp_path, worker_id='a')
+    lease = queue.try_claim('unit')
+    assert lease.held()
+    lease.ensure_held()
+
+    # 期限切れとみなされて他のワーカーに回収された
+    write_lease(lease.path, 'b', time.time() + 600)
+    assert not lease.held()
+    with pytest.raises(LeaseLost):
+        lease.ensure_held()
+
+    # 失ったリースの完了は記録しない
+    lease.complete()
+    assert not queue.is_finished('unit')